@@ -356,3 +356,124 @@ NULL_BINDING_FILE_DATASOURCES = env.list(
     "NULL_BINDING_FILE_DATASOURCES",
     default=["harbison_chip"],
 )
+LOCAL_FILE_CACHE_DIR = env(
+    "LOCAL_FILE_CACHE_DIR",
+    default="/tmp/yeastregulatorydb_file_cache",
+)
+# set to 0 to disable the cache, in which case remote files are downloaded
+# to a caller provided directory on every read
+LOCAL_FILE_CACHE_MAX_BYTES = env.int(
+    "LOCAL_FILE_CACHE_MAX_BYTES",
+    default=10 * 1024**3,
+)
+# a cached file is not evicted for this many seconds after it was last
+# returned, since a task, or another process on the worker, may still be
+# reading it
+LOCAL_FILE_CACHE_GRACE_SECONDS = env.float(
+    "LOCAL_FILE_CACHE_GRACE_SECONDS",
+    default=3600,
+)
+# the number of rows of an uploaded file which are parsed and validated at a
+# time. This bounds the memory used to validate an upload
+FILE_VALIDATION_CHUNKSIZE = env.int(
+    "FILE_VALIDATION_CHUNKSIZE",
+    default=100_000,
+)
+# the number of processes which validate the files of a bulk upload in
+# parallel. Set to 1 to validate the files in the request process
+FILE_VALIDATION_WORKERS = env.int(
+    "FILE_VALIDATION_WORKERS",
+    default=4,
+)
+# the number of seconds for which the progress of a bulk upload job is kept
+# after it was last updated. See BulkUploadJob
+BULK_UPLOAD_JOB_TIMEOUT = env.int(
+    "BULK_UPLOAD_JOB_TIMEOUT",
+    default=7 * 24 * 60 * 60,
+)
+# the minimum number of seconds between saves of the progress of the rows of
+# a bulk upload job. The job is always saved when its status changes
+BULK_UPLOAD_JOB_SAVE_INTERVAL = env.float(
+    "BULK_UPLOAD_JOB_SAVE_INTERVAL",
+    default=1.0,
+)
+# the number of stored files which are downloaded concurrently when a view or
+# task reads many records, eg the combined export. See prefetch_stored_files
+FILE_PREFETCH_WORKERS = env.int(
+    "FILE_PREFETCH_WORKERS",
+    default=8,
+)
+# the number of seconds to wait for a single file download, and the number of
+# times a download which fails with a transient error is retried
+FILE_PREFETCH_TIMEOUT = env.int(
+    "FILE_PREFETCH_TIMEOUT",
+    default=300,
+)
+FILE_PREFETCH_RETRIES = env.int(
+    "FILE_PREFETCH_RETRIES",
+    default=2,
+)
+# the directory in which the memory-mapped regulator x target effect matrices
+# are stored. The matrices are built by the celery workers and read by the web
+# processes, so this must be shared by both, eg a volume mounted by every
+# container. See effect_matrix
+EFFECT_MATRIX_DIR = env(
+    "EFFECT_MATRIX_DIR",
+    default="/tmp/yeastregulatorydb_effect_matrix",
+)
+# the number of seconds after which a claim on the build of an effect matrix
+# expires, so that a build which did not finish is launched again
+EFFECT_MATRIX_BUILD_TIMEOUT = env.int(
+    "EFFECT_MATRIX_BUILD_TIMEOUT",
+    default=60 * 60,
+)
+# the number of rows read from the database, and written, at a time by the
+# export action of the viewsets. If EXPORT_TABLE_USE_COPY is set, and the
+# database is PostgreSQL, the export is written by the database with COPY
+EXPORT_TABLE_CHUNKSIZE = env.int(
+    "EXPORT_TABLE_CHUNKSIZE",
+    default=2000,
+)
+EXPORT_TABLE_USE_COPY = env.bool(
+    "EXPORT_TABLE_USE_COPY",
+    default=False,
+)
+# the maximum size of a chunk of a chunked upload, and the number of seconds
+# for which an unfinished chunked upload is kept. See ChunkedUpload
+CHUNKED_UPLOAD_MAX_CHUNK_BYTES = env.int(
+    "CHUNKED_UPLOAD_MAX_CHUNK_BYTES",
+    default=64 * 1024**2,
+)
+CHUNKED_UPLOAD_TIMEOUT = env.int(
+    "CHUNKED_UPLOAD_TIMEOUT",
+    default=24 * 60 * 60,
+)
+# if set, file downloads are redirected to the storage rather than proxied by
+# the web process: a pre-signed URL, valid for FILE_DOWNLOAD_URL_EXPIRY
+# seconds, for S3, or an X-Accel-Redirect to FILE_DOWNLOAD_ACCEL_PREFIX, an
+# internal nginx location, for local storage. See file_download
+FILE_DOWNLOAD_REDIRECT = env.bool(
+    "FILE_DOWNLOAD_REDIRECT",
+    default=False,
+)
+FILE_DOWNLOAD_URL_EXPIRY = env.int(
+    "FILE_DOWNLOAD_URL_EXPIRY",
+    default=5 * 60,
+)
+FILE_DOWNLOAD_ACCEL_PREFIX = env(
+    "FILE_DOWNLOAD_ACCEL_PREFIX",
+    default="/protected-media/",
+)
+# the number of seconds for which the list responses of the viewsets with the
+# CachedListMixin are cached. A cached response is also invalidated when a
+# record it depends on changes. Set to 0 to disable the cache. See ResponseCache
+RESPONSE_CACHE_TIMEOUT = env.int(
+    "RESPONSE_CACHE_TIMEOUT",
+    default=10 * 60,
+)
+# the largest `page_size` which may be requested from the viewsets with the
+# OptionalCursorPagination, in the cursor mode
+CURSOR_PAGINATION_MAX_PAGE_SIZE = env.int(
+    "CURSOR_PAGINATION_MAX_PAGE_SIZE",
+    default=5000,
+)
@@ -2,6 +2,7 @@ import os
 
 import pandas as pd
 import pytest
+from django.core.cache import cache
 from django.db.models.query import QuerySet
 from rest_framework.authtoken.models import Token
 
@@ -33,6 +34,8 @@ from yeastregulatorydb.regulatory_data.tests.factories import (
     RankResponseFactory,
     RegulatorFactory,
 )
+from yeastregulatorydb.regulatory_data.utils.chrmap_cache import chrmap_cache
+from yeastregulatorydb.regulatory_data.utils.genomicfeature_cache import genomicfeature_cache
 from yeastregulatorydb.users.models import User
 from yeastregulatorydb.users.tests.factories import UserFactory
 
@@ -42,6 +45,17 @@ TEST_DATA_ROOT = os.path.join(os.path.dirname(__file__), "regulatory_data/tests/
 @pytest.fixture(autouse=True)
 def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
+    settings.LOCAL_FILE_CACHE_DIR = tmpdir.join("file_cache").strpath
+    settings.EFFECT_MATRIX_DIR = tmpdir.join("effect_matrix").strpath
+
+
+@pytest.fixture(autouse=True)
+def clear_model_caches():
+    # the tables are rolled back between tests, but the caches, eg the
+    # response cache and its versions, are not
+    cache.clear()
+    chrmap_cache.invalidate()
+    genomicfeature_cache.invalidate()
 
 
 @pytest.fixture
@@ -133,6 +147,8 @@ def chrmap(db, user: User) -> QuerySet:
         record["uploader"] = user
         record["modifier"] = user
     ChrMap.objects.bulk_create([ChrMap(**record) for record in data])
+    # bulk_create does not send the post_save signal
+    chrmap_cache.invalidate()
     return ChrMap.objects.all()
 
 
@@ -407,6 +423,8 @@ def genomicfeature_chr1_genes(db, chrmap: QuerySet, user: User) -> QuerySet:
         record["modifier"] = user
     # bulk create the GenomicFeature instances
     GenomicFeature.objects.bulk_create([GenomicFeature(**record) for record in chr1_genes_dict])
+    # bulk_create does not send the signal which invalidates the cache
+    genomicfeature_cache.invalidate()
     return GenomicFeature.objects.all()
 
 
@@ -0,0 +1,75 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the `id` of the records, in the direction of the
+    ordering of the viewset queryset, eg `-id` for Binding. Each page is a
+    single indexed range query, eg `WHERE id > <last id> LIMIT <page size>`,
+    so reading a page deep in the table costs the same as reading the first,
+    and there is no count query. The `next` and `previous` links carry an
+    opaque `cursor`.
+
+    The page size may be set with `page_size`, up to
+    `CURSOR_PAGINATION_MAX_PAGE_SIZE`.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+
+    @property
+    def max_page_size(self) -> int:  # type: ignore[override]
+        return settings.CURSOR_PAGINATION_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view) -> tuple[str]:
+        """
+        :return: the ordering of the queryset, if it is on `id`, and otherwise `id`
+        :rtype: tuple[str]
+        """
+        ordering = tuple(queryset.query.order_by)
+        return ordering if ordering in {("id",), ("-id",)} else (self.ordering,)
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    The default page number pagination, with an opt-in cursor pagination
+    mode, see :class:`IdCursorPagination`, which is used if the request has
+    `pagination=cursor`. The page number mode counts the filtered records,
+    and reads a page with an `OFFSET`, on every request, which is slow deep
+    into a large table.
+
+    Example usage:
+
+    .. code-block:: python
+
+        GET /api/genomicfeature/?pagination=cursor&page_size=5000
+        GET <the `next` link of the response>
+    """
+
+    mode_query_param = "pagination"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_pagination = None
+        if request.query_params.get(self.mode_query_param) == "cursor":
+            self.cursor_pagination = IdCursorPagination()
+            return self.cursor_pagination.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *super().get_schema_operation_parameters(view),
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to `cursor` to page through the records by `id`, without a count",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            *IdCursorPagination().get_schema_operation_parameters(view),
+        ]
@@ -0,0 +1,3 @@
+from .OptionalCursorPagination import IdCursorPagination, OptionalCursorPagination
+
+__all__ = ["IdCursorPagination", "OptionalCursorPagination"]
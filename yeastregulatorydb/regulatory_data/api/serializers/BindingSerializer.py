@@ -17,6 +17,7 @@ class BindingSerializer(
 ):
     uploader = serializers.ReadOnlyField(source="uploader.username")
     modifier = serializers.CharField(source="uploader.username", required=False)
+    sidecar = serializers.FileField(read_only=True)
 
     class Meta:
         model = Binding
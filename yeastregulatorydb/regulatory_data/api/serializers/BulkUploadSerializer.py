@@ -4,3 +4,5 @@ from rest_framework import serializers
 class BulkUploadSerializer(serializers.Serializer):
     csv_file = serializers.FileField()
     tarred_dir = serializers.FileField()
+    # run the upload as a celery job, rather than in the request
+    as_job = serializers.BooleanField(required=False, default=False)
@@ -13,6 +13,7 @@ class ExpressionSerializer(
 ):
     uploader = serializers.ReadOnlyField(source="uploader.username")
     modifier = serializers.CharField(source="uploader.username", required=False)
+    sidecar = serializers.FileField(read_only=True)
     regulator_locus_tag = serializers.CharField(source="regulator.genomicfeature.locus_tag", read_only=True)
     regulator_symbol = serializers.CharField(source="regulator.genomicfeature.symbol", read_only=True)
 
@@ -8,6 +8,7 @@ from .mixins.FileValidationMixin import FileValidationMixin
 class RankResponseSerializer(CustomValidateMixin, FileValidationMixin, serializers.ModelSerializer):
     uploader = serializers.ReadOnlyField(source="uploader.username")
     modifier = serializers.CharField(source="uploader.username", required=False)
+    sidecar = serializers.FileField(read_only=True)
 
     class Meta:
         model = RankResponse
@@ -1,15 +1,14 @@
 import gzip
-import io
 import logging
+import zlib
 
 import pandas as pd
 from django.conf import settings
 from rest_framework import serializers
 
 from yeastregulatorydb.regulatory_data.api.serializers.FileFormatSerializer import FileFormatSerializer
-from yeastregulatorydb.regulatory_data.utils.count_hops import count_hops
-from yeastregulatorydb.regulatory_data.utils.validate_df import validate_df
-from yeastregulatorydb.regulatory_data.utils.validate_genomic_df import validate_genomic_df
+from yeastregulatorydb.regulatory_data.utils.parquet_sidecar import write_parquet_sidecar
+from yeastregulatorydb.regulatory_data.utils.validate_genomic_file import validate_genomic_file
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +24,34 @@ def handle_missing_fileformat() -> tuple[str, dict]:
     return separator, fields
 
 
+def file_validation_error(exc: Exception, separator: str) -> serializers.ValidationError:
+    """
+    Translate an exception raised by
+    :func:`~yeastregulatorydb.regulatory_data.utils.validate_genomic_file.validate_genomic_file`
+    into a ValidationError on the `file` field.
+
+    :param exc: the exception
+    :type exc: Exception
+    :param separator: the separator with which the file was parsed
+    :type separator: str
+
+    :return: the ValidationError
+    :rtype: serializers.ValidationError
+
+    :raises Exception: `exc`, if it is not a file validation error, eg an
+        OSError other than a gzip error, which is a failure to read the file
+    """
+    if isinstance(exc, (gzip.BadGzipFile, zlib.error, EOFError)):
+        return serializers.ValidationError({"file": "The file is not a valid gzipped file."})
+    if isinstance(exc, UnicodeDecodeError):
+        return serializers.ValidationError({"file": "The file content could not be decoded."})
+    if isinstance(exc, (pd.errors.ParserError, pd.errors.EmptyDataError)):
+        return serializers.ValidationError({"file": f"The file could not be parsed with separator: {separator}"})
+    if isinstance(exc, ValueError):
+        return serializers.ValidationError({"file": f"Invalid file. Error: {exc}"})
+    raise exc
+
+
 class FileValidationMixin:
     """
     Mixin for validating genomic files. The assumption is that all files will
@@ -34,6 +61,18 @@ class FileValidationMixin:
     model does not have a `fileformat` field that foreign keys to the FileFormat,
     then you may pass 'default` through the Serializer class, which calls the
     default validation methods and assumes bed6 format
+
+    The file is validated in chunks of `FILE_VALIDATION_CHUNKSIZE` rows, and
+    the chunks are written to a local parquet file as they are validated. That
+    file is saved as the typed sidecar of the record (see
+    :func:`~yeastregulatorydb.regulatory_data.utils.parquet_sidecar.write_parquet_sidecar`)
+    after the instance is created or updated.
+
+    If the serializer context has `defer_file_validation`, the file is not
+    parsed in `validate`. Instead, the separator and fields are set on
+    `file_validation_args`, and the caller validates the file and passes the
+    result to :meth:`apply_file_validation`. See
+    :class:`~yeastregulatorydb.regulatory_data.api.views.mixins.BulkUploadMixin.BulkUploadMixin`
     """
 
     def validate(self, attrs):
@@ -68,64 +107,89 @@ class FileValidationMixin:
                     "there should be a .gz extention. Gzip it and try again."
                 }
             )
-        # read in the file with pandas. raise a validationerror if it fails
-        if self.instance:  # type: ignore[attr-defined]
-            separator = self.instance.fileformat.separator  # type: ignore[attr-defined]
-            fields = FileFormatSerializer(attrs.get("fileformat")).fields_as_types  # type: ignore[attr-defined]
-        else:
-            if "fileformat" in attrs.keys():
-                try:
-                    separator = attrs.get("fileformat").separator
-                    # extract with the serializer in order to translate the json string
-                    # to a python dict with the correct types in the values
-                    fileformat_serializer = FileFormatSerializer(attrs.get("fileformat"))
-                    fields = fileformat_serializer.fields_as_types
-                except AttributeError:
-                    separator, fields = handle_missing_fileformat()
-            elif "source" in attrs.keys():
-                try:
-                    separator = attrs.get("source").fileformat.separator
-                    # extract with the serializer in order to translate the json string
-                    # to a python dict with the correct types in the values
-                    fileformat_serializer = FileFormatSerializer(attrs.get("source").fileformat)
-                    fields = fileformat_serializer.fields_as_types
-                except AttributeError:
-                    separator, fields = handle_missing_fileformat()
-            else:
-                separator, fields = handle_missing_fileformat()
+        separator, fields = self._file_format(attrs)
+
+        if self.context.get("defer_file_validation"):  # type: ignore[attr-defined]
+            # the file is validated by the caller, eg on a process pool by the
+            # bulk upload, which then calls apply_file_validation
+            self.file_validation_args = (separator, fields)
+            return attrs
 
         # Reset the file pointer to the beginning of the file
         attrs.get("file").seek(0)
-
-        # Try to decompress the gzipped data
         try:
-            decompressed_file = gzip.decompress(attrs.get("file").read())
-        except OSError:
-            raise serializers.ValidationError({"file": "The file is not a valid gzipped file."})
+            result = validate_genomic_file(attrs.get("file"), separator, fields)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise file_validation_error(exc, separator) from exc
 
-        # Convert the bytes object to a StringIO object
-        try:
-            file_like_object = io.StringIO(decompressed_file.decode())
-        except UnicodeDecodeError:
-            raise serializers.ValidationError({"file": "The file content could not be decoded."})
+        return self.apply_file_validation(attrs, result)
 
-        # Try to read the data into a pandas DataFrame
-        try:
-            df = pd.read_csv(file_like_object, sep=separator)
-        except pd.errors.ParserError:
-            raise serializers.ValidationError({"file": "The file could not be parsed with separator: {separator}"})
-        try:
-            if {"chr", "start", "end"}.issubset(set(df.columns)):
-                logger.info("Validating genomic coordinates in uploaded file")
-                df = validate_genomic_df(df, settings.CHR_FORMAT, fields)
-                if "depth" in df.columns:
-                    logger.info("Counting genomic insertions and adding the tallies to the initial data")
-                    count_dict = count_hops(df, settings.CHR_FORMAT)
-                    for key in count_dict.keys():
-                        # add the inserts to the initial data
-                        attrs[key + "_inserts"] = count_dict[key]
+    def _file_format(self, attrs) -> tuple[str, dict]:
+        if self.instance:  # type: ignore[attr-defined]
+            # on update, the fileformat is taken from the instance, eg the
+            # DataSource of a Binding record, unless a new one is passed
+            if attrs.get("fileformat") is not None:
+                instance_fileformat = attrs.get("fileformat")
+            elif hasattr(self.instance, "get_fileformat"):  # type: ignore[attr-defined]
+                instance_fileformat = self.instance.get_fileformat()  # type: ignore[attr-defined]
             else:
-                df = validate_df(df, fields)
-        except ValueError as e:
-            raise serializers.ValidationError({"file": f"Invalid file. Error: {e}"})
+                instance_fileformat = None
+            if instance_fileformat is not None:
+                return instance_fileformat.separator, FileFormatSerializer(instance_fileformat).fields_as_types
+            return handle_missing_fileformat()
+        if "fileformat" in attrs.keys():
+            fileformat = attrs.get("fileformat")
+        elif "source" in attrs.keys():
+            fileformat = getattr(attrs.get("source"), "fileformat", None)
+        else:
+            return handle_missing_fileformat()
+        try:
+            # extract with the serializer in order to translate the json string
+            # to a python dict with the correct types in the values
+            return fileformat.separator, FileFormatSerializer(fileformat).fields_as_types
+        except AttributeError:
+            return handle_missing_fileformat()
+
+    def apply_file_validation(self, attrs, result: tuple[str | None, dict[str, int]]):
+        """
+        Add the result of
+        :func:`~yeastregulatorydb.regulatory_data.utils.validate_genomic_file.validate_genomic_file`
+        to the validated data. The insertion tallies, if any, are added to
+        `attrs`, and the parquet sidecar is kept to be saved once the
+        instance is saved.
+
+        :param attrs: the validated data
+        :type attrs: dict
+        :param result: the sidecar path and the insertion tallies
+        :type result: tuple[str | None, dict[str, int]]
+
+        :return: `attrs`
+        :rtype: dict
+        """
+        sidecar_path, inserts = result
+        if inserts:
+            logger.info("Adding the genomic insertion tallies to the initial data")
+            attrs.update(inserts)
+        self._validated_sidecar_path = sidecar_path
         return attrs
+
+    def create(self, validated_data):
+        instance = super().create(validated_data)  # type: ignore[misc]
+        self.save_sidecar(instance)
+        return instance
+
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)  # type: ignore[misc]
+        if "file" in validated_data:
+            self.save_sidecar(instance)
+        return instance
+
+    def save_sidecar(self, instance) -> None:
+        """
+        Save the parquet sidecar written in `validate` as the sidecar of
+        `instance.file`. This is a no-op if no file was validated.
+        """
+        sidecar_path = getattr(self, "_validated_sidecar_path", None)
+        if sidecar_path is not None:
+            write_parquet_sidecar(instance, sidecar_path)
+            self._validated_sidecar_path = None
@@ -11,11 +11,27 @@ from rest_framework.serializers import ValidationError
 from ...models import Binding
 from ...tasks import promotersetsig_rankedresponse_chained
 from ..filters import BindingFilter
+from ..pagination import OptionalCursorPagination
 from ..serializers import BindingManualQCSerializer, BindingSerializer, PromoterSetSigSerializer
-from .mixins import BulkUploadMixin, ExportTableAsGzipFileMixin, UpdateModifiedMixin
+from .mixins import (
+    BulkUploadMixin,
+    CachedListMixin,
+    ChunkedUploadMixin,
+    ExportTableAsGzipFileMixin,
+    FileDownloadMixin,
+    UpdateModifiedMixin,
+)
 
 
-class BindingViewSet(BulkUploadMixin, UpdateModifiedMixin, ExportTableAsGzipFileMixin, viewsets.ModelViewSet):
+class BindingViewSet(
+    CachedListMixin,
+    BulkUploadMixin,
+    ChunkedUploadMixin,
+    UpdateModifiedMixin,
+    ExportTableAsGzipFileMixin,
+    FileDownloadMixin,
+    viewsets.ModelViewSet,
+):
     """
     A viewset for viewing and editing Binding instances.
     """
@@ -30,6 +46,15 @@ class BindingViewSet(BulkUploadMixin, UpdateModifiedMixin, ExportTableAsGzipFile
     serializer_class = BindingSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = BindingFilter
+    pagination_class = OptionalCursorPagination
+    response_cache_models = [
+        "regulatory_data.Binding",
+        "regulatory_data.BindingManualQC",
+        "regulatory_data.DataSource",
+        "regulatory_data.GenomicFeature",
+        "regulatory_data.Regulator",
+        "users.User",
+    ]
 
     # note that the hop info are added in the FileFormatMixin in the serializers
     @transaction.atomic
@@ -61,7 +86,8 @@ class BindingViewSet(BulkUploadMixin, UpdateModifiedMixin, ExportTableAsGzipFile
                     data={
                         "binding": instance.id,
                         "fileformat": instance.source.fileformat.id,
-                        "file": self.request.data.get("file"),
+                        # a chunked upload passes the assembled file in the context
+                        "file": serializer.context.get("chunked_upload_file", self.request.data.get("file")),
                     },
                     context={"request": self.request},
                 )
@@ -1,19 +1,20 @@
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from yeastregulatorydb.regulatory_data.tasks import promotersetsig_rankedresponse_chained
+from yeastregulatorydb.regulatory_data.tasks import background_hop_counts_task, promotersetsig_rankedresponse_chained
 
 from ...models import Binding, CallingCardsBackground
 from ..filters import CallingCardsBackgroundFilter
 from ..serializers import CallingCardsBackgroundSerializer
-from .mixins.UpdateModifiedMixin import UpdateModifiedMixin
+from .mixins import ChunkedUploadMixin, UpdateModifiedMixin
 
 
-class CallingCardsBackgroundViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
+class CallingCardsBackgroundViewSet(ChunkedUploadMixin, UpdateModifiedMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing CallingCardsBackground instances.
     """
@@ -27,6 +28,8 @@ class CallingCardsBackgroundViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         instance = serializer.save()
+        # precompute the background hop counts of the new background
+        transaction.on_commit(lambda: background_hop_counts_task.delay(background_id=instance.id))
         # this attribute is added to the returned serialized data
         # TODO this is copied code btwn this and BindingViewSet
         instance.promotersetsig_processing = False
@@ -5,10 +5,11 @@ from rest_framework.permissions import IsAuthenticated
 
 from ...models.ChrMap import ChrMap
 from ..serializers.ChrMapSerializer import ChrMapSerializer
+from .mixins.BulkLoadTableMixin import BulkLoadTableMixin
 from .mixins.UpdateModifiedMixin import UpdateModifiedMixin
 
 
-class ChrMapViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
+class ChrMapViewSet(UpdateModifiedMixin, BulkLoadTableMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing ChrMap instances.
     """
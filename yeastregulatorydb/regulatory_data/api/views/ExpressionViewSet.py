@@ -9,14 +9,27 @@ from rest_framework.serializers import ValidationError
 from ...models import Expression
 from ..filters import ExpressionFilter
 from ..serializers import ExpressionManualQCSerializer, ExpressionSerializer
-from .mixins import BulkUploadMixin, ExportTableAsGzipFileMixin, GetCombinedGenomicFileMixin, UpdateModifiedMixin
+from .mixins import (
+    BulkUploadMixin,
+    CachedListMixin,
+    ChunkedUploadMixin,
+    EffectMatrixMixin,
+    ExportTableAsGzipFileMixin,
+    FileDownloadMixin,
+    GetCombinedGenomicFileMixin,
+    UpdateModifiedMixin,
+)
 
 
 class ExpressionViewSet(
+    CachedListMixin,
     BulkUploadMixin,
+    ChunkedUploadMixin,
     UpdateModifiedMixin,
     ExportTableAsGzipFileMixin,
     GetCombinedGenomicFileMixin,
+    EffectMatrixMixin,
+    FileDownloadMixin,
     viewsets.ModelViewSet,
 ):
     """
@@ -35,6 +48,13 @@ class ExpressionViewSet(
     serializer_class = ExpressionSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ExpressionFilter
+    response_cache_models = [
+        "regulatory_data.Expression",
+        "regulatory_data.DataSource",
+        "regulatory_data.GenomicFeature",
+        "regulatory_data.Regulator",
+        "users.User",
+    ]
 
     @transaction.atomic
     def perform_create(self, serializer):
@@ -5,11 +5,14 @@ from rest_framework.permissions import IsAuthenticated
 
 from ...models.GenomicFeature import GenomicFeature
 from ..filters.GenomicFeatureFilter import GenomicFeatureFilter
+from ..pagination import OptionalCursorPagination
 from ..serializers.GenomicFeatureSerializer import GenomicFeatureSerializer
-from .mixins import ExportTableAsGzipFileMixin, UpdateModifiedMixin
+from .mixins import BulkLoadTableMixin, ExportTableAsGzipFileMixin, UpdateModifiedMixin
 
 
-class GenomicFeatureViewSet(UpdateModifiedMixin, ExportTableAsGzipFileMixin, viewsets.ModelViewSet):
+class GenomicFeatureViewSet(
+    UpdateModifiedMixin, ExportTableAsGzipFileMixin, BulkLoadTableMixin, viewsets.ModelViewSet
+):
     """
     A viewset for viewing and editing GenomicFeature instances.
     """
@@ -20,3 +23,4 @@ class GenomicFeatureViewSet(UpdateModifiedMixin, ExportTableAsGzipFileMixin, vie
     serializer_class = GenomicFeatureSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = GenomicFeatureFilter
+    pagination_class = OptionalCursorPagination
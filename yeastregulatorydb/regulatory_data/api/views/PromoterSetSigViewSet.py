@@ -7,12 +7,24 @@ from rest_framework.serializers import ValidationError
 
 from ...models.PromoterSetSig import PromoterSetSig
 from ..filters.PromoterSetSigFilter import PromoterSetSigFilter
+from ..pagination import OptionalCursorPagination
 from ..serializers.PromoterSetSigSerializer import PromoterSetSigSerializer
-from .mixins import ExportTableAsGzipFileMixin, GetCombinedGenomicFileMixin, UpdateModifiedMixin
+from .mixins import (
+    CachedListMixin,
+    EffectMatrixMixin,
+    ExportTableAsGzipFileMixin,
+    GetCombinedGenomicFileMixin,
+    UpdateModifiedMixin,
+)
 
 
 class PromoterSetSigViewSet(
-    UpdateModifiedMixin, ExportTableAsGzipFileMixin, GetCombinedGenomicFileMixin, viewsets.ModelViewSet
+    CachedListMixin,
+    UpdateModifiedMixin,
+    ExportTableAsGzipFileMixin,
+    GetCombinedGenomicFileMixin,
+    EffectMatrixMixin,
+    viewsets.ModelViewSet,
 ):
     """
     A viewset for viewing and editing PromoterSetSig instances.
@@ -35,6 +47,18 @@ class PromoterSetSigViewSet(
     serializer_class = PromoterSetSigSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = PromoterSetSigFilter
+    pagination_class = OptionalCursorPagination
+    response_cache_models = [
+        "regulatory_data.PromoterSetSig",
+        "regulatory_data.Binding",
+        "regulatory_data.BindingManualQC",
+        "regulatory_data.CallingCardsBackground",
+        "regulatory_data.DataSource",
+        "regulatory_data.GenomicFeature",
+        "regulatory_data.PromoterSet",
+        "regulatory_data.Regulator",
+        "users.User",
+    ]
 
     def perform_create(self, serializer):
         try:
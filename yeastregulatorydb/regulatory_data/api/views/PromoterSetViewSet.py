@@ -8,7 +8,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.serializers import ValidationError
 
 from ...models import Binding, PromoterSet
-from ...tasks import promotersetsig_rankedresponse_chained
+from ...tasks import background_hop_counts_task, promotersetsig_rankedresponse_chained
 from ..filters.PromoterSetFilter import PromoterSetFilter
 from ..serializers.PromoterSetSerializer import PromoterSetSerializer
 from .mixins.UpdateModifiedMixin import UpdateModifiedMixin
@@ -26,6 +26,11 @@ class PromoterSetViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = PromoterSetFilter
 
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        # precompute the background hop counts of the new promoter set
+        transaction.on_commit(lambda: background_hop_counts_task.delay(promoterset_id=instance.id))
+
 
 @transaction.atomic
 def perform_create(self, serializer):
@@ -1,7 +1,9 @@
+import gzip
+import hashlib
 import tempfile
 
-import pandas as pd
-from django.http import HttpResponse
+from django.conf import settings
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
@@ -10,13 +12,15 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from ...models import RankResponse
-from ...utils.extract_file_from_storage import extract_file_from_storage
+from ...utils.file_download import file_download_response
+from ...utils.http_validators import conditional_response, ranged_file_response, set_validators, stored_file_checksum
+from ...utils.parquet_sidecar import read_stored_table
 from ..filters.RankResponseFilter import RankResponseFilter
 from ..serializers.RankResponseSerializer import RankResponseSerializer
-from .mixins.UpdateModifiedMixin import UpdateModifiedMixin
+from .mixins import CachedListMixin, FileDownloadMixin, UpdateModifiedMixin
 
 
-class RankResponseViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
+class RankResponseViewSet(CachedListMixin, UpdateModifiedMixin, FileDownloadMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing RankResponse instances.
     """
@@ -33,6 +37,16 @@ class RankResponseViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
     serializer_class = RankResponseSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = RankResponseFilter
+    response_cache_models = [
+        "regulatory_data.RankResponse",
+        "regulatory_data.Binding",
+        "regulatory_data.DataSource",
+        "regulatory_data.Expression",
+        "regulatory_data.GenomicFeature",
+        "regulatory_data.PromoterSetSig",
+        "regulatory_data.Regulator",
+        "users.User",
+    ]
 
     @action(detail=False, methods=["get"])
     def summary(self, request, *args, **kwargs):
@@ -49,15 +63,32 @@ class RankResponseViewSet(UpdateModifiedMixin, viewsets.ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        with tempfile.TemporaryDirectory() as tmpdir:
-            for rank_response_record in filtered_queryset:
-                # Iterate over the filtered queryset
-                filepath = extract_file_from_storage(rank_response_record.file, tmpdir)
-                df = pd.read_csv(filepath, compression="gzip")
-
-            with tempfile.NamedTemporaryFile(suffix=".gz") as tmpfile:
-                df.to_csv(tmpfile.name, compression="gzip", index=False)
-                tmpfile.seek(0)
-                response = HttpResponse(tmpfile, content_type="application/gzip")
-                response["Content-Disposition"] = "attachment; filename=rank_response_summary.csv.gz"
-                return response
+        rank_response_record = filtered_queryset[0]
+        last_modified = rank_response_record.modified_date
+        # the summary is the stored file, so it does not need to be
+        # re-written by the web process if downloads are redirected
+        if settings.FILE_DOWNLOAD_REDIRECT:
+            return file_download_response(
+                request, rank_response_record.file, "rank_response_summary.csv.gz", last_modified=last_modified
+            )
+
+        # the summary is written deterministically from the stored file, so
+        # its ETag is derived from the checksum of the stored file. A request
+        # for an unchanged summary is answered before the file is parsed
+        etag = quote_etag(
+            hashlib.sha256(f"summary:{stored_file_checksum(rank_response_record.file)}".encode()).hexdigest()
+        )
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+
+        df = read_stored_table(rank_response_record, compression="gzip")
+        # the temporary file is deleted once the response is sent
+        tmpfile = tempfile.NamedTemporaryFile(suffix=".gz")
+        # without a file name or timestamp in the gzip header, so that the bytes, and ranges of them, are stable
+        with gzip.GzipFile(filename="", mode="wb", fileobj=tmpfile, mtime=0) as gz:
+            gz.write(df.to_csv(index=False).encode())
+        size = tmpfile.tell()
+        return ranged_file_response(
+            request, tmpfile, size, "rank_response_summary.csv.gz", etag=etag, last_modified=last_modified
+        )
@@ -6,10 +6,10 @@ from rest_framework.permissions import IsAuthenticated
 from ...models.Regulator import Regulator
 from ..filters.RegulatorFilter import RegulatorFilter
 from ..serializers.RegulatorSerializer import RegulatorSerializer
-from .mixins import ExportTableAsGzipFileMixin, UpdateModifiedMixin
+from .mixins import CachedListMixin, ExportTableAsGzipFileMixin, UpdateModifiedMixin
 
 
-class RegulatorViewSet(UpdateModifiedMixin, ExportTableAsGzipFileMixin, viewsets.ModelViewSet):
+class RegulatorViewSet(CachedListMixin, UpdateModifiedMixin, ExportTableAsGzipFileMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing Regulator instances.
     """
@@ -20,3 +20,4 @@ class RegulatorViewSet(UpdateModifiedMixin, ExportTableAsGzipFileMixin, viewsets
     serializer_class = RegulatorSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = RegulatorFilter
+    response_cache_models = ["regulatory_data.Regulator", "regulatory_data.GenomicFeature", "users.User"]
@@ -0,0 +1,32 @@
+from django.db import IntegrityError
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from yeastregulatorydb.regulatory_data.utils.bulk_load_table import bulk_load_table, read_table
+
+
+class BulkLoadTableMixin:
+    """
+    Mixin to add a 'bulk_load' action to a viewset, which validates and
+    inserts a CSV of records in a single transaction. See
+    :func:`~yeastregulatorydb.regulatory_data.utils.bulk_load_table.bulk_load_table`
+    """
+
+    @action(detail=False, methods=["post"])
+    def bulk_load(self, request):
+        """
+        Load the CSV, optionally gzipped, in the `file` field of a multipart
+        request. The columns of the CSV are the fields of the model. Every
+        error in the table is returned, and no records are loaded, if it is
+        not valid
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response("A CSV `file` is required", status=status.HTTP_400_BAD_REQUEST)
+        try:
+            df = read_table(upload.file, name=upload.name)
+            loaded = bulk_load_table(self.queryset.model, df, request.user)
+        except (ValueError, IntegrityError) as exc:
+            return Response(f"Bulk load not valid: {exc}", status=status.HTTP_400_BAD_REQUEST)
+        return Response({"loaded": loaded}, status=status.HTTP_201_CREATED)
@@ -1,18 +1,39 @@
+import contextlib
 import os
 import tarfile
 import tempfile
 
 import pandas as pd
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db import transaction
+from django.http import HttpRequest
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
 from rest_framework.response import Response
 
+from yeastregulatorydb.regulatory_data.api.serializers.mixins.FileValidationMixin import file_validation_error
+from yeastregulatorydb.regulatory_data.tasks.bulk_upload_task import bulk_upload_task
+from yeastregulatorydb.regulatory_data.utils.bulk_upload_job import BulkUploadJob
+from yeastregulatorydb.regulatory_data.utils.validate_genomic_file import validate_genomic_files
+
 from ...serializers import BulkUploadSerializer
 
 
 class BulkUploadMixin:
+    """
+    Mixin to add a 'bulk_upload' action to a viewset, which creates a record
+    for each row of a samplesheet CSV, with the files of the records in a
+    tar. Either every record is created or none are.
+
+    If `as_job` is set, the samplesheet and tar are staged to the default
+    storage, and the upload runs as a celery job. The response is the job
+    id, and the progress of the job is reported by the 'bulk_upload_status'
+    action.
+    """
+
     def get_serializer_class(self):
         if self.action == "bulk_upload":
             # Store the original serializer class
@@ -21,67 +42,205 @@ class BulkUploadMixin:
             self.serializer_class = BulkUploadSerializer
         return super().get_serializer_class()
 
-    @action(detail=False, methods=["post"])
-    def bulk_upload(self, request):
-        bulk_serializer = self.get_serializer(data=request.data)
-        if bulk_serializer.is_valid():
-            # create a temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # open the tar file and extract it to the temporary directory
-                with tarfile.open(fileobj=bulk_serializer.validated_data["tarred_dir"]) as tar:
-                    tar.extractall(path=temp_dir)
-
-                # create a dict where the keys are the filenames and the values are the file paths
-                file_mapping = {}
-                for dirpath, dirnames, filenames in os.walk(temp_dir):
-                    for file in filenames:
-                        if file not in file_mapping:
-                            file_mapping[file] = os.path.join(dirpath, file)
-                        else:
-                            raise ValueError(f"Duplicate file name {file} in the tar file. Filenames must be unique!")
-
-                df = pd.read_csv(bulk_serializer.validated_data["csv_file"])
-                if "file" not in df.columns:
-                    return Response("Column 'file' not found in CSV", status=status.HTTP_400_BAD_REQUEST)
-                # ensure that only the basename is in the `file` column
-                df["file"] = df["file"].apply(os.path.basename)
-                # if there is a nonunique filename in the CSV, return a 400 response
-                if len(df["file"].unique()) != len(df["file"]):
-                    return Response(
-                        "Duplicate filename in CSV. the `file` column must have unique file BASENAMES",
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+    @classmethod
+    def for_bulk_upload_job(cls, user) -> "BulkUploadMixin":
+        """
+        Create an instance of the viewset which runs a bulk upload outside of
+        a request, eg in a celery job, as `user`.
+
+        :param user: the user who submitted the upload
+        :type user: User
+
+        :return: the viewset
+        :rtype: BulkUploadMixin
+        """
+        http_request = HttpRequest()
+        http_request.method = "POST"
+        request = Request(http_request)
+        request.user = user
+        view = cls(request=request, format_kwarg=None, action="bulk_upload", args=(), kwargs={})  # type: ignore
+        view.get_serializer_class()
+        return view
+
+    def validate_bulk_upload_files(self, serializers: list[tuple], job: BulkUploadJob | None = None) -> list[str]:
+        """
+        Validate the files of the bulk upload serializers on a pool of
+        `FILE_VALIDATION_WORKERS` processes, see
+        :func:`~yeastregulatorydb.regulatory_data.utils.validate_genomic_file.validate_genomic_files`,
+        and add the results to the serializers. Serializers without a
+        `file_validation_args`, eg Binding records of a
+        NULL_BINDING_FILE_DATASOURCES source, have no file to validate.
+
+        :param serializers: the (row index, file path, serializer) of each row
+        :type serializers: list[tuple]
+        :param job: the job of the upload, if it runs as a job. Defaults to None
+        :type job: BulkUploadJob, optional
+
+        :return: an error message for each invalid file
+        :rtype: list[str]
+        """
+        jobs = [
+            (index, serializer, (path, *serializer.file_validation_args))
+            for index, path, serializer in serializers
+            if hasattr(serializer, "file_validation_args")
+        ]
+        if job is not None:
+            for index, _, serializer in serializers:
+                if not hasattr(serializer, "file_validation_args"):
+                    job.row_valid(index)
+
+        errors: dict[int, str] = {}
+
+        def on_result(i: int, result) -> None:
+            index, serializer, (_, separator, _) = jobs[i]
+            if isinstance(result, Exception):
+                errors[i] = f"Error in row {index}: {file_validation_error(result, separator).detail}"
+                if job is not None:
+                    job.row_invalid(index, errors[i])
+            else:
+                serializer.apply_file_validation(serializer.validated_data, result)
+                if job is not None:
+                    job.row_valid(index)
+
+        validate_genomic_files([args for _, _, args in jobs], on_result=on_result)
+
+        if errors:
+            # the sidecars of the valid files are not saved
+            for _, serializer, _ in jobs:
+                sidecar_path = getattr(serializer, "_validated_sidecar_path", None)
+                if sidecar_path is not None and os.path.exists(sidecar_path):
+                    os.unlink(sidecar_path)
+        return [errors[i] for i in sorted(errors)]
+
+    def run_bulk_upload(self, csv_file, tarred_dir, job: BulkUploadJob | None = None) -> list[str]:
+        """
+        Validate every row of the samplesheet, and, if they are all valid,
+        create the records in a single transaction.
 
-                default_serializer_list = []
-                errors = []
+        :param csv_file: the samplesheet. The `file` column is the name of the
+            file of each record in the tar
+        :type csv_file: a path or file object
+        :param tarred_dir: the tar, which may be compressed, of the files
+        :type tarred_dir: a file object
+        :param job: the job of the upload, if it runs as a job. Defaults to None
+        :type job: BulkUploadJob, optional
 
+        :return: the errors in the upload. If there are any, no records are created
+        :rtype: list[str]
+
+        :raises ValidationError: if a record cannot be saved, in which case no
+            records are created
+        """
+        # create a temporary directory
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # open the tar file and extract it to the temporary directory
+            with tarfile.open(fileobj=tarred_dir) as tar:
+                tar.extractall(path=temp_dir)
+
+            # create a dict where the keys are the filenames and the values are the file paths
+            file_mapping = {}
+            for dirpath, dirnames, filenames in os.walk(temp_dir):
+                for file in filenames:
+                    if file not in file_mapping:
+                        file_mapping[file] = os.path.join(dirpath, file)
+                    else:
+                        raise ValueError(f"Duplicate file name {file} in the tar file. Filenames must be unique!")
+
+            df = pd.read_csv(csv_file)
+            if "file" not in df.columns:
+                return ["Column 'file' not found in CSV"]
+            # ensure that only the basename is in the `file` column
+            df["file"] = df["file"].apply(os.path.basename)
+            # if there is a nonunique filename in the CSV, return a 400 response
+            if len(df["file"].unique()) != len(df["file"]):
+                return ["Duplicate filename in CSV. the `file` column must have unique file BASENAMES"]
+
+            if job is not None:
+                job.start(list(zip(df.index.tolist(), df["file"].tolist())))
+
+            default_serializer_list = []
+            errors = []
+
+            with contextlib.ExitStack() as files:
                 for index, row in df.iterrows():
                     row_dict = row.to_dict()
                     try:
-                        with open(file_mapping[row_dict["file"]], "rb") as f:
-                            row_dict["file"] = SimpleUploadedFile(row_dict["file"], f.read())
+                        path = file_mapping[row_dict["file"]]
                     except KeyError:
                         errors.append(f"File {row_dict['file']} in the CSV not found in the tar file")
+                        if job is not None:
+                            job.row_invalid(index, errors[-1])
                         # continue checking the rest of the samplesheet so that the user gets all
                         # errors rather than having to repeatedly submit
                         continue
+                    # the file is passed by path, and is only read when it is validated and saved
+                    row_dict["file"] = files.enter_context(File(open(path, "rb"), name=row_dict["file"]))
 
-                    default_serializer = self.default_serializer_class(data=row_dict, context={"request": request})
+                    # the files are validated below, all at once
+                    default_serializer = self.default_serializer_class(
+                        data=row_dict, context={"request": self.request, "defer_file_validation": True}
+                    )
 
                     if default_serializer.is_valid():
-                        default_serializer_list.append(default_serializer)
+                        default_serializer_list.append((index, path, default_serializer))
                     else:
                         errors.append(f"Error in row {index}: {default_serializer.errors}")
+                        if job is not None:
+                            job.row_invalid(index, errors[-1])
 
                 if errors:
-                    return Response("\n".join(errors), status=status.HTTP_400_BAD_REQUEST)
+                    return errors
 
+                errors = self.validate_bulk_upload_files(default_serializer_list, job)
+                if errors:
+                    return errors
+
+                if job is not None:
+                    job.saving()
                 # Save the serializers in a transaction so that if one fails,
                 # none of the serializers in the list are saved
                 with transaction.atomic():
-                    for serializer in default_serializer_list:
+                    for index, _, serializer in default_serializer_list:
                         self.perform_create(serializer)
-                return Response("Bulk upload successful", status=status.HTTP_201_CREATED)
+                        if job is not None:
+                            job.row_saved(index)
+        return []
 
-        else:
+    @action(detail=False, methods=["post"])
+    def bulk_upload(self, request):
+        bulk_serializer = self.get_serializer(data=request.data)
+        if not bulk_serializer.is_valid():
             return Response(f"Bulk upload not valid: {bulk_serializer.errors}", status=status.HTTP_400_BAD_REQUEST)
+
+        if bulk_serializer.validated_data["as_job"]:
+            job = BulkUploadJob.create(request.user.pk, self.queryset.model.__name__)
+            staging_dir = f"bulk_upload/{job.job_id}"
+            csv_path = default_storage.save(
+                f"{staging_dir}/samplesheet.csv", bulk_serializer.validated_data["csv_file"]
+            )
+            tar_path = default_storage.save(f"{staging_dir}/files.tar", bulk_serializer.validated_data["tarred_dir"])
+            viewset = f"{type(self).__module__}.{type(self).__name__}"
+            transaction.on_commit(
+                lambda: bulk_upload_task.delay(viewset, request.user.pk, job.job_id, csv_path, tar_path)
+            )
+            return Response({"job_id": job.job_id}, status=status.HTTP_202_ACCEPTED)
+
+        errors = self.run_bulk_upload(
+            bulk_serializer.validated_data["csv_file"], bulk_serializer.validated_data["tarred_dir"]
+        )
+        if errors:
+            return Response("\n".join(errors), status=status.HTTP_400_BAD_REQUEST)
+        return Response("Bulk upload successful", status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["get"])
+    def bulk_upload_status(self, request):
+        """
+        Report the progress of the bulk upload job `job_id`: the job status,
+        the status and error of each row, and the throughput of the job. See
+        :class:`~yeastregulatorydb.regulatory_data.utils.bulk_upload_job.BulkUploadJob`
+        """
+        job = BulkUploadJob.get(request.query_params.get("job_id", ""))
+        # a job is only reported to the user who submitted it
+        if job is None or (job.state["user_id"] != request.user.pk and not request.user.is_staff):
+            raise NotFound("No bulk upload job with that job_id")
+        return Response(job.as_dict())
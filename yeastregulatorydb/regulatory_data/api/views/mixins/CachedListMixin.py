@@ -0,0 +1,47 @@
+from django.conf import settings
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from yeastregulatorydb.regulatory_data.utils.response_cache import response_cache
+
+
+class CachedListMixin:
+    """
+    Mixin to serve the `list` responses of a viewset from the
+    :class:`~yeastregulatorydb.regulatory_data.utils.response_cache.ResponseCache`.
+    A cached page is served without querying the records, or counting them
+    for the pagination. The response has an `X-Response-Cache` header, which
+    is `hit` or `miss`.
+
+    `response_cache_models` are the labels of the models whose records are
+    in, or filter, the response. A change to any of them invalidates the
+    cached responses of the viewset. The `cache_stats` action reports the hit
+    ratio of the viewset.
+
+    The cache is disabled if `RESPONSE_CACHE_TIMEOUT` is 0.
+    """
+
+    response_cache_models: list[str] = []
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_TIMEOUT:
+            return super().list(request, *args, **kwargs)  # type: ignore[misc]
+        viewset = type(self).__name__
+        key = response_cache.key(viewset, request, self.response_cache_models)
+        data = response_cache.get(viewset, key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = super().list(request, *args, **kwargs)  # type: ignore[misc]
+            if response.status_code == 200:
+                response_cache.set(key, response.data)
+        response["X-Response-Cache"] = "miss" if data is None else "hit"
+        return response
+
+    @action(detail=False, methods=["get"])
+    def cache_stats(self, request):
+        """
+        Report the number of list responses of the viewset which were served
+        from the cache, and which were not, and the hit ratio
+        """
+        return Response(response_cache.stats(type(self).__name__))
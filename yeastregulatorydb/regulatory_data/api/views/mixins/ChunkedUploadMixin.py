@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from yeastregulatorydb.regulatory_data.utils.chunked_upload import ChunkedUpload
+
+_UPLOAD_PATH = r"chunked_upload/(?P<upload_id>[0-9a-f]{32})"
+
+
+class ChunkedUploadMixin:
+    """
+    Mixin to add a resumable, chunked upload of the file of a record to a
+    viewset. The protocol is:
+
+    1. POST `chunked_upload/` with the `filename` and, optionally, the
+       `size` and `sha256` of the file. The response has the `upload_id`
+       and the maximum chunk size.
+    2. PUT each chunk, as the raw request body, to
+       `chunked_upload/<upload_id>/chunks/<number>/`, numbered from 1, with
+       the sha256 hex digest of the chunk in the `X-Chunk-Sha256` header.
+       Chunks may be sent in any order, and in parallel. GET
+       `chunked_upload/<upload_id>/` lists the chunks which have been
+       received, eg to resume an interrupted upload.
+    3. POST the fields of the record to `chunked_upload/<upload_id>/finalize/`.
+       The chunks are assembled, and the record is created from the fields
+       and the file as in a `create` request. The assembled file is not in
+       `request.data`, so it is also passed to `perform_create` in the
+       serializer context as `chunked_upload_file`.
+
+    DELETE `chunked_upload/<upload_id>/` abandons the upload. See
+    :class:`~yeastregulatorydb.regulatory_data.utils.chunked_upload.ChunkedUpload`
+    """
+
+    def _get_chunked_upload(self, upload_id: str) -> ChunkedUpload:
+        upload = ChunkedUpload.get(upload_id)
+        # an upload is only visible to the user who started it
+        if (
+            upload is None
+            or upload.state["user_id"] != self.request.user.pk  # type: ignore[attr-defined]
+            or upload.state["model"] != self.queryset.model.__name__  # type: ignore[attr-defined]
+        ):
+            raise NotFound("No chunked upload with that upload_id")
+        return upload
+
+    @action(detail=False, methods=["post"])
+    def chunked_upload(self, request):
+        """
+        Start a chunked upload of a file with `filename`, and, optionally,
+        `size` in bytes and `sha256` hex digest, which are checked when the
+        upload is finalized
+        """
+        filename = request.data.get("filename")
+        if not filename:
+            return Response("A `filename` is required", status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = int(request.data["size"]) if request.data.get("size") not in (None, "") else None
+        except ValueError:
+            return Response("`size` must be an integer", status=status.HTTP_400_BAD_REQUEST)
+        upload = ChunkedUpload.create(
+            request.user.pk, self.queryset.model.__name__, filename, size=size, sha256=request.data.get("sha256")
+        )
+        return Response(
+            {**upload.as_dict(), "max_chunk_bytes": settings.CHUNKED_UPLOAD_MAX_CHUNK_BYTES},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=["get", "delete"], url_path=_UPLOAD_PATH)
+    def chunked_upload_status(self, request, upload_id=None):
+        """List the chunks of the upload which have been received, or, on DELETE, abandon it"""
+        upload = self._get_chunked_upload(upload_id)
+        if request.method == "DELETE":
+            upload.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(upload.as_dict())
+
+    @action(detail=False, methods=["put"], url_path=_UPLOAD_PATH + r"/chunks/(?P<number>[0-9]+)")
+    def chunked_upload_chunk(self, request, upload_id=None, number=None):
+        """
+        Receive a chunk of the upload. The body is not parsed, but is streamed
+        to storage, and must match the sha256 in the `X-Chunk-Sha256` header
+        """
+        upload = self._get_chunked_upload(upload_id)
+        sha256 = request.headers.get("X-Chunk-Sha256")
+        if not sha256:
+            return Response("The `X-Chunk-Sha256` header is required", status=status.HTTP_400_BAD_REQUEST)
+        if request.stream is None:
+            return Response("The chunk is empty", status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk = upload.write_chunk(int(number), request.stream, sha256)
+        except ValueError as exc:
+            return Response(str(exc), status=status.HTTP_400_BAD_REQUEST)
+        return Response(chunk, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"], url_path=_UPLOAD_PATH + r"/finalize")
+    def chunked_upload_finalize(self, request, upload_id=None):
+        """
+        Assemble the chunks of the upload, and create a record from the
+        fields in the request and the assembled file, which is validated by
+        the serializer as in a `create` request. The chunks are deleted once
+        the record is committed
+        """
+        upload = self._get_chunked_upload(upload_id)
+        try:
+            file = upload.assemble()
+        except ValueError as exc:
+            return Response(str(exc), status=status.HTTP_400_BAD_REQUEST)
+        with file:
+            data = request.data.dict() if hasattr(request.data, "dict") else dict(request.data)
+            data["file"] = file
+            serializer = self.get_serializer(  # type: ignore[attr-defined]
+                data=data,
+                context={**self.get_serializer_context(), "chunked_upload_file": file},  # type: ignore[attr-defined]
+            )
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)  # type: ignore[attr-defined]
+        transaction.on_commit(upload.delete)
+        headers = self.get_success_headers(serializer.data)  # type: ignore[attr-defined]
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -0,0 +1,129 @@
+import io
+import logging
+
+import numpy as np
+import pyarrow as pa
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+
+from yeastregulatorydb.regulatory_data.tasks import effect_matrix_task
+from yeastregulatorydb.regulatory_data.utils.effect_matrix import (
+    EFFECT_MATRIX_GROUP_LOOKUPS,
+    EFFECT_MATRIX_VALUES,
+    claim_effect_matrix_build,
+    get_effect_matrix,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EffectMatrixUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The matrix of this group is being built. Try again later"
+    default_code = "effect_matrix_unavailable"
+
+
+def _parse_ids(request, name: str) -> list[int] | None:
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError as exc:
+        raise ValidationError({name: "Must be a comma separated list of integer ids"}) from exc
+
+
+class EffectMatrixMixin:
+    """
+    Mixin to add a 'matrix' action to a viewset, which returns a block of the
+    memory-mapped regulator x target matrix of the effects, or pvalues, of a
+    group of records, eg the Expression records of a DataSource. See
+    :class:`~yeastregulatorydb.regulatory_data.utils.effect_matrix.EffectMatrix`
+    """
+
+    @action(detail=False, methods=["get"])
+    def matrix(self, request, *args, **kwargs):
+        """
+        Return a block of the regulator x target matrix of a group of records.
+        If the records of the group have changed since the matrix was last
+        built, it is regenerated, incrementally, by a celery task, and the
+        last complete version is returned until the task finishes. If the
+        matrix has not been built yet, the response is a 503.
+
+        The query parameters are:
+
+        - the group fields of the model, eg `source` for Expression, and
+          `source` and `promoter` for PromoterSetSig. Required
+        - `value`: `effect` (default) or `pvalue`
+        - `records` or `regulators`: comma separated record ids, or regulator
+          GenomicFeature ids, of the rows. Defaults to every row
+        - `targets`: comma separated target GenomicFeature ids of the
+          columns. Defaults to every column
+        - `output_format`: `arrow` (default), an Arrow IPC stream of a table with a
+          `record_id` and `regulator_id` column, and a column named by each
+          target id, or `npz`, a numpy archive of the arrays `values`,
+          `record_id`, `regulator_id` and `target_id`
+
+        The other filters of the viewset do not apply to this action. Note that
+        `format` is the DRF content negotiation parameter.
+        """
+        model = self.get_queryset().model
+        group = {}
+        for field in EFFECT_MATRIX_GROUP_LOOKUPS[model]:
+            ids = _parse_ids(request, field)
+            if not ids or len(ids) != 1:
+                raise ValidationError({field: "A single integer id is required"})
+            group[field] = ids[0]
+
+        value = request.query_params.get("value", "effect")
+        if value not in EFFECT_MATRIX_VALUES:
+            raise ValidationError({"value": f"Must be one of {EFFECT_MATRIX_VALUES}"})
+        output_format = request.query_params.get("output_format", "arrow")
+        if output_format not in ["arrow", "npz"]:
+            raise ValidationError({"output_format": "Must be one of ['arrow', 'npz']"})
+
+        try:
+            matrix, up_to_date = get_effect_matrix(model, **group)
+        except LookupError as exc:
+            raise NotFound(str(exc)) from exc
+        if not up_to_date and claim_effect_matrix_build(model, group):
+            effect_matrix_task.delay(model.__name__, group)
+        if matrix is None:
+            raise EffectMatrixUnavailable()
+
+        try:
+            rows = matrix.row_index(
+                record_ids=_parse_ids(request, "records"), regulator_ids=_parse_ids(request, "regulators")
+            )
+            columns = matrix.column_index(target_ids=_parse_ids(request, "targets"))
+        except ValueError as exc:
+            raise ValidationError({"detail": str(exc)}) from exc
+
+        # column major, so that each column of the arrow table is a view
+        block = np.asfortranarray(matrix.select(value, rows, columns))
+        record_ids = matrix.record_ids[rows]
+        regulator_ids = matrix.regulator_ids[rows]
+        target_ids = matrix.target_ids[columns]
+
+        if output_format == "npz":
+            buffer = io.BytesIO()
+            np.savez(buffer, values=block, record_id=record_ids, regulator_id=regulator_ids, target_id=target_ids)
+            response = HttpResponse(buffer.getvalue(), content_type="application/octet-stream")
+            response["Content-Disposition"] = f"attachment; filename={value}_matrix.npz"
+            return response
+
+        table = pa.table(
+            {
+                "record_id": record_ids,
+                "regulator_id": regulator_ids,
+                **{str(target_id): block[:, column] for column, target_id in enumerate(target_ids.tolist())},
+            }
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        response = HttpResponse(sink.getvalue().to_pybytes(), content_type="application/vnd.apache.arrow.stream")
+        response["Content-Disposition"] = f"attachment; filename={value}_matrix.arrow"
+        return response
@@ -1,7 +1,12 @@
-import pandas as pd
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import connections
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import action
 
+from yeastregulatorydb.regulatory_data.utils.gzip_csv_stream import gzip_stream
+from yeastregulatorydb.regulatory_data.utils.http_validators import conditional_response, queryset_etag, set_validators
+from yeastregulatorydb.regulatory_data.utils.queryset_csv_stream import queryset_copy_stream, queryset_csv_stream
+
 
 class ExportTableAsGzipFileMixin:
     """
@@ -10,20 +15,33 @@ class ExportTableAsGzipFileMixin:
 
     @action(detail=False, methods=["get"])
     def export(self, request):
+        """
+        Stream the filtered queryset as a gzipped CSV, with a column for each
+        field, and annotation, of the model. The rows are read from the
+        database, and compressed, `EXPORT_TABLE_CHUNKSIZE` rows at a time, so
+        memory use does not depend on the size of the table. If
+        `EXPORT_TABLE_USE_COPY` is set, and the database is PostgreSQL, the
+        CSV is written by the database with `COPY ... TO STDOUT`.
+
+        The response has a weak ETag, and an unchanged export is answered
+        with a 304. Range requests are not supported, since the CSV is
+        generated as it is sent
+        """
         # Get the queryset and apply any filters
         queryset = self.filter_queryset(self.get_queryset())
 
-        # Convert the filtered queryset to a DataFrame
-        df = pd.DataFrame.from_records(queryset.values())
-
-        # Create a HttpResponse object with the appropriate CSV header.
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f'attachment; filename="{self.queryset.model.__name__}.csv.gz"'
+        etag = queryset_etag(request, queryset, labels=getattr(self, "response_cache_models", []))
+        not_modified = conditional_response(request, etag, None)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, None)
 
-        # Write the DataFrame to a CSV string and compress it
-        csv_data = df.to_csv(index=False, compression="gzip")
+        if settings.EXPORT_TABLE_USE_COPY and connections[queryset.db].vendor == "postgresql":
+            csv_chunks = queryset_copy_stream(queryset)
+        else:
+            csv_chunks = queryset_csv_stream(queryset, chunk_size=settings.EXPORT_TABLE_CHUNKSIZE)
 
-        # Set the compressed CSV data as the content of the response
-        response.content = csv_data
+        response = StreamingHttpResponse(gzip_stream(csv_chunks), content_type="application/gzip")
+        response["Content-Disposition"] = f'attachment; filename="{self.queryset.model.__name__}.csv.gz"'
+        response["Accept-Ranges"] = "none"
 
-        return response
+        return set_validators(response, etag, None)
@@ -0,0 +1,23 @@
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+
+from yeastregulatorydb.regulatory_data.utils.file_download import file_download_response
+
+
+class FileDownloadMixin:
+    """
+    Mixin to add a 'download' action to a viewset, which responds with the
+    stored `file` of a record. If `FILE_DOWNLOAD_REDIRECT` is set, this is a
+    redirect to the storage, so that the web process does not proxy the
+    file. Otherwise, the response has the ETag and Last-Modified validators,
+    and supports conditional and byte range requests. See
+    :func:`~yeastregulatorydb.regulatory_data.utils.file_download.file_download_response`
+    """
+
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        """Download the file of the record"""
+        record = self.get_object()
+        if not record.file:
+            raise NotFound(f"{type(record).__name__} {record.pk} has no file")
+        return file_download_response(request, record.file, last_modified=record.modified_date)
@@ -1,6 +1,21 @@
+from .BulkLoadTableMixin import BulkLoadTableMixin
 from .BulkUploadMixin import BulkUploadMixin
+from .CachedListMixin import CachedListMixin
+from .ChunkedUploadMixin import ChunkedUploadMixin
+from .EffectMatrixMixin import EffectMatrixMixin
 from .ExportTableAsGzipFileMixin import ExportTableAsGzipFileMixin
+from .FileDownloadMixin import FileDownloadMixin
 from .GetCombinedGenomicFileMixin import GetCombinedGenomicFileMixin
 from .UpdateModifiedMixin import UpdateModifiedMixin
 
-__all__ = ["BulkUploadMixin", "UpdateModifiedMixin", "ExportTableAsGzipFileMixin", "GetCombinedGenomicFileMixin"]
+__all__ = [
+    "BulkLoadTableMixin",
+    "BulkUploadMixin",
+    "CachedListMixin",
+    "ChunkedUploadMixin",
+    "UpdateModifiedMixin",
+    "ExportTableAsGzipFileMixin",
+    "FileDownloadMixin",
+    "GetCombinedGenomicFileMixin",
+    "EffectMatrixMixin",
+]
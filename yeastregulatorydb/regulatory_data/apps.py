@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RegulatoryDataConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "yeastregulatorydb.regulatory_data"
+
+    def ready(self):
+        # connects the receiver which versions the response cache
+        import yeastregulatorydb.regulatory_data.utils.response_cache  # noqa: F401
@@ -0,0 +1,76 @@
+import logging
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from yeastregulatorydb.regulatory_data.api.serializers import FileFormatSerializer
+from yeastregulatorydb.regulatory_data.models import (
+    Binding,
+    CallingCardsBackground,
+    Expression,
+    PromoterSetSig,
+    RankResponse,
+)
+from yeastregulatorydb.regulatory_data.utils.extract_file_from_storage import extract_file_from_storage
+from yeastregulatorydb.regulatory_data.utils.parquet_sidecar import ParquetSidecarWriter, write_parquet_sidecar
+from yeastregulatorydb.regulatory_data.utils.validate_genomic_file import read_csv_dtypes
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_MODELS = {
+    "binding": Binding,
+    "callingcardsbackground": CallingCardsBackground,
+    "expression": Expression,
+    "promotersetsig": PromoterSetSig,
+    "rankresponse": RankResponse,
+}
+
+
+class Command(BaseCommand):
+    help = "Write parquet sidecars for records with a `file` but no `sidecar`"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=list(SIDECAR_MODELS.keys()),
+            nargs="*",
+            default=list(SIDECAR_MODELS.keys()),
+            help="The models to backfill. Defaults to all models with a `sidecar` field",
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Rewrite sidecars which already exist",
+        )
+
+    def handle(self, *args, **options):
+        for model_name in options["model"]:
+            queryset = SIDECAR_MODELS[model_name].objects.exclude(file="").exclude(file__isnull=True)
+            if not options["overwrite"]:
+                queryset = queryset.filter(sidecar__isnull=True) | queryset.filter(sidecar="")
+            written = 0
+            for record in queryset.iterator():
+                fileformat = record.get_fileformat()
+                fields = FileFormatSerializer(fileformat).fields_as_types
+                sidecar_writer = ParquetSidecarWriter(fields)
+                try:
+                    for df in pd.read_csv(
+                        extract_file_from_storage(record.file),
+                        sep=fileformat.separator,
+                        compression="gzip",
+                        dtype=read_csv_dtypes(fields),
+                        chunksize=settings.FILE_VALIDATION_CHUNKSIZE,
+                    ):
+                        sidecar_writer.write(df)
+                except (OSError, ValueError) as exc:
+                    sidecar_writer.discard()
+                    logger.error("Could not write sidecar for %s %s: %s", model_name, record.pk, exc)
+                    continue
+                sidecar_path = sidecar_writer.close()
+                if sidecar_path is None:
+                    logger.error("Could not write sidecar for %s %s", model_name, record.pk)
+                    continue
+                write_parquet_sidecar(record, sidecar_path)
+                written += 1
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} {model_name} sidecars"))
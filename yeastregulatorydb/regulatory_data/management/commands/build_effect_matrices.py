@@ -0,0 +1,52 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from yeastregulatorydb.regulatory_data.models import Expression, PromoterSetSig
+from yeastregulatorydb.regulatory_data.utils.effect_matrix import EFFECT_MATRIX_GROUP_LOOKUPS, build_effect_matrix
+
+logger = logging.getLogger(__name__)
+
+EFFECT_MATRIX_MODELS = {
+    "expression": Expression,
+    "promotersetsig": PromoterSetSig,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Build, or incrementally regenerate, the regulator x target effect matrices of every group of records "
+        "in EFFECT_MATRIX_DIR, so that the matrix action can serve them without waiting for the build task"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=list(EFFECT_MATRIX_MODELS.keys()),
+            nargs="*",
+            default=list(EFFECT_MATRIX_MODELS.keys()),
+            help="The models whose matrices are built. Defaults to all models with effect matrices",
+        )
+
+    def handle(self, *args, **options):
+        for model_name in options["model"]:
+            model = EFFECT_MATRIX_MODELS[model_name]
+            lookups = EFFECT_MATRIX_GROUP_LOOKUPS[model]
+            # records without a value for a group field, eg a PromoterSetSig
+            # without a promoter, are not in a matrix
+            groups = (
+                model.objects.filter(**{f"{lookup}__isnull": False for lookup in lookups.values()})
+                .order_by()
+                .values_list(*lookups.values())
+                .distinct()
+            )
+            built = 0
+            for values in groups:
+                group = dict(zip(lookups, values))
+                try:
+                    build_effect_matrix(model, **group)
+                except (OSError, ValueError) as exc:
+                    logger.error("Could not build the %s matrix of %s: %s", model_name, group, exc)
+                    continue
+                built += 1
+            self.stdout.write(self.style.SUCCESS(f"Built {built} {model_name} effect matrices"))
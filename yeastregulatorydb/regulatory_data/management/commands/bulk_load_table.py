@@ -0,0 +1,47 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from yeastregulatorydb.regulatory_data.utils.bulk_load_table import BULK_LOAD_MODELS, bulk_load_table, read_table
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate and load a CSV, optionally gzipped, of ChrMap or GenomicFeature records, eg a genome annotation, "
+        "in a single transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=list(BULK_LOAD_MODELS.keys()), help="The model of the records")
+        parser.add_argument("path", help="Path to the CSV. The columns are the model fields, eg `chr`, `start`")
+        parser.add_argument("--user", required=True, help="The username of the uploader of the records")
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Insert the records with bulk_create rather than COPY FROM STDIN",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="The number of rows inserted at a time. Defaults to 5000"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist as exc:
+            raise CommandError(f"User {options['user']} does not exist") from exc
+
+        df = read_table(options["path"])
+        try:
+            loaded = bulk_load_table(
+                BULK_LOAD_MODELS[options["model"]],
+                df,
+                user,
+                use_copy=not options["no_copy"],
+                batch_size=options["batch_size"],
+            )
+        except ValueError as exc:
+            raise CommandError(f"The table is not valid:\n{exc}") from exc
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} {options['model']} records"))
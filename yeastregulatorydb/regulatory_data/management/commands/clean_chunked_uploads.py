@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from yeastregulatorydb.regulatory_data.utils.chunked_upload import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the chunks, in the default storage, of the chunked uploads which expired after "
+        "CHUNKED_UPLOAD_TIMEOUT seconds without being finalized or abandoned. Run this periodically, eg daily"
+    )
+
+    def handle(self, *args, **options):
+        deleted = ChunkedUpload.delete_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted the chunks of {deleted} expired uploads"))
@@ -0,0 +1,50 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from yeastregulatorydb.regulatory_data.models import Expression, PromoterSetSig
+from yeastregulatorydb.regulatory_data.utils.combined_effects import materialize_combined_effects
+from yeastregulatorydb.regulatory_data.utils.prefetch_stored_files import prefetch_stored_files
+
+logger = logging.getLogger(__name__)
+
+COMBINED_EFFECT_MODELS = {
+    "expression": Expression,
+    "promotersetsig": PromoterSetSig,
+}
+
+
+class Command(BaseCommand):
+    help = "Materialize the combined effects of records whose materialized effects are missing or out of date"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=list(COMBINED_EFFECT_MODELS.keys()),
+            nargs="*",
+            default=list(COMBINED_EFFECT_MODELS.keys()),
+            help="The models to materialize. Defaults to all models with materialized combined effects",
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Rematerialize effects which are up to date",
+        )
+
+    def handle(self, *args, **options):
+        for model_name in options["model"]:
+            queryset = COMBINED_EFFECT_MODELS[model_name].objects.exclude(file="").exclude(file__isnull=True)
+            if not options["overwrite"]:
+                queryset = queryset.filter(
+                    Q(effects_modified_date__isnull=True) | ~Q(effects_modified_date=F("modified_date"))
+                )
+            written = 0
+            for record in prefetch_stored_files(queryset.iterator()):
+                try:
+                    materialize_combined_effects(record)
+                except (OSError, ValueError) as exc:
+                    logger.error("Could not materialize the effects of %s %s: %s", model_name, record.pk, exc)
+                    continue
+                written += 1
+            self.stdout.write(self.style.SUCCESS(f"Materialized the effects of {written} {model_name} records"))
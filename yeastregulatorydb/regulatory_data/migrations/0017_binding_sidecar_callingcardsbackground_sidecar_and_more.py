@@ -0,0 +1,67 @@
+# Generated by Django 4.2.8 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("regulatory_data", "0016_alter_bindingmanualqc_best_datatype_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="binding",
+            name="sidecar",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+                null=True,
+                upload_to="temp",
+            ),
+        ),
+        migrations.AddField(
+            model_name="callingcardsbackground",
+            name="sidecar",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+                null=True,
+                upload_to="temp",
+            ),
+        ),
+        migrations.AddField(
+            model_name="expression",
+            name="sidecar",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+                null=True,
+                upload_to="temp",
+            ),
+        ),
+        migrations.AddField(
+            model_name="promotersetsig",
+            name="sidecar",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+                null=True,
+                upload_to="temp",
+            ),
+        ),
+        migrations.AddField(
+            model_name="rankresponse",
+            name="sidecar",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+                null=True,
+                upload_to="temp",
+            ),
+        ),
+    ]
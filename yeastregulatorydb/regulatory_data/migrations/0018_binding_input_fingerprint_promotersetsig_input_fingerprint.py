@@ -0,0 +1,36 @@
+# Generated by Django 4.2.8 on 2026-10-17 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("regulatory_data", "0017_binding_sidecar_callingcardsbackground_sidecar_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="binding",
+            name="input_fingerprint",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="For combined records, a fingerprint of the replicates in `file`. Used to skip recombining",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="promotersetsig",
+            name="input_fingerprint",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="A fingerprint of the inputs which produced `file`. Used to skip unchanged recalculations",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.8 on 2026-10-17 08:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("regulatory_data", "0018_binding_input_fingerprint_promotersetsig_input_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expression",
+            name="effects_modified_date",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="The `modified_date` of the record when its combined effects were materialized. The materialized effects are up to date if this equals `modified_date`",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="promotersetsig",
+            name="effects_modified_date",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="The `modified_date` of the record when its combined effects were materialized. The materialized effects are up to date if this equals `modified_date`",
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="PromoterSetSigEffect",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "regulator_id",
+                    models.IntegerField(help_text="The GenomicFeature id of the regulator of the record"),
+                ),
+                (
+                    "target_id",
+                    models.IntegerField(
+                        blank=True,
+                        help_text="The GenomicFeature id of the target, or null if the record has no targets",
+                        null=True,
+                    ),
+                ),
+                ("effect", models.FloatField(blank=True, null=True)),
+                ("pvalue", models.FloatField(blank=True, null=True)),
+                (
+                    "record",
+                    models.ForeignKey(
+                        help_text="foreign key to the 'PromoterSetSig' table",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effects",
+                        to="regulatory_data.promotersetsig",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "promotersetsig_effect",
+                "indexes": [models.Index(fields=["regulator_id", "target_id"], name="psig_effect_reg_target_idx")],
+            },
+        ),
+        migrations.CreateModel(
+            name="ExpressionEffect",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "regulator_id",
+                    models.IntegerField(help_text="The GenomicFeature id of the regulator of the record"),
+                ),
+                (
+                    "target_id",
+                    models.IntegerField(
+                        blank=True,
+                        help_text="The GenomicFeature id of the target, or null if the record has no targets",
+                        null=True,
+                    ),
+                ),
+                ("effect", models.FloatField(blank=True, null=True)),
+                ("pvalue", models.FloatField(blank=True, null=True)),
+                (
+                    "record",
+                    models.ForeignKey(
+                        help_text="foreign key to the 'Expression' table",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effects",
+                        to="regulatory_data.expression",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "expression_effect",
+                "indexes": [models.Index(fields=["regulator_id", "target_id"], name="expr_effect_reg_target_idx")],
+            },
+        ),
+    ]
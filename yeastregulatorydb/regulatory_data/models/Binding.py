@@ -63,6 +63,21 @@ class Binding(BaseModel, GzipFileUploadWithIdMixin):
     file = models.FileField(
         upload_to="temp", help_text="A file which stores data on regulator/DNA interaction", blank=True, null=True
     )
+    sidecar = models.FileField(
+        upload_to="temp",
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+    )
+    input_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+        help_text="For combined records, a fingerprint of the replicates in `file`. Used to skip recombining",
+    )
     # NOTE: the _inserts fields are added during the serialization process from the file
     # in BindingSerializer and its mixin ValidateFileMixin
     genomic_inserts = models.PositiveIntegerField(
@@ -89,12 +104,12 @@ class Binding(BaseModel, GzipFileUploadWithIdMixin):
         unique_together = ("regulator", "batch", "condition", "replicate", "source")
 
     def save(self, *args, **kwargs):
-        # Store the old file path
-        is_create = self.pk is None
-        super().save(*args, **kwargs)
-        if is_create:
-            self.update_file_name("file", f"binding/{self.source.name}")
-            super().save(update_fields=["file"])
+        # on create, the file is written once, to its path named by the id
+        self.save_with_file_id(super().save, "file", f"binding/{self.source.name}", "", *args, **kwargs)
+
+    def get_fileformat(self):
+        """return the fileformat associated with this binding instance"""
+        return self.source.fileformat
 
 
 @receiver(models.signals.post_delete, sender=Binding)
@@ -111,3 +126,5 @@ def remove_file_from_s3(sender, instance, using, **kwargs):  # pylint: disable=u
     # note that if the directory (and all subdirectories) are empty, the
     # directory will also be removed
     instance.file.delete(save=False)
+    if instance.sidecar:
+        instance.sidecar.delete(save=False)
@@ -18,6 +18,13 @@ class CallingCardsBackground(BaseModel, GzipFileUploadWithIdMixin):
         max_length=10, blank=False, null=False, help_text="The name of the background data", unique=True
     )
     file = models.FileField(upload_to="temp", help_text="A file which stores data on " "regulator/DNA interaction")
+    sidecar = models.FileField(
+        upload_to="temp",
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+    )
     fileformat = models.ForeignKey(
         "FileFormat",
         on_delete=models.CASCADE,
@@ -43,12 +50,12 @@ class CallingCardsBackground(BaseModel, GzipFileUploadWithIdMixin):
         db_table = "callingcardsbackground"
 
     def save(self, *args, **kwargs):
-        # Store the old file path
-        is_create = self.pk is None
-        super().save(*args, **kwargs)
-        if is_create:
-            self.update_file_name("file", "callingcards/background", "qbed.gz")
-            super().save(update_fields=["file"])
+        # on create, the file is written once, to its path named by the id
+        self.save_with_file_id(super().save, "file", "callingcards/background", "qbed.gz", *args, **kwargs)
+
+    def get_fileformat(self):
+        """return the fileformat associated with this callingcardsbackground instance"""
+        return self.fileformat
 
 
 @receiver(models.signals.post_delete, sender=CallingCardsBackground)
@@ -65,3 +72,9 @@ def remove_file_from_s3(sender, instance, using, **kwargs):  # pylint: disable=u
     # note that if the directory (and all subdirectories) are empty, the
     # directory will also be removed
     instance.file.delete(save=False)
+    if instance.sidecar:
+        instance.sidecar.delete(save=False)
+    # imported here to avoid a circular import with the models package
+    from ..utils.background_hop_counts import delete_background_hop_counts
+
+    delete_background_hop_counts(background_id=instance.id)
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from .BaseModel import BaseModel
 
@@ -57,3 +59,16 @@ class ChrMap(BaseModel):
     class Meta:
         managed = True
         db_table = "chrmap"
+
+
+@receiver(post_save, sender=ChrMap)
+@receiver(post_delete, sender=ChrMap)
+def invalidate_chrmap_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidate the ChrMapCache when the transaction in which a ChrMap record
+    is saved or deleted commits
+    """
+    # imported here to avoid a circular import with the models package
+    from ..utils.chrmap_cache import chrmap_cache
+
+    chrmap_cache.invalidate_on_commit()
@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class CombinedEffectBase(models.Model):
+    """
+    An abstract base model for the rows of a materialized combined effect
+    table, ie the long format (regulator, target, record, effect, pvalue)
+    table which the `combined` export of a viewset produces. Each row is one
+    target of one record. The rows of a record are written by
+    :func:`~yeastregulatorydb.regulatory_data.utils.combined_effects.materialize_combined_effects`,
+    and are deleted with the record.
+
+    Inherit from this class, and add a `record` foreign key to the model whose
+    effects are stored, eg
+
+    .. code-block:: python
+
+        class ExpressionEffect(CombinedEffectBase):
+            record = models.ForeignKey("Expression", on_delete=models.CASCADE, related_name="effects")
+    """
+
+    regulator_id = models.IntegerField(help_text="The GenomicFeature id of the regulator of the record")
+    target_id = models.IntegerField(
+        blank=True, null=True, help_text="The GenomicFeature id of the target, or null if the record has no targets"
+    )
+    effect = models.FloatField(blank=True, null=True)
+    pvalue = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
@@ -0,0 +1,24 @@
+from django.db import models
+
+from .CombinedEffectBase import CombinedEffectBase
+
+
+class ExpressionEffect(CombinedEffectBase):
+    """
+    The materialized combined effects of the Expression records. See
+    :class:`~yeastregulatorydb.regulatory_data.models.CombinedEffectBase.CombinedEffectBase`
+    """
+
+    record = models.ForeignKey(
+        "Expression",
+        on_delete=models.CASCADE,
+        related_name="effects",
+        help_text="foreign key to the 'Expression' table",
+    )
+
+    def __str__(self):
+        return f"record:{self.record_id} target:{self.target_id}"
+
+    class Meta:
+        db_table = "expression_effect"
+        indexes = [models.Index(fields=["regulator_id", "target_id"], name="expr_effect_reg_target_idx")]
@@ -1,6 +1,8 @@
 from enum import Enum
 
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from .BaseModel import BaseModel
 
@@ -161,3 +163,16 @@ class GenomicFeature(BaseModel):
             ),
         ]
         indexes = [models.Index("chr", "start", "end", "strand", name="coord_index")]
+
+
+@receiver(post_save, sender=GenomicFeature)
+@receiver(post_delete, sender=GenomicFeature)
+def invalidate_genomicfeature_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidate the GenomicFeatureCache when the transaction in which a
+    GenomicFeature record is saved or deleted commits
+    """
+    # imported here to avoid a circular import with the models package
+    from ..utils.genomicfeature_cache import genomicfeature_cache
+
+    genomicfeature_cache.invalidate_on_commit()
@@ -39,6 +39,10 @@ class PromoterSet(BaseModel, GzipFileUploadWithIdMixin):
 
     # pylint:disable=R0801
     def save(self, *args, **kwargs):
+        if self.pk is None:
+            # on create, the file is written once, to its path named by the id
+            self.save_with_file_id(super().save, "file", f"promotersets/{self.name}", "bed.gz", *args, **kwargs)
+            return
         # Store the old file path
         old_file_name = self.file.name if self.file else None
         super().save(*args, **kwargs)
@@ -66,3 +70,7 @@ def remove_file_from_s3(sender, instance, using, **kwargs):  # pylint: disable=u
     # note that if the directory (and all subdirectories) are empty, the
     # directory will also be removed
     instance.file.delete(save=False)
+    # imported here to avoid a circular import with the models package
+    from ..utils.background_hop_counts import delete_background_hop_counts
+
+    delete_background_hop_counts(promoterset_id=instance.id)
@@ -1,6 +1,6 @@
 import logging
 
-from django.db import models
+from django.db import models, transaction
 from django.dispatch import receiver
 
 from .BaseModel import BaseModel
@@ -31,6 +31,28 @@ class PromoterSetSig(BaseModel, GzipFileUploadWithIdMixin):
         "FileFormat", on_delete=models.CASCADE, help_text="foreign key to the 'FileFormat' table"
     )
     file = models.FileField(upload_to="temp", help_text="A file which stores data on " "regulator/DNA interaction")
+    sidecar = models.FileField(
+        upload_to="temp",
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+    )
+    effects_modified_date = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="The `modified_date` of the record when its combined effects were materialized. "
+        "The materialized effects are up to date if this equals `modified_date`",
+    )
+    input_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+        help_text="A fingerprint of the inputs which produced `file`. Used to skip unchanged recalculations",
+    )
 
     def __str__(self):
         return f"pk:{self.pk}"
@@ -40,12 +62,8 @@ class PromoterSetSig(BaseModel, GzipFileUploadWithIdMixin):
 
     # pylint:disable=R0801
     def save(self, *args, **kwargs):
-        # Store the old file path
-        is_create = self.pk is None
-        super().save(*args, **kwargs)
-        if is_create:
-            self.update_file_name("file", "promotersetsig", "csv.gz")
-            super().save(update_fields=["file"])
+        # on create, the file is written once, to its path named by the id
+        self.save_with_file_id(super().save, "file", "promotersetsig", "csv.gz", *args, **kwargs)
 
     # pylint:enable=R0801
 
@@ -72,3 +90,22 @@ def remove_file_from_s3(sender, instance, using, **kwargs):  # pylint: disable=u
     # note that if the directory (and all subdirectories) are empty, the
     # directory will also be removed
     instance.file.delete(save=False)
+    if instance.sidecar:
+        instance.sidecar.delete(save=False)
+
+
+@receiver(models.signals.post_save, sender=PromoterSetSig)
+def materialize_combined_effects_on_save(
+    sender, instance, created, update_fields, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Rematerialize the combined effects of the record once the transaction
+    which saved it commits. The second save of a new record, which only moves
+    `file` to its final name, is skipped.
+    """
+    if not created and update_fields is not None and set(update_fields) == {"file"}:
+        return
+    # imported here to avoid a circular import with the models package
+    from ..tasks.materialize_combined_effects_task import materialize_combined_effects_task
+
+    transaction.on_commit(lambda: materialize_combined_effects_task.delay("PromoterSetSig", instance.id))
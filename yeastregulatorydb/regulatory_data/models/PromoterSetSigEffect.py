@@ -0,0 +1,24 @@
+from django.db import models
+
+from .CombinedEffectBase import CombinedEffectBase
+
+
+class PromoterSetSigEffect(CombinedEffectBase):
+    """
+    The materialized combined effects of the PromoterSetSig records. See
+    :class:`~yeastregulatorydb.regulatory_data.models.CombinedEffectBase.CombinedEffectBase`
+    """
+
+    record = models.ForeignKey(
+        "PromoterSetSig",
+        on_delete=models.CASCADE,
+        related_name="effects",
+        help_text="foreign key to the 'PromoterSetSig' table",
+    )
+
+    def __str__(self):
+        return f"record:{self.record_id} target:{self.target_id}"
+
+    class Meta:
+        db_table = "promotersetsig_effect"
+        indexes = [models.Index(fields=["regulator_id", "target_id"], name="psig_effect_reg_target_idx")]
@@ -48,6 +48,13 @@ class RankResponse(BaseModel, GzipFileUploadWithIdMixin):
         "binding and expression set for a given regulator at specific "
         "expression effect and pvalue thresholds",
     )
+    sidecar = models.FileField(
+        upload_to="temp",
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="A typed parquet copy of `file`, written when `file` is validated. Used for fast reads",
+    )
     significant_response = models.BooleanField(
         help_text="This field is used to indicate whether there are any bins "
         "in the top 250 genes with a confidence interval that does not include 0",
@@ -62,15 +69,15 @@ class RankResponse(BaseModel, GzipFileUploadWithIdMixin):
 
     # pylint:disable=R0801
     def save(self, *args, **kwargs):
-        # Store the old file path
-        is_create = self.pk is None
-        super().save(*args, **kwargs)
-        if is_create:
-            self.update_file_name("file", "rankresponse", "csv.gz")
-            super().save(update_fields=["file"])
+        # on create, the file is written once, to its path named by the id
+        self.save_with_file_id(super().save, "file", "rankresponse", "csv.gz", *args, **kwargs)
 
     # pylint:enable=R0801
 
+    def get_fileformat(self):
+        """return the fileformat associated with this rankresponse instance"""
+        return self.fileformat
+
 
 @receiver(models.signals.post_delete, sender=RankResponse)
 def remove_file_from_s3(sender, instance, using, **kwargs):  # pylint: disable=unused-argument
@@ -86,3 +93,5 @@ def remove_file_from_s3(sender, instance, using, **kwargs):  # pylint: disable=u
     # note that if the directory (and all subdirectories) are empty, the
     # directory will also be removed
     instance.file.delete(save=False)
+    if instance.sidecar:
+        instance.sidecar.delete(save=False)
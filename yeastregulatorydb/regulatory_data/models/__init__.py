@@ -4,11 +4,13 @@ from .CallingCardsBackground import CallingCardsBackground
 from .ChrMap import ChrMap
 from .DataSource import DataSource
 from .Expression import Expression
+from .ExpressionEffect import ExpressionEffect
 from .ExpressionManualQC import ExpressionManualQC
 from .FileFormat import FileFormat
 from .GenomicFeature import GenomicFeature
 from .PromoterSet import PromoterSet
 from .PromoterSetSig import PromoterSetSig
+from .PromoterSetSigEffect import PromoterSetSigEffect
 from .RankResponse import RankResponse
 from .Regulator import Regulator
 
@@ -19,11 +21,13 @@ __all__ = [
     "CallingCardsBackground",
     "ChrMap",
     "Expression",
+    "ExpressionEffect",
     "ExpressionManualQC",
     "FileFormat",
     "GenomicFeature",
     "RankResponse",
     "PromoterSet",
     "PromoterSetSig",
+    "PromoterSetSigEffect",
     "Regulator",
 ]
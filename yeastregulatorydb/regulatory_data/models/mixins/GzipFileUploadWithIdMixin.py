@@ -1,7 +1,8 @@
 import logging
-from typing import Protocol, cast
+from typing import Callable, Protocol, cast
 
 from django.core.files.storage import default_storage
+from django.db import connections, router
 
 logger = logging.getLogger(__name__)
 
@@ -42,14 +43,91 @@ class GzipFileUploadWithIdMixin:  # pylint: disable=too-few-public-methods
         file = models.FileField(upload_to='temp', help_text="A gziped csv...")
 
         def save(self, *args, **kwargs):
-            super().save(*args, **kwargs)
-            self.update_file_name('file', 'hu', 'csv.gz')
-            super().save(update_fields=['file'])
+            self.save_with_file_id(super().save, 'file', 'hu', 'csv.gz', *args, **kwargs)
 
         # Other fields and methods...
 
     """
 
+    def _reserve_pk(self) -> int | None:
+        # only a sequence reserves an id which no other insert can take.
+        # Without one, None, and the instance is saved before its file is renamed
+        model = type(self)
+        connection = connections[router.db_for_write(model)]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s))", [model._meta.db_table, model._meta.pk.column]
+            )
+            return cursor.fetchone()[0]
+
+    def save_with_file_id(
+        self, save: Callable, file_field_name: str, upload_dir: str, extension: str = "", *args, **kwargs
+    ) -> None:
+        """
+        Save the instance with its file at `<upload_dir>/<pk>.<extension>`.
+        When a new instance is created with an uploaded file, on PostgreSQL,
+        the primary key is reserved from the table sequence first, so that the
+        file is written to its final path once, and the row is inserted once.
+        Otherwise, eg if the instance has no file, or the database has no
+        sequence to reserve the key from, this is `save`, followed by
+        :meth:`update_file_name` and a second save of the file field if the
+        instance was created.
+
+        :param save: the save method of the model parent, ie `super().save`
+        :type save: Callable
+        :param file_field_name: The name of the file field
+        :type file_field_name: str
+        :param upload_dir: The directory to upload the file to
+        :type upload_dir: str
+        :param extension: The file extension to use. See :meth:`update_file_name`
+        :type extension: str
+        :param args: passed to `save`
+        :param kwargs: passed to `save`
+
+        :return: None
+        :rtype: None
+        """
+        self_with_pk = cast(HasPkProtocol, self)
+        is_create = self_with_pk.pk is None
+        file_field = getattr(self, file_field_name, None)
+        reserved_pk = self._reserve_pk() if is_create and file_field and not file_field._committed else None
+        if reserved_pk is None:
+            save(*args, **kwargs)
+            if is_create:
+                self.update_file_name(file_field_name, upload_dir, extension)
+                save(update_fields=[file_field_name])
+            return
+
+        self_with_pk.pk = reserved_pk
+        final_name = f"{upload_dir}/{self_with_pk.pk}.{self._file_extension(file_field_name, extension)}"
+        logger.debug("Writing the file of %s to %s", self_with_pk, final_name)
+        file_field.name = file_field.storage.save(final_name, file_field.file, max_length=file_field.field.max_length)
+        file_field._committed = True
+        try:
+            kwargs["force_insert"] = True
+            save(*args, **kwargs)
+        except BaseException:
+            file_field.storage.delete(file_field.name)
+            self_with_pk.pk = None
+            raise
+
+    def _file_extension(self, file_field_name: str, extension: str = "") -> str:
+        if extension:
+            logger.debug("Using provided extension: %s", extension)
+            return extension
+        # extract the extension, which will be eg .tsv.gz, from the file name
+        file_name_parts = getattr(self, file_field_name).name.split(".")
+        extension = ".".join(file_name_parts[-2:]) if len(file_name_parts) > 1 else file_name_parts[1:]
+        if not extension:
+            logger.warning(
+                'Could not extract extension from file name "%s". Setting to `.txt.gz`',
+                getattr(self, file_field_name).name,
+            )
+            extension = ".txt.gz"
+        return extension
+
     def update_file_name(self, file_field_name: str, upload_dir: str, extension: str = "") -> None:
         """
         A utility method to update the file name based on the instance's ID.
@@ -68,21 +146,10 @@ class GzipFileUploadWithIdMixin:  # pylint: disable=too-few-public-methods
         :rtype: None
         """
         try:
-            # extract the extension, which will be eg .tsv.gz, from the file name
-            file_name_parts = getattr(self, file_field_name).name.split(".")
+            extension = self._file_extension(file_field_name, extension)
         except AttributeError:
             logger.info('No file field name provided. Skipping update_file_name for "%s"', self)
         else:
-            if extension:
-                logger.debug("Using provided extension: %s", extension)
-            else:
-                extension = ".".join(file_name_parts[-2:]) if len(file_name_parts) > 1 else file_name_parts[1:]
-                if not extension:
-                    logger.warning(
-                        'Could not extract extension from file name "%s". Setting to `.txt.gz`',
-                        getattr(self, file_field_name).name,
-                    )
-                    extension = ".txt.gz"
             # Cast self to HasPkProtocol to assure mypy that self has a pk attribute
             self_with_pk = cast(HasPkProtocol, self)
             # raise AttributeError if self does not have a pk attribute
@@ -94,8 +161,8 @@ class GzipFileUploadWithIdMixin:  # pylint: disable=too-few-public-methods
                 # Define new filename with ID
                 new_filename = f"{upload_dir}/{self_with_pk.pk}.{extension}"
 
-                # Move and rename the file if it exists
-                if default_storage.exists(file_field.name):
+                # Move and rename the file if it exists, and is not already at the new path
+                if file_field.name != new_filename and default_storage.exists(file_field.name):
                     default_storage.save(new_filename, file_field)
                     default_storage.delete(file_field.name)
 
@@ -1,16 +1,14 @@
-import socket
-
 from celery import Task
 from celery.utils.log import get_task_logger
-from django.db import OperationalError
-from requests.exceptions import ConnectionError, Timeout
+
+from yeastregulatorydb.regulatory_data.utils.transient_errors import TRANSIENT_ERRORS
 
 logger = get_task_logger(__name__)
 
 
 class MyBaseTask(Task):
     # Define retry for common transient errors
-    autoretry_for = (ConnectionError, Timeout, OperationalError, IOError, OSError, socket.error)
+    autoretry_for = TRANSIENT_ERRORS
     retry_kwargs = {"max_retries": 3, "countdown": 15}
 
     # Default delay between retries, starting at x seconds and doubling each time
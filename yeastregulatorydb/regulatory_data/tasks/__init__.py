@@ -1,10 +1,24 @@
+from .background_hop_counts_task import background_hop_counts_task
+from .bulk_upload_task import bulk_upload_task
 from .chained_tasks import combine_cc_passing_replicates_promotersig_chained, promotersetsig_rankedresponse_chained
 from .combine_cc_passing_replicates_task import combine_cc_passing_replicates_task
-from .promoter_significance_task import promoter_significance_task
+from .effect_matrix_task import effect_matrix_task
+from .materialize_combined_effects_task import materialize_combined_effects_task
+from .promoter_significance_task import (
+    collect_promotersetsig_ids,
+    promoter_significance_pair_task,
+    promoter_significance_task,
+)
 
 __all__ = [
+    "background_hop_counts_task",
     "promoter_significance_task",
+    "promoter_significance_pair_task",
+    "collect_promotersetsig_ids",
     "promotersetsig_rankedresponse_chained",
     "combine_cc_passing_replicates_task",
     "combine_cc_passing_replicates_promotersig_chained",
+    "materialize_combined_effects_task",
+    "bulk_upload_task",
+    "effect_matrix_task",
 ]
@@ -0,0 +1,46 @@
+import logging
+
+from config import celery_app
+from yeastregulatorydb.regulatory_data.models import CallingCardsBackground, PromoterSet
+from yeastregulatorydb.regulatory_data.utils.background_hop_counts import (
+    background_hop_counts_name,
+    get_background_hop_counts,
+)
+
+from .BaseTask import MyBaseTask
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, base=MyBaseTask)
+def background_hop_counts_task(self, background_id: int | None = None, promoterset_id: int | None = None) -> list:
+    """Precompute the number of background hops in each promoter for every
+    (CallingCardsBackground, PromoterSet) pair which includes the given
+    records. This is launched when a background or promoter set is uploaded,
+    so that :func:`promoter_significance_pair_task` only needs to count the
+    hops of the experiment. Counts which are already up to date are not
+    recalculated.
+
+    :param background_id: The id of a CallingCardsBackground record. If not
+        passed, every background is used
+    :type background_id: int, optional
+    :param promoterset_id: The id of a PromoterSet record. If not passed,
+        every promoter set is used
+    :type promoterset_id: int, optional
+
+    :return: the storage names of the counts
+    :rtype: list
+    """
+    background_queryset = CallingCardsBackground.objects.all()
+    if background_id is not None:
+        background_queryset = background_queryset.filter(id=background_id)
+    promoterset_queryset = PromoterSet.objects.all()
+    if promoterset_id is not None:
+        promoterset_queryset = promoterset_queryset.filter(id=promoterset_id)
+
+    output_list = []
+    for background_record in background_queryset:
+        for promoterset_record in promoterset_queryset:
+            get_background_hop_counts(background_record, promoterset_record)
+            output_list.append(background_hop_counts_name(background_record, promoterset_record))
+    return output_list
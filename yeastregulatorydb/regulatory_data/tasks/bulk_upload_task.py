@@ -0,0 +1,58 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+from config import celery_app
+from yeastregulatorydb.regulatory_data.utils.bulk_upload_job import BulkUploadJob
+
+from .BaseTask import MyBaseTask
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, base=MyBaseTask)
+def bulk_upload_task(self, viewset: str, user_id: int, job_id: str, csv_path: str, tar_path: str) -> bool:
+    """Run a bulk upload which was staged to the default storage by the
+    `bulk_upload` action of a viewset, and report its progress on the
+    BulkUploadJob `job_id`. As in the request, either every record is
+    created or none are. The staged files are deleted once the job finishes,
+    whether or not it succeeds. See
+    :meth:`~yeastregulatorydb.regulatory_data.api.views.mixins.BulkUploadMixin.BulkUploadMixin.run_bulk_upload`
+
+    :param viewset: The dotted path of the viewset, eg
+        `yeastregulatorydb.regulatory_data.api.views.BindingViewSet.BindingViewSet`
+    :type viewset: str
+    :param user_id: The id of the user who submitted the upload
+    :type user_id: int
+    :param job_id: The id of the BulkUploadJob
+    :type job_id: str
+    :param csv_path: The storage path of the samplesheet
+    :type csv_path: str
+    :param tar_path: The storage path of the tar of files
+    :type tar_path: str
+
+    :return: True if the records were created
+    :rtype: bool
+    """
+    job = BulkUploadJob.get(job_id)
+    if job is None:
+        logger.error(f"Bulk upload job {job_id} has expired before it started")
+        return False
+    errors: list[str] = []
+    try:
+        view = import_string(viewset).for_bulk_upload_job(get_user_model().objects.get(pk=user_id))
+        with default_storage.open(csv_path, "rb") as csv_file, default_storage.open(tar_path, "rb") as tarred_dir:
+            errors = view.run_bulk_upload(csv_file, tarred_dir, job)
+    except ValidationError as exc:
+        errors = [f"Could not save the records: {exc.detail}"]
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception(f"Bulk upload job {job_id} failed")
+        errors = [f"The bulk upload failed: {exc}"]
+    finally:
+        for path in [csv_path, tar_path]:
+            default_storage.delete(path)
+    job.finish(errors)
+    return not errors
@@ -1,10 +1,8 @@
-import gzip
-import io
 import logging
+import tempfile
 import uuid
 from types import SimpleNamespace
 
-import pandas as pd
 from django.contrib.auth import get_user_model
 from django.core.files import File
 
@@ -12,19 +10,24 @@ from config import celery_app
 from yeastregulatorydb.regulatory_data.api.filters import BindingFilter
 from yeastregulatorydb.regulatory_data.api.serializers import BindingSerializer
 from yeastregulatorydb.regulatory_data.models import Binding
-from yeastregulatorydb.regulatory_data.utils import extract_file_from_storage
+from yeastregulatorydb.regulatory_data.utils.combine_qbed import combine_qbed_records
+from yeastregulatorydb.regulatory_data.utils.input_fingerprint import combined_binding_fingerprint
 
 from .BaseTask import MyBaseTask
 
 logger = logging.getLogger(__name__)
 
+COMBINED_QBED_SPOOL_MAX_BYTES = 64 * 1024**2
+
 
 @celery_app.task(bind=True, base=MyBaseTask)
-def combine_cc_passing_replicates_task(self, regulator_id: int, user_id: int, **kwargs) -> list:
+def combine_cc_passing_replicates_task(self, regulator_id: int, user_id: int, **kwargs) -> int:
     """
     Combine the qbed files for the passing replicates of the calling cards assay.
     Note that by default, assay='callingcards' and data_usable='passing'
-    are used as filters.
+    are used as filters. The replicates are streamed, in chunks, into the
+    combined file, and coordinate sorted replicates are k-way merged. See
+    :func:`~yeastregulatorydb.regulatory_data.utils.combine_qbed.combine_qbed_records`.
 
     :param regulator_id: a regulator id
     :type regulator_id: int
@@ -33,12 +36,14 @@ def combine_cc_passing_replicates_task(self, regulator_id: int, user_id: int, **
     :param output_fileformat: the name of the output FileFormat
     :type output_fileformat: str
     :param kwargs: additional keyword arguments. This may be used to pass
-        additional filters to the BindingFilter
+        additional filters to the BindingFilter. If `sum_depth` is True, and
+        the replicates are coordinate sorted, insertions at the same
+        coordinates and strand are combined into one row and their depths summed
     :type kwargs: dict
 
-    :returns: a list of regulator genomic feature names which have been
-    processed
-    :rtype: list
+    :returns: the id of the combined Binding record, which is the existing
+        record if its input fingerprint matches the current replicates
+    :rtype: int
     """
 
     try:
@@ -47,68 +52,66 @@ def combine_cc_passing_replicates_task(self, regulator_id: int, user_id: int, **
     except User.DoesNotExist:
         raise ValueError(f"User with id {user_id} does not exist")
 
+    sum_depth = kwargs.pop("sum_depth", False)
     filters = {
         "regulator_id": regulator_id,
         "assay": kwargs.pop("assay", "callingcards"),
         "data_usable": kwargs.pop("data_usable", "passing"),
     }
     filters.update(kwargs)  # update filters with kwargs
-    cc_binding_set = BindingFilter(filters, queryset=Binding.objects.all()).qs
-    # get the qbed files from the django storage and read in data
-    qbed_df_list = []
-    for cc_record in cc_binding_set:
-        filepath = extract_file_from_storage(cc_record.file)
-        # read filepath into pandas dataframe
-        df = pd.read_csv(filepath, sep="\t")
-        qbed_df_list.append(df)
-
-    # combine the qbed files
-    combined_qbed_df = pd.concat(qbed_df_list)
-
-    buffer = io.BytesIO()
-    with gzip.GzipFile(fileobj=buffer, mode="wb") as gzipped_file:
-        combined_qbed_df.to_csv(gzipped_file, sep="\t", index=False)
-
-    # Reset buffer position
-    buffer.seek(0)
-
-    # Create a Django File object with a uuid filename
-    django_file = File(buffer, name=f"{uuid.uuid4()}.csv.gz")
-
-    # Create a mock request with only a user attribute
-    # Assuming you have the user_id available
-    mock_request = SimpleNamespace(user=user)
+    # the combined record is not one of its own replicates
+    cc_binding_set = BindingFilter(filters, queryset=Binding.objects.exclude(batch="cc_combined")).qs
 
     source = kwargs.get("source_name") if kwargs.get("source_name") else cc_binding_set[0].source.name
 
-    # Attempt to find an existing record
+    # Attempt to find an existing record. If it was combined from the same
+    # replicates, it is returned rather than recombined
     existing_record = Binding.objects.filter(regulator_id=regulator_id, batch="cc_combined").first()
-
-    upload_data = {
-        "regulator": regulator_id,
-        "batch": "cc_combined",
-        "source_name": source,
-        "file": django_file,
-    }
-
-    if existing_record:
-        # Use serializer for updating to apply validation/transformation
-        serializer = BindingSerializer(
-            existing_record,
-            data=upload_data,
-            context={"request": mock_request},
-        )
-    # Proceed with creation logic if no existing record is found
-    else:
-        serializer = BindingSerializer(
-            data=upload_data,
-            context={"request": mock_request},
-        )
-
-    if serializer.is_valid():
-        combined_binding_record = serializer.save()
-        return combined_binding_record.id
-    else:
-        error_msg = f"Combined Binding Serializer is invalid: {serializer.errors}"
-        logger.error(error_msg)
-        raise ValueError(error_msg)
+    input_fingerprint = combined_binding_fingerprint(cc_binding_set, source, sum_depth)
+    if existing_record and existing_record.input_fingerprint == input_fingerprint:
+        logger.info(f"Combined Binding {existing_record.id} is up to date for regulator {regulator_id}. Skipping")
+        return existing_record.id
+
+    # stream the replicates into a gzipped qbed. The spooled file is moved
+    # to disk once it exceeds COMBINED_QBED_SPOOL_MAX_BYTES, and the storage
+    # reads it in chunks when uploading
+    with tempfile.SpooledTemporaryFile(max_size=COMBINED_QBED_SPOOL_MAX_BYTES) as combined_file:
+        row_count = combine_qbed_records(cc_binding_set, combined_file, sum_depth=sum_depth)
+        logger.info(f"Combined {len(cc_binding_set)} replicates of regulator {regulator_id} into {row_count} rows")
+        combined_file.seek(0)
+
+        # Create a Django File object with a uuid filename
+        django_file = File(combined_file, name=f"{uuid.uuid4()}.csv.gz")
+
+        # Create a mock request with only a user attribute
+        # Assuming you have the user_id available
+        mock_request = SimpleNamespace(user=user)
+
+        upload_data = {
+            "regulator": regulator_id,
+            "batch": "cc_combined",
+            "source_name": source,
+            "file": django_file,
+        }
+
+        if existing_record:
+            # Use serializer for updating to apply validation/transformation
+            serializer = BindingSerializer(
+                existing_record,
+                data=upload_data,
+                context={"request": mock_request},
+            )
+        # Proceed with creation logic if no existing record is found
+        else:
+            serializer = BindingSerializer(
+                data=upload_data,
+                context={"request": mock_request},
+            )
+
+        if serializer.is_valid():
+            combined_binding_record = serializer.save(input_fingerprint=input_fingerprint)
+            return combined_binding_record.id
+        else:
+            error_msg = f"Combined Binding Serializer is invalid: {serializer.errors}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
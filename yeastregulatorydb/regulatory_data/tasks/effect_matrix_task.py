@@ -0,0 +1,39 @@
+import logging
+
+from django.apps import apps
+
+from config import celery_app
+from yeastregulatorydb.regulatory_data.utils.effect_matrix import build_effect_matrix, release_effect_matrix_build
+
+from .BaseTask import MyBaseTask
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, base=MyBaseTask)
+def effect_matrix_task(self, model_name: str, group: dict) -> str | None:
+    """Regenerate the regulator x target matrix of a group of records, if it
+    is out of date. This is launched by the `matrix` action of a viewset
+    when the matrix of the requested group is missing, or out of date, and
+    releases the claim on the build when it finishes. See
+    :func:`~yeastregulatorydb.regulatory_data.utils.effect_matrix.build_effect_matrix`
+
+    :param model_name: The name of the model, eg `Expression` or `PromoterSetSig`
+    :type model_name: str
+    :param group: The value of each group field of the model, eg `{"source": 1}`
+    :type group: dict
+
+    :return: the path of the current version of the matrix, or None if
+        there are no records in the group
+    :rtype: str | None
+
+    :raises LookupError: If there is no model called `model_name`
+    """
+    model = apps.get_model("regulatory_data", model_name)
+    try:
+        return build_effect_matrix(model, **group).path
+    except LookupError as exc:
+        logger.info(f"The {model_name} matrix of {group} was not built: {exc}")
+        return None
+    finally:
+        release_effect_matrix_build(model, group)
@@ -0,0 +1,37 @@
+import logging
+
+from django.apps import apps
+
+from config import celery_app
+from yeastregulatorydb.regulatory_data.utils.combined_effects import materialize_combined_effects
+
+from .BaseTask import MyBaseTask
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, base=MyBaseTask)
+def materialize_combined_effects_task(self, model_name: str, record_id: int) -> int | None:
+    """Materialize the combined effects of a record, so that the `combined`
+    action of its viewset reads them from the database rather than from the
+    record file. This is launched when an Expression or PromoterSetSig record
+    is saved. See
+    :func:`~yeastregulatorydb.regulatory_data.utils.combined_effects.materialize_combined_effects`
+
+    :param model_name: The name of the model, eg `Expression` or `PromoterSetSig`
+    :type model_name: str
+    :param record_id: The id of the record
+    :type record_id: int
+
+    :return: the number of effects written, or None if the record has been deleted
+    :rtype: int | None
+
+    :raises LookupError: If there is no model called `model_name`
+    """
+    model = apps.get_model("regulatory_data", model_name)
+    try:
+        record = model.objects.get(id=record_id)
+    except model.DoesNotExist:
+        logger.info(f"{model_name} {record_id} was deleted before its combined effects were materialized")
+        return None
+    return materialize_combined_effects(record)
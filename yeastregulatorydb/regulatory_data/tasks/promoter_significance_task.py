@@ -1,33 +1,308 @@
 import gzip
 import io
 import logging
-import os
-import tempfile
 import uuid
-from collections import namedtuple
 from types import SimpleNamespace
 
 import pandas as pd
-from callingcardstools.Analysis.yeast.chipexo_promoter_sig import chipexo_promoter_sig
-from callingcardstools.PeakCalling.yeast.call_peaks import call_peaks as callingcards_promoter_sig
+from celery import chord
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files import File
 
 from config import celery_app
 from yeastregulatorydb.regulatory_data.api.serializers import PromoterSetSigSerializer
-from yeastregulatorydb.regulatory_data.models import Binding, CallingCardsBackground, ChrMap, FileFormat, PromoterSet
-from yeastregulatorydb.regulatory_data.utils.extract_file_from_storage import extract_file_from_storage
+from yeastregulatorydb.regulatory_data.models import (
+    Binding,
+    CallingCardsBackground,
+    FileFormat,
+    PromoterSet,
+    PromoterSetSig,
+)
+from yeastregulatorydb.regulatory_data.utils.background_hop_counts import get_background_hop_counts
+from yeastregulatorydb.regulatory_data.utils.chrmap_cache import chrmap_cache
+from yeastregulatorydb.regulatory_data.utils.input_fingerprint import promotersetsig_fingerprint
+from yeastregulatorydb.regulatory_data.utils.parquet_sidecar import read_stored_table
+from yeastregulatorydb.regulatory_data.utils.promoter_interval_index import get_promoter_interval_index
+from yeastregulatorydb.regulatory_data.utils.promoter_sig import (
+    callingcards_promoter_sig,
+    chipexo_promoter_sig,
+    total_hops,
+    unique_hops,
+)
+
+from .BaseTask import MyBaseTask
 
 logger = logging.getLogger(__name__)
 
 
+def _get_user(user_id: int):
+    try:
+        User = get_user_model()
+        return User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        raise ValueError(f"User with id {user_id} does not exist")
+
+
+def _get_binding(binding_id: int) -> Binding:
+    try:
+        return Binding.objects.get(id=binding_id)
+    except Binding.DoesNotExist:
+        raise ValueError(f"Binding record with id {binding_id} does not exist")
+
+
+def _get_fileformat(output_fileformat: str) -> FileFormat:
+    try:
+        return FileFormat.objects.get(fileformat=output_fileformat)
+    except FileFormat.DoesNotExist:
+        raise ValueError(f"FileFormat '{output_fileformat}' does not exist")
+
+
+def promoter_significance_pairs(output_fileformat: str, **kwargs) -> list[tuple[int, int | None]]:
+    """
+    Return the (promoterset_id, background_id) pairs over which the promoter
+    significance of a binding record is calculated. `background_id` is None
+    for formats which do not use a background.
+
+    :param output_fileformat: The name of the output FileFormat
+    :type output_fileformat: str
+    :param kwargs: If `promoterset_id` is passed, only that promoter set is
+        used. If `background_id` is passed, only that background is used.
+        See :func:`promoter_significance_task`
+
+    :return: a list of (promoterset_id, background_id) tuples
+    :rtype: list
+
+    :raises ValueError: If the output_fileformat is not supported
+    """
+    promoterset_ids = (
+        PromoterSet.objects.filter(id=kwargs.get("promoterset_id"))
+        if "promoterset_id" in kwargs
+        else PromoterSet.objects.all()
+    ).values_list("id", flat=True)
+
+    if output_fileformat == settings.CHIPEXO_PROMOTER_SIG_FORMAT:
+        background_ids = [None]
+    elif output_fileformat == settings.CALLINGCARDS_PROMOTER_SIG_FORMAT:
+        background_ids = list(
+            (
+                CallingCardsBackground.objects.filter(id=kwargs.get("background_id"))
+                if "background_id" in kwargs
+                else CallingCardsBackground.objects.all()
+            ).values_list("id", flat=True)
+        )
+    else:
+        raise ValueError(f"FileFormat '{output_fileformat}' not supported")
+
+    return [
+        (promoterset_id, background_id)
+        for promoterset_id in promoterset_ids.order_by("id")
+        for background_id in background_ids
+    ]
+
+
+def existing_promotersetsig(
+    binding_record: Binding,
+    promoter_record: PromoterSet,
+    background_record: CallingCardsBackground | None,
+    fileformat_record: FileFormat,
+    input_fingerprint: str,
+) -> PromoterSetSig | None:
+    """
+    Return a PromoterSetSig for the given inputs whose input fingerprint (see
+    :func:`~yeastregulatorydb.regulatory_data.utils.input_fingerprint.promotersetsig_fingerprint`)
+    matches `input_fingerprint`, or None if there is not one. This is what
+    allows a refresh, or a retried subtask, to skip a pair whose inputs have
+    not changed.
+
+    :return: an up to date PromoterSetSig record, or None
+    :rtype: PromoterSetSig | None
+    """
+    return (
+        PromoterSetSig.objects.filter(
+            binding=binding_record,
+            promoter=promoter_record,
+            background=background_record,
+            fileformat=fileformat_record,
+            input_fingerprint=input_fingerprint,
+        )
+        .order_by("-modified_date")
+        .first()
+    )
+
+
+def save_promotersetsig(
+    df: pd.DataFrame,
+    binding_record: Binding,
+    promoter_record: PromoterSet,
+    background_id: int | None,
+    fileformat_record: FileFormat,
+    user,
+    input_fingerprint: str = "",
+) -> int | None:
+    """
+    Gzip a promoter significance dataframe and save it as a PromoterSetSig
+
+    :return: the PromoterSetSig id, or None if the serializer is invalid
+    :rtype: int | None
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as gzipped_file:
+        df.to_csv(gzipped_file, index=False)
+
+    # Reset buffer position
+    buffer.seek(0)
+
+    # Create a Django File object with a uuid filename
+    django_file = File(buffer, name=f"{uuid.uuid4()}.csv.gz")
+
+    # Create a mock request with only a user attribute
+    mock_request = SimpleNamespace(user=user)
+
+    upload_data = {
+        "binding": binding_record.id,
+        "promoter": promoter_record.id,
+        "fileformat": fileformat_record.id,
+        "file": django_file,
+    }
+    if background_id:
+        upload_data["background"] = background_id
+
+    serializer = PromoterSetSigSerializer(
+        data=upload_data,
+        context={"request": mock_request},
+    )
+
+    if serializer.is_valid():
+        return serializer.save(input_fingerprint=input_fingerprint).id
+
+    logger.error(f"promoterSetSig Serializer is invalid: {serializer.errors}")
+    return None
+
+
+@celery_app.task(bind=True, base=MyBaseTask)
+def promoter_significance_pair_task(
+    self,
+    binding_id: int,
+    user_id: int,
+    output_fileformat: str,
+    promoterset_id: int,
+    background_id: int | None = None,
+) -> int | None:
+    """Calculate the promoter significance of one Binding record over one
+    PromoterSet and, for calling cards, one CallingCardsBackground, and save
+    the result as a PromoterSetSig. Overlaps are counted with the cached
+    interval index of the promoter set, see
+    :func:`~yeastregulatorydb.regulatory_data.utils.promoter_interval_index.get_promoter_interval_index`.
+    If an up to date PromoterSetSig already
+    exists for this combination (see :func:`existing_promotersetsig`), it is
+    not recalculated. See :func:`promoter_significance_task` for the django
+    settings which this task expects.
+
+    :param binding_id: The id of the Binding record
+    :type binding_id: int
+    :param user_id: The id of the user who initiated the task
+    :type user_id: int
+    :param output_fileformat: The name of the output FileFormat
+    :type output_fileformat: str
+    :param promoterset_id: The id of the PromoterSet record
+    :type promoterset_id: int
+    :param background_id: The id of the CallingCardsBackground record. Required
+        if the output_fileformat is the callingcards promoter significance format
+    :type background_id: int, optional
+
+    :return: the PromoterSetSig id, or None if the serializer is invalid
+    :rtype: int | None
+
+    :raises ValueError: If any of the records do not exist, or if the
+        output_fileformat is not supported
+    """
+    user = _get_user(user_id)
+    binding_record = _get_binding(binding_id)
+    fileformat_record = _get_fileformat(output_fileformat)
+    try:
+        promoter_record = PromoterSet.objects.get(id=promoterset_id)
+    except PromoterSet.DoesNotExist:
+        raise ValueError(f"PromoterSet record with id {promoterset_id} does not exist")
+    try:
+        background_record = CallingCardsBackground.objects.get(id=background_id) if background_id else None
+    except CallingCardsBackground.DoesNotExist:
+        raise ValueError(f"CallingCardsBackground record with id {background_id} does not exist")
+
+    input_fingerprint = promotersetsig_fingerprint(
+        binding_record, promoter_record, background_record, output_fileformat
+    )
+    existing_record = existing_promotersetsig(
+        binding_record, promoter_record, background_record, fileformat_record, input_fingerprint
+    )
+    if existing_record:
+        logger.info(
+            f"PromoterSetSig {existing_record.id} is up to date for binding {binding_id}, "
+            f"promoterset {promoterset_id} and background {background_id}. Skipping"
+        )
+        return existing_record.id
+
+    chr_codes = chrmap_cache.chr_codes(settings.CHR_FORMAT)
+    # the promoter interval index is built once per promoter set file and cached
+    promoter_index = get_promoter_interval_index(promoter_record)
+    binding_df = read_stored_table(binding_record, sep=binding_record.get_fileformat().separator)
+
+    if output_fileformat == settings.CHIPEXO_PROMOTER_SIG_FORMAT:
+        result = chipexo_promoter_sig(promoter_index, binding_df, chr_codes)
+    elif output_fileformat == settings.CALLINGCARDS_PROMOTER_SIG_FORMAT:
+        if background_record is None:
+            raise ValueError(f"A background_id is required for FileFormat '{output_fileformat}'")
+        # the background counts are precomputed per (background, promoter set) pair
+        background_hop_counts, background_total_hops = get_background_hop_counts(background_record, promoter_record)
+        result = callingcards_promoter_sig(
+            promoter_index,
+            unique_hops(binding_df, chr_codes),
+            total_hops(binding_df, chr_codes),
+            background_hop_counts,
+            background_total_hops,
+        )
+    else:
+        raise ValueError(f"FileFormat '{output_fileformat}' not supported")
+
+    return save_promotersetsig(
+        result, binding_record, promoter_record, background_id, fileformat_record, user, input_fingerprint
+    )
+
+
 @celery_app.task()
-def promoter_significance_task(binding_id: int, user_id: int, output_fileformat: str, **kwargs) -> list:
-    """For each promoter set in PromoterSet, create the chipexo promoter significance file.
-    Return a list of PromoterSetSig objects that may be passed on to the rank response
-    endpoint. NOTE that this task expects the following global variables to
-    be set in the django settings:
+def collect_promotersetsig_ids(promotersetsig_ids: list, existing_ids: list | None = None) -> list:
+    """Chord callback for :func:`promoter_significance_task`. Drop the
+    subtasks which did not produce a PromoterSetSig, and add the
+    PromoterSetSig records which were already up to date
+
+    :param promotersetsig_ids: the return values of the
+        :func:`promoter_significance_pair_task` subtasks
+    :type promotersetsig_ids: list
+    :param existing_ids: the ids of the up to date PromoterSetSig records which
+        were not recalculated
+    :type existing_ids: list, optional
+
+    :return: A list of PromoterSetSig object ids
+    :rtype: list
+    """
+    return sorted(
+        {promotersetsig_id for promotersetsig_id in promotersetsig_ids if promotersetsig_id is not None}
+        | set(existing_ids or [])
+    )
+
+
+@celery_app.task(bind=True)
+def promoter_significance_task(self, binding_id: int, user_id: int, output_fileformat: str, **kwargs) -> list:
+    """For each promoter set in PromoterSet, and for calling cards each
+    CallingCardsBackground, create the promoter significance file. Each
+    (promoter set, background) pair is calculated by an independent
+    :func:`promoter_significance_pair_task` subtask, which saves its own
+    PromoterSetSig. Pairs which already have a PromoterSetSig with the same
+    input fingerprint (the input files, ChrMap and the promoter significance
+    code version) are skipped. The subtasks are run as a chord, and this task
+    is replaced by the chord, so that the result is a list of PromoterSetSig
+    ids which may be passed on to the rank response endpoint. NOTE that this task
+    expects the following global variables to be set in the django settings:
     - CHR_FORMAT: The chromosome format to use for the input and output files
     - CHIPEXO_PROMOTER_SIG_FORMAT: The name of the chipexo promoter
       significance (this is expected to be for the yeastepigenome.org data currently)
@@ -54,119 +329,44 @@ def promoter_significance_task(binding_id: int, user_id: int, output_fileformat:
         exist or if the chipexo_promoter_sig FileFormat does not exist
     :raises ValidationError: If the serializer is invalid
     """
-    try:
-        User = get_user_model()
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        raise ValueError(f"User with id {user_id} does not exist")
+    _get_user(user_id)
+    binding_record = _get_binding(binding_id)
+    fileformat_record = _get_fileformat(output_fileformat)
 
-    try:
-        binding_record = Binding.objects.get(id=binding_id)
-    except Binding.DoesNotExist:
-        raise ValueError(f"Binding record with id {binding_id} does not exist")
+    pairs = promoter_significance_pairs(output_fileformat, **kwargs)
+    if not pairs:
+        logger.warning(f"There are no promoter sets, or backgrounds, to score binding {binding_id} against")
+        return []
 
-    try:
-        fileformat_record = FileFormat.objects.get(fileformat=output_fileformat)
-    except FileFormat.DoesNotExist:
-        raise ValueError(f"FileFormat '{output_fileformat}' does not exist")
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        chrmap_filepath = os.path.join(tmpdir, "chrmap.csv")
-
-        # write chrmap to local tmpfile
-        pd.DataFrame(list(ChrMap.objects.all().values())).to_csv(chrmap_filepath, index=False)
-
-        binding_filepath = extract_file_from_storage(binding_record.file, tmpdir)
-
-        # result_list stores ResultObject tuples where `df` is the dataframe
-        # output by the promoter_significance function and `background_id` is
-        # if promoterset_id is passed, then extract only that record. Else,
-        # generate an iterator that will return all records in the PromoterSet
-        # table
-        promoterset_objects_iterator = (
-            PromoterSet.objects.filter(id=kwargs.get("promoterset_id")).iterator()
-            if "promoterset_id" in kwargs
-            else PromoterSet.objects.iterator()
+    # only the pairs whose inputs have changed are recalculated
+    promoter_records = PromoterSet.objects.in_bulk({promoterset_id for promoterset_id, _ in pairs})
+    background_records = CallingCardsBackground.objects.in_bulk({background_id for _, background_id in pairs})
+    existing_ids = []
+    header = []
+    for promoterset_id, background_id in pairs:
+        promoter_record = promoter_records[promoterset_id]
+        background_record = background_records.get(background_id)
+        existing_record = existing_promotersetsig(
+            binding_record,
+            promoter_record,
+            background_record,
+            fileformat_record,
+            promotersetsig_fingerprint(binding_record, promoter_record, background_record, output_fileformat),
         )
-        # None if there is no background, or the record `id` if there is
-        ResultObject = namedtuple("ResultObject", ["df", "background_id"])
-        result_list = []
-        for promoter_record in promoterset_objects_iterator:
-            promoter_filepath = extract_file_from_storage(promoter_record.file, tmpdir)
-
-            if output_fileformat == settings.CHIPEXO_PROMOTER_SIG_FORMAT:
-                result = chipexo_promoter_sig(
-                    binding_filepath,
-                    settings.CHR_FORMAT,
-                    promoter_filepath,
-                    settings.CHR_FORMAT,
-                    chrmap_filepath,
-                    settings.CHR_FORMAT,
-                )
-                result_list.append(ResultObject(result, None))
-            elif output_fileformat == settings.CALLINGCARDS_PROMOTER_SIG_FORMAT:
-                # if background_id is passed, then extract only that record.
-                # else, generate an iterator that will return all records in
-                # the CallingCardsBackground table
-                background_objects_iterator = (
-                    CallingCardsBackground.objects.filter(id=kwargs.get("background_id")).iterator()
-                    if "background_id" in kwargs
-                    else CallingCardsBackground.objects.iterator()
+        if existing_record:
+            existing_ids.append(existing_record.id)
+        else:
+            header.append(
+                promoter_significance_pair_task.si(
+                    binding_id, user_id, output_fileformat, promoterset_id, background_id
                 )
-                for background_record in background_objects_iterator:
-                    background_filepath = extract_file_from_storage(background_record.file, tmpdir)
-
-                    result = callingcards_promoter_sig(
-                        binding_filepath,
-                        settings.CHR_FORMAT,
-                        promoter_filepath,
-                        settings.CHR_FORMAT,
-                        background_filepath,
-                        settings.CHR_FORMAT,
-                        chrmap_filepath,
-                        False,
-                        settings.CHR_FORMAT,
-                    )
-                    result_list.append(ResultObject(result, background_record.id))
-            else:
-                raise ValueError(f"FileFormat '{output_fileformat}' not supported")
-
-        # output_list stores promoter_set_sig `id`s for successfully uploaded
-        # records
-        output_list = []
-        for res_obj in result_list:
-            buffer = io.BytesIO()
-            with gzip.GzipFile(fileobj=buffer, mode="wb") as gzipped_file:
-                res_obj.df.to_csv(gzipped_file, index=False)
-
-            # Reset buffer position
-            buffer.seek(0)
-
-            # Create a Django File object with a uuid filename
-            django_file = File(buffer, name=f"{uuid.uuid4()}.csv.gz")
-
-            # Create a mock request with only a user attribute
-            # Assuming you have the user_id available
-            mock_request = SimpleNamespace(user=user)
-
-            upload_data = {
-                "binding": binding_record.id,
-                "promoter": promoter_record.id,
-                "fileformat": fileformat_record.id,
-                "file": django_file,
-            }
-            if res_obj.background_id:
-                upload_data["background"] = res_obj.background_id
-
-            serializer = PromoterSetSigSerializer(
-                data=upload_data,
-                context={"request": mock_request},
             )
 
-            if serializer.is_valid():
-                promoter_set_sig = serializer.save()
-                output_list.append(promoter_set_sig.id)
-            else:
-                logger.error(f"promoterSetSig Serializer is invalid: {serializer.errors}")
+    logger.info(
+        f"Binding {binding_id}: {len(existing_ids)} PromoterSetSig records are up to date, "
+        f"{len(header)} will be calculated"
+    )
+    if not header:
+        return sorted(existing_ids)
 
-    return output_list
+    return self.replace(chord(header, collect_promotersetsig_ids.s(existing_ids=existing_ids)))
@@ -1,4 +1,12 @@
+import os
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
 from django.db.models.query import QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from yeastregulatorydb.regulatory_data.models import (
@@ -16,6 +24,7 @@ from yeastregulatorydb.regulatory_data.models import (
     RankResponse,
     Regulator,
 )
+from yeastregulatorydb.regulatory_data.tests.factories import ExpressionFactory
 
 
 def test_binding_get_absolute_url(binding: Binding):
@@ -99,3 +108,29 @@ def test_rank_response_absolute_url(rankresponse: RankResponse):
     assert reverse("api:rankresponse-list") == "/api/rankresponse/"
     assert reverse("api:rankresponse-detail", args=[str(rankresponse.id)]) == f"/api/rankresponse/{rankresponse.id}/"
     assert reverse("api:rankresponse-summary") == "/api/rankresponse/summary/"
+
+
+@pytest.mark.django_db
+def test_file_is_written_once_on_create():
+    with CaptureQueriesContext(connection) as queries:
+        expression = ExpressionFactory.create(file=ContentFile(b"data", name="upload.csv.gz"))
+
+    assert expression.file.name == f"expression/{expression.source.name}/{expression.pk}.csv.gz"
+    with default_storage.open(expression.file.name) as f:
+        assert f.read() == b"data"
+    # the row is inserted once, and the file is not written to the temporary upload path
+    assert not any(query["sql"].startswith('UPDATE "expression"') for query in queries.captured_queries)
+    assert not os.path.exists(os.path.join(settings.MEDIA_ROOT, "temp"))
+
+
+@pytest.mark.django_db
+def test_file_is_renamed_after_save_without_a_sequence(monkeypatch):
+    # without a sequence, the pk is not guessed, but assigned by the insert
+    monkeypatch.setattr(connection, "vendor", "sqlite")
+    with CaptureQueriesContext(connection) as queries:
+        expression = ExpressionFactory.create(file=ContentFile(b"data", name="upload.csv.gz"))
+
+    assert expression.file.name == f"expression/{expression.source.name}/{expression.pk}.csv.gz"
+    with default_storage.open(expression.file.name) as f:
+        assert f.read() == b"data"
+    assert not any("nextval" in query["sql"] for query in queries.captured_queries)
@@ -1,5 +1,7 @@
+import gzip
 import os
 
+import pandas as pd
 import pytest
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models.query import QuerySet
@@ -7,6 +9,8 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIRequestFactory
 
 from yeastregulatorydb.regulatory_data.models import DataSource, Expression, PromoterSetSig, Regulator
+from yeastregulatorydb.regulatory_data.utils.count_hops import count_hops
+from yeastregulatorydb.regulatory_data.utils.parquet_sidecar import read_stored_table
 from yeastregulatorydb.users.models import User
 
 from ..api.serializers import (
@@ -17,6 +21,7 @@ from ..api.serializers import (
     PromoterSetSerializer,
     RankResponseSerializer,
 )
+from ..api.serializers.mixins.FileValidationMixin import file_validation_error
 from .factories import (
     BindingFactory,
     ChrMapFactory,
@@ -60,6 +65,45 @@ def test_BindingSerializerCC(user: User, chrmap: QuerySet, regulator: Regulator,
 
         assert serializer1.is_valid() is True, serializer1.errors
 
+        # saving the record writes a typed parquet sidecar of the file
+        instance = serializer1.save()
+        assert instance.sidecar.name == f"binding/{cc_datasource.name}/{instance.pk}.parquet"
+        sidecar_df = read_stored_table(instance, columns=["chr", "depth"])
+        assert list(sidecar_df.columns) == ["chr", "depth"]
+        assert sidecar_df["depth"].dtype == "int64"
+
+
+@pytest.mark.django_db
+def test_BindingSerializerChunkedValidation(
+    settings, user: User, chrmap: QuerySet, regulator: Regulator, cc_datasource: DataSource
+):
+    """
+    Test that validating a file in chunks produces the same hop tallies as
+    counting the hops in the whole file
+    """
+    settings.FILE_VALIDATION_CHUNKSIZE = 10
+
+    factory = APIRequestFactory()
+    request = factory.get("/")
+    request.user = user
+
+    file_path = os.path.join(os.path.dirname(__file__), "test_data", "binding/callingcards/ccexperiment_511.qbed.gz")
+    expected = count_hops(pd.read_csv(file_path, sep="\t", compression="gzip"), "ucsc")
+
+    with open(file_path, "rb") as file_obj:
+        uploaded_file = SimpleUploadedFile(
+            "ccexperiment_511.qbed.gz", file_obj.read(), content_type="application/gzip"
+        )
+
+    fields_dict = {"file": uploaded_file, "regulator": regulator, "source": cc_datasource}
+    data = model_to_dict_select(BindingFactory.build(**fields_dict))
+
+    serializer = BindingSerializer(data=data, context={"request": request})
+
+    assert serializer.is_valid() is True, serializer.errors
+    for key, value in expected.items():
+        assert serializer.validated_data[f"{key}_inserts"] == value
+
 
 @pytest.mark.django_db
 def test_BindingSerializerChipExo(user: User, chrmap: QuerySet, regulator: Regulator, chipexo_datasource: DataSource):
@@ -353,3 +397,14 @@ def test_rankresponse_serializer(
         serializer1 = RankResponseSerializer(data=data, context={"request": request})
 
         assert serializer1.is_valid() is True, serializer1.errors
+
+
+def test_file_validation_error():
+    error = file_validation_error(gzip.BadGzipFile("Not a gzipped file"), "\t")
+    assert isinstance(error, ValidationError)
+    assert "gzipped" in str(error.detail["file"])
+
+    # a failure to read the file is not a validation error
+    exc = PermissionError("Permission denied")
+    with pytest.raises(PermissionError):
+        file_validation_error(exc, "\t")
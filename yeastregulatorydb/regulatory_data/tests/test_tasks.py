@@ -1,7 +1,9 @@
 import os
 
+import pandas as pd
 import pytest
 from celery.result import EagerResult
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models.query import QuerySet
 from rest_framework.test import APIRequestFactory
@@ -11,10 +13,15 @@ from yeastregulatorydb.regulatory_data.api.serializers import (
     ExpressionSerializer,
     PromoterSetSerializer,
 )
-from yeastregulatorydb.regulatory_data.models import DataSource, PromoterSetSig, Regulator
-from yeastregulatorydb.regulatory_data.tasks import promoter_significance_task
+from yeastregulatorydb.regulatory_data.models import Binding, DataSource, PromoterSetSig, Regulator
+from yeastregulatorydb.regulatory_data.tasks import combine_cc_passing_replicates_task, promoter_significance_task
 from yeastregulatorydb.regulatory_data.tasks.chained_tasks import promotersetsig_rankedresponse_chained
-from yeastregulatorydb.regulatory_data.tests.factories import BindingFactory, ExpressionFactory, PromoterSetFactory
+from yeastregulatorydb.regulatory_data.tests.factories import (
+    BindingFactory,
+    BindingManualQCFactory,
+    ExpressionFactory,
+    PromoterSetFactory,
+)
 from yeastregulatorydb.regulatory_data.tests.utils.model_to_dict_select import model_to_dict_select
 from yeastregulatorydb.users.models import User
 
@@ -231,3 +238,65 @@ def test_promotersetsig_rankedresponse_chained(
     )
     task_result.get()
     assert PromoterSetSig.objects.count() == 1
+    promotersetsig = PromoterSetSig.objects.get()
+    assert task_result.get() == [promotersetsig.id]
+
+    # the inputs have not changed, so the subtask returns the existing record
+    task_result = promotersetsig_rankedresponse_chained(
+        instance.id, request.user.id, settings.CHIPEXO_PROMOTER_SIG_FORMAT
+    )
+    assert task_result.get() == [promotersetsig.id]
+    assert PromoterSetSig.objects.count() == 1
+    assert promotersetsig.input_fingerprint != ""
+
+    # changing ChrMap changes the input fingerprint, so the pair is recalculated
+    chrmap_record = chrmap.last()
+    chrmap_record.seqlength += 1
+    chrmap_record.save()
+    task_result = promotersetsig_rankedresponse_chained(
+        instance.id, request.user.id, settings.CHIPEXO_PROMOTER_SIG_FORMAT
+    )
+    new_promotersetsig = PromoterSetSig.objects.exclude(id=promotersetsig.id).get()
+    assert task_result.get() == [new_promotersetsig.id]
+    assert new_promotersetsig.input_fingerprint != promotersetsig.input_fingerprint
+
+
+def test_combine_cc_passing_replicates_task(
+    chrmap: QuerySet,
+    fileformat: QuerySet,
+    cc_datasource: DataSource,
+    regulator: Regulator,
+    user: User,
+):
+    """test combine_cc_passing_replicates_task"""
+    test_data = os.path.join(os.path.dirname(__file__), "test_data/binding/callingcards")
+    replicate_dfs = []
+    for experiment in [292, 297]:
+        path = os.path.join(test_data, f"ccexperiment_{experiment}_hap5_chrI.csv.gz")
+        replicate_dfs.append(pd.read_csv(path, sep="\t"))
+        with open(path, "rb") as file_obj:
+            replicate = BindingFactory(
+                source=cc_datasource, regulator=regulator, file=ContentFile(file_obj.read(), name="replicate.csv.gz")
+            )
+        BindingManualQCFactory(binding=replicate, data_usable="passing")
+
+    combined_id = combine_cc_passing_replicates_task.apply(args=(regulator.id, user.id)).get()
+    combined_record = Binding.objects.get(id=combined_id)
+    assert combined_record.batch == "cc_combined"
+    assert len(pd.read_csv(combined_record.file.path, sep="\t")) == sum(len(df) for df in replicate_dfs)
+
+    # the replicates have not changed, so the combined record is not recombined
+    file_name = combined_record.file.name
+    assert combine_cc_passing_replicates_task.apply(args=(regulator.id, user.id)).get() == combined_id
+    combined_record.refresh_from_db()
+    assert combined_record.file.name == file_name
+
+    # summing the depth of duplicate insertions updates the combined record
+    summed_id = combine_cc_passing_replicates_task.apply(
+        args=(regulator.id, user.id), kwargs={"sum_depth": True}
+    ).get()
+    assert summed_id == combined_id
+    combined_record.refresh_from_db()
+    summed_df = pd.read_csv(combined_record.file.path, sep="\t")
+    assert len(summed_df) == len(pd.concat(replicate_dfs).drop_duplicates(["chr", "start", "end", "strand"]))
+    assert summed_df["depth"].sum() == sum(df["depth"].sum() for df in replicate_dfs)
@@ -1,10 +1,56 @@
+import gzip
+import io
+import multiprocessing
 import os
+import zlib
 
+import numpy as np
 import pandas as pd
 import pytest
+from callingcardstools.Analysis.yeast.chipexo_promoter_sig import chipexo_promoter_sig as cct_chipexo_promoter_sig
+from callingcardstools.PeakCalling.yeast.call_peaks import call_peaks
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
 from django.db.models.query import QuerySet
 
+from yeastregulatorydb.regulatory_data.models import ChrMap, Expression, ExpressionEffect, GenomicFeature
+from yeastregulatorydb.regulatory_data.tests.factories import (
+    CallingCardsBackgroundFactory,
+    DataSourceFactory,
+    ExpressionFactory,
+    GenomicFeatureFactory,
+    PromoterSetFactory,
+)
+from yeastregulatorydb.regulatory_data.utils import effect_matrix as effect_matrix_module
+from yeastregulatorydb.regulatory_data.utils import prefetch_stored_files as prefetch_module
+from yeastregulatorydb.regulatory_data.utils.background_hop_counts import (
+    background_hop_counts_name,
+    get_background_hop_counts,
+)
+from yeastregulatorydb.regulatory_data.utils.bulk_load_table import bulk_load_table
+from yeastregulatorydb.regulatory_data.utils.bulk_upload_job import BulkUploadJob
+from yeastregulatorydb.regulatory_data.utils.chrmap_cache import CHRMAP_VERSION_CACHE_KEY, chrmap_cache
+from yeastregulatorydb.regulatory_data.utils.combine_qbed import QBED_SORT_KEY, combine_qbed_records
 from yeastregulatorydb.regulatory_data.utils.count_hops import count_hops
+from yeastregulatorydb.regulatory_data.utils.genomicfeature_cache import genomicfeature_cache
+from yeastregulatorydb.regulatory_data.utils.gzip_csv_stream import gzip_csv_stream
+from yeastregulatorydb.regulatory_data.utils.local_file_cache import LocalFileCache
+from yeastregulatorydb.regulatory_data.utils.promoter_interval_index import (
+    PromoterIntervalIndex,
+    get_promoter_interval_index,
+)
+from yeastregulatorydb.regulatory_data.utils.promoter_sig import (
+    callingcards_promoter_sig,
+    chipexo_promoter_sig,
+    total_hops,
+    unique_hops,
+)
+from yeastregulatorydb.regulatory_data.utils.validate_df import validate_df
+from yeastregulatorydb.regulatory_data.utils.validate_genomic_file import validate_genomic_file, validate_genomic_files
+from yeastregulatorydb.regulatory_data.utils.versioned_cache import VersionedCache
 
 
 @pytest.mark.django_db
@@ -15,3 +61,552 @@ def test_count_hops(chrmap: QuerySet):
     df = pd.read_csv(input_data_path, sep="\t", compression="gzip")
     actual = count_hops(df, "ucsc")  # replace 'chr_format' with the actual chromosome format
     assert actual == {"genomic": 222, "mito": 4, "plasmid": 47}
+
+
+@pytest.mark.django_db
+def test_chrmap_cache(chrmap: QuerySet):
+    chr1 = ChrMap.objects.get(ucsc="chrI")
+    assert chrmap_cache.seqlength("ucsc")["chrI"] == chr1.seqlength
+    assert chrmap_cache.chr_type("ucsc")["chrM"] == "mito"
+    assert chrmap_cache.translate("ucsc", "refseq")["chrI"] == chr1.refseq
+    with pytest.raises(ValueError):
+        chrmap_cache.seqlength("not_a_format")
+
+    # saving a record sends post_save, which invalidates the cache
+    chr1.seqlength = 10
+    chr1.save()
+    assert chrmap_cache.seqlength("ucsc")["chrI"] == 10
+
+
+def test_versioned_cache_requires_load():
+    class NoLoadCache(VersionedCache):
+        version_cache_key = "no_load_version"
+
+    with pytest.raises(TypeError):
+        NoLoadCache()
+
+
+def test_chrmap_cache_invalidated_on_commit(chrmap: QuerySet, django_capture_on_commit_callbacks):
+    version = chrmap_cache.version
+    chr1 = ChrMap.objects.get(ucsc="chrI")
+
+    # a change which is rolled back is not published
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            chr1.seqlength = 10
+            chr1.save()
+            assert chrmap_cache.version != version
+            raise RuntimeError
+    assert chrmap_cache.version == version
+
+    with django_capture_on_commit_callbacks(execute=True):
+        chr1.seqlength = 10
+        chr1.save()
+        # the change is seen, under a new version, by this thread, but the
+        # shared version is only set when the transaction commits
+        new_version = chrmap_cache.version
+        assert new_version != version
+        assert cache.get(CHRMAP_VERSION_CACHE_KEY) == version
+        assert chrmap_cache.seqlength("ucsc")["chrI"] == 10
+    assert cache.get(CHRMAP_VERSION_CACHE_KEY) == new_version
+
+
+def test_genomicfeature_cache(chrmap: QuerySet):
+    features = [GenomicFeatureFactory(chr=chrmap.first()) for _ in range(3)]
+    ids = pd.Series([features[2].id, pd.NA, features[0].id, features[2].id + 100], dtype="Int64")
+    locus_tags, symbols = genomicfeature_cache.annotate(ids)
+    assert list(locus_tags[[0, 2]]) == [features[2].locus_tag, features[0].locus_tag]
+    assert list(symbols[[0, 2]]) == [features[2].symbol, features[0].symbol]
+    assert pd.isna(locus_tags[1]) and pd.isna(symbols[3])
+
+    # saving a record sends post_save, which invalidates the cache
+    features[0].symbol = "NEW1"
+    features[0].save()
+    assert genomicfeature_cache.annotate(pd.Series([features[0].id]))[1][0] == "NEW1"
+
+
+def test_local_file_cache(tmpdir):
+    storage = FileSystemStorage(location=tmpdir.mkdir("storage").strpath)
+    storage.save("promotersets/1.bed.gz", ContentFile(b"a" * 10))
+    storage.save("promotersets/2.bed.gz", ContentFile(b"b" * 10))
+
+    cache = LocalFileCache(tmpdir.join("cache").strpath, max_bytes=15)
+
+    first_path = cache.get_path("promotersets/1.bed.gz", storage)
+    assert first_path.endswith("1.bed.gz")
+    with open(first_path, "rb") as f:
+        assert f.read() == b"a" * 10
+    assert cache.get_path("promotersets/1.bed.gz", storage) == first_path
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    # the second file exceeds the byte budget, but the first was returned
+    # within the grace period, so it is not evicted
+    second_path = cache.get_path("promotersets/2.bed.gz", storage)
+    assert os.path.exists(first_path)
+
+    # once the grace period has passed, the least recently used file is evicted
+    os.utime(first_path, (0, 0))
+    cache.evict(keep=second_path)
+    assert not os.path.exists(first_path)
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 2,
+        "bytes_downloaded": 20,
+        "evictions": 1,
+        "bytes_cached": 10,
+    }
+
+    # an abandoned download is removed, and an in progress one is not
+    abandoned_part = tmpdir.join("cache", "abandoned.part")
+    abandoned_part.write(b"c")
+    os.utime(abandoned_part.strpath, (0, 0))
+    in_progress_part = tmpdir.join("cache", "in_progress.part")
+    in_progress_part.write(b"d")
+    cache.evict()
+    assert not abandoned_part.exists()
+    assert in_progress_part.exists()
+    in_progress_part.remove()
+
+    # a file evicted by another process after it was found is downloaded again
+    os.unlink(second_path)
+    assert cache.get_path("promotersets/2.bed.gz", storage) == second_path
+    assert cache.stats()["misses"] == 3
+
+    with pytest.raises(FileNotFoundError):
+        cache.get_path("promotersets/3.bed.gz", storage)
+
+
+def test_validate_df():
+    df = pd.DataFrame(
+        {
+            "chr": ["chrI", "chrI", "chrI"],
+            "start": [1.0, 2.0, 3.0],
+            "end": [2, 3, 4],
+            "name": [1, 2, 3],
+            "score": [0.1, 0.2, 0.3],
+            "strand": ["+", "-", "*"],
+        }
+    )
+    validated = validate_df(df.copy())
+    assert validated["start"].dtype == "int64"
+    assert validated["name"].tolist() == ["1", "2", "3"]
+
+    df.loc[1, "start"] = 2.5
+    with pytest.raises(ValueError, match=r"decimal values or `NaN`.*\[1\]"):
+        validate_df(df.copy())
+
+    df.loc[1, "start"] = 2.0
+    df.loc[2, "strand"] = "x"
+    with pytest.raises(ValueError, match=r"Column strand must be one of.*\[2\]"):
+        validate_df(df.copy())
+
+    with pytest.raises(ValueError, match="missing the expected columns"):
+        validate_df(df.drop(columns="score"))
+
+
+@pytest.mark.django_db
+def test_promoter_sig(chrmap: QuerySet, tmpdir):
+    """the interval index results match callingcardstools"""
+    test_data = os.path.join(os.path.dirname(__file__), "test_data")
+    promoter_path = os.path.join(test_data, "promoters/yiming_promoters_chrI.bed.gz")
+    experiment_path = os.path.join(test_data, "binding/callingcards/hap5_expr17_chr1_ucsc.qbed.gz")
+    background_path = os.path.join(test_data, "background/adh1_background_chrI.qbed.gz")
+    chipexo_path = os.path.join(test_data, "binding/chipexo/28366_chrI.csv.gz")
+    # callingcardstools expects a chrmap file
+    chrmap_path = os.path.join(tmpdir, "chrmap.csv")
+    chrmap_cache.df.to_csv(chrmap_path, index=False)
+
+    chr_codes = chrmap_cache.chr_codes("ucsc")
+    promoter_index = PromoterIntervalIndex(pd.read_csv(promoter_path, sep="\t"), chr_codes)
+    experiment_df = pd.read_csv(experiment_path, sep="\t")
+    background_df = pd.read_csv(background_path, sep="\t")
+
+    actual = callingcards_promoter_sig(
+        promoter_index,
+        unique_hops(experiment_df, chr_codes),
+        total_hops(experiment_df, chr_codes),
+        promoter_index.count(unique_hops(background_df, chr_codes)),
+        total_hops(background_df, chr_codes),
+    )
+    expected = call_peaks(
+        experiment_path,
+        "ucsc",
+        promoter_path,
+        "ucsc",
+        background_path,
+        "ucsc",
+        chrmap_path,
+        False,
+        "ucsc",
+    )
+    assert len(actual) > 0
+    pd.testing.assert_frame_equal(actual, expected.reset_index(drop=True), check_dtype=False)
+
+    actual = chipexo_promoter_sig(promoter_index, pd.read_csv(chipexo_path), chr_codes)
+    expected = cct_chipexo_promoter_sig(chipexo_path, "ucsc", promoter_path, "ucsc", chrmap_path, "ucsc")
+    assert len(actual) > 0
+    pd.testing.assert_frame_equal(actual, expected.reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.django_db
+def test_get_promoter_interval_index(chrmap: QuerySet, settings, tmpdir):
+    settings.LOCAL_FILE_CACHE_DIR = tmpdir.strpath
+    promoter_path = os.path.join(os.path.dirname(__file__), "test_data/promoters/yiming_promoters_chrI.bed.gz")
+    promoterset = PromoterSetFactory(file__from_path=promoter_path)
+    index_dir = os.path.join(tmpdir.strpath, "promoter_index")
+
+    index = get_promoter_interval_index(promoterset)
+    assert len(index.promoters) == len(pd.read_csv(promoter_path, sep="\t"))
+    (index_name,) = os.listdir(index_dir)
+
+    # the index is not rebuilt when the ChrMap cache is invalidated, since
+    # its content has not changed
+    chrmap_cache.invalidate()
+    get_promoter_interval_index(promoterset)
+    assert os.listdir(index_dir) == [index_name]
+
+    # when the file changes, the index is rebuilt, and the old one deleted
+    with open(promoter_path, "rb") as promoter_file:
+        content = promoter_file.read()
+    default_storage.delete(promoterset.file.name)
+    default_storage.save(promoterset.file.name, ContentFile(content))
+    os.utime(default_storage.path(promoterset.file.name), (0, 0))
+    get_promoter_interval_index(promoterset)
+    assert len(os.listdir(index_dir)) == 1 and os.listdir(index_dir) != [index_name]
+
+
+@pytest.mark.django_db
+def test_background_hop_counts(chrmap: QuerySet, fileformat: QuerySet):
+    test_data = os.path.join(os.path.dirname(__file__), "test_data")
+    promoter_path = os.path.join(test_data, "promoters/yiming_promoters_chrI.bed.gz")
+    background_path = os.path.join(test_data, "background/adh1_background_chrI.qbed.gz")
+
+    promoterset = PromoterSetFactory(file__from_path=promoter_path)
+    background = CallingCardsBackgroundFactory(
+        fileformat=fileformat.get(fileformat="qbed"), file__from_path=background_path
+    )
+
+    counts, total = get_background_hop_counts(background, promoterset)
+    name = background_hop_counts_name(background, promoterset)
+    assert default_storage.exists(name)
+
+    chr_codes = chrmap_cache.chr_codes("ucsc")
+    background_df = pd.read_csv(background_path, sep="\t")
+    promoter_index = PromoterIntervalIndex(pd.read_csv(promoter_path, sep="\t"), chr_codes)
+    np.testing.assert_array_equal(counts, promoter_index.count(unique_hops(background_df, chr_codes)))
+    assert total == len(background_df)
+
+    # the second call reads the stored counts, also after the ChrMap cache is
+    # invalidated, since its content has not changed
+    chrmap_cache.invalidate()
+    assert background_hop_counts_name(background, promoterset) == name
+    stored_counts, stored_total = get_background_hop_counts(background, promoterset)
+    np.testing.assert_array_equal(stored_counts, counts)
+    assert stored_total == total
+
+    # the counts are deleted with the background
+    background.delete()
+    assert not default_storage.exists(name)
+
+
+def test_combine_qbed_records(fileformat: QuerySet, tmp_path):
+    test_data = os.path.join(os.path.dirname(__file__), "test_data/binding/callingcards")
+    paths = [
+        os.path.join(test_data, f"ccexperiment_{experiment}_hap5_chrI.csv.gz") for experiment in [292, 297, 302, 311]
+    ]
+    qbed_fileformat = fileformat.get(fileformat="qbed")
+    records = [CallingCardsBackgroundFactory(fileformat=qbed_fileformat, file__from_path=path) for path in paths]
+    expected = pd.concat([pd.read_csv(path, sep="\t") for path in paths], ignore_index=True)
+
+    # sorted replicates are merged, with a small chunksize to cross chunk boundaries
+    output_path = tmp_path / "combined.qbed.gz"
+    with open(output_path, "wb") as output:
+        assert combine_qbed_records(records, output, chunksize=50) == len(expected)
+    combined = pd.read_csv(output_path, sep="\t")
+    pd.testing.assert_frame_equal(
+        combined, expected.sort_values(QBED_SORT_KEY, kind="stable").reset_index(drop=True), check_like=True
+    )
+
+    with open(output_path, "wb") as output:
+        combine_qbed_records(records, output, sum_depth=True, chunksize=50)
+    summed = pd.read_csv(output_path, sep="\t")
+    expected_summed = expected.groupby(QBED_SORT_KEY, as_index=False)["depth"].sum()
+    pd.testing.assert_frame_equal(summed[expected_summed.columns], expected_summed)
+
+    # unsorted replicates are concatenated
+    unsorted_path = tmp_path / "unsorted.qbed.gz"
+    unsorted_df = pd.read_csv(paths[0], sep="\t").iloc[::-1]
+    unsorted_df.to_csv(unsorted_path, sep="\t", index=False)
+    records.append(CallingCardsBackgroundFactory(fileformat=qbed_fileformat, file__from_path=str(unsorted_path)))
+    with open(output_path, "wb") as output:
+        assert combine_qbed_records(records, output, sum_depth=True) == len(expected) + len(unsorted_df)
+
+
+def test_gzip_csv_stream():
+    frames = [pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), pd.DataFrame({"a": [3], "b": ["z"]})]
+    chunks = list(gzip_csv_stream(iter(frames), columns=["b", "a"]))
+    # the header, and each frame, can be decompressed as soon as it is yielded
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(chunks[0]) == b"b,a\n"
+    assert decompressor.decompress(chunks[1]) == b"x,1\ny,2\n"
+    combined = pd.read_csv(io.BytesIO(b"".join(chunks)), compression="gzip")
+    pd.testing.assert_frame_equal(combined, pd.concat(frames, ignore_index=True)[["b", "a"]])
+
+    # there is a header if there are no frames
+    assert gzip.decompress(b"".join(gzip_csv_stream(iter([]), columns=["a"]))) == b"a\n"
+
+
+def test_prefetch_stored_files(fileformat: QuerySet, monkeypatch):
+    test_data = os.path.join(os.path.dirname(__file__), "test_data/binding/callingcards")
+    qbed_fileformat = fileformat.get(fileformat="qbed")
+    records = [
+        CallingCardsBackgroundFactory(
+            fileformat=qbed_fileformat,
+            file__from_path=os.path.join(test_data, f"ccexperiment_{experiment}_hap5_chrI.csv.gz"),
+        )
+        for experiment in [292, 297, 302, 311]
+    ]
+
+    # a transient error is retried, and the records are yielded in order
+    failures = {records[1].file.name: 1}
+    extract_file_from_storage = prefetch_module.extract_file_from_storage
+
+    def flaky_extract(stored_file):
+        if failures.get(stored_file.name):
+            failures[stored_file.name] -= 1
+            raise ConnectionError("connection reset")
+        return extract_file_from_storage(stored_file)
+
+    monkeypatch.setattr(prefetch_module, "extract_file_from_storage", flaky_extract)
+    monkeypatch.setattr(prefetch_module.time, "sleep", lambda seconds: None)
+    prefetched = prefetch_module.prefetch_stored_files(iter(records), max_workers=2, retries=1)
+    assert [record.id for record in prefetched] == [record.id for record in records]
+
+    # once the retries are exhausted, the error is raised for MyBaseTask to retry
+    failures[records[2].file.name] = 2
+    with pytest.raises(ConnectionError):
+        list(prefetch_module.prefetch_stored_files(records, max_workers=2, retries=1))
+
+
+@pytest.mark.django_db
+def test_effect_matrix(monkeypatch):
+    source = DataSourceFactory()
+    records = [ExpressionFactory(source=source, batch=f"batch{i}") for i in range(3)]
+    targets = GenomicFeatureFactory.create_batch(4)
+
+    def materialize(record, effects):
+        ExpressionEffect.objects.filter(record=record).delete()
+        ExpressionEffect.objects.bulk_create(
+            ExpressionEffect(
+                record=record,
+                regulator_id=record.regulator.genomicfeature_id,
+                target_id=target.id,
+                effect=effect,
+                pvalue=effect / 10,
+            )
+            for target, effect in zip(targets, effects)
+        )
+        Expression.objects.filter(pk=record.pk).update(effects_modified_date=F("modified_date"))
+
+    for i, record in enumerate(records):
+        materialize(record, [i + 1.0, i + 2.0])
+
+    # record which records are read, rather than copied from the previous version
+    read_ids = []
+    iter_combined_effects = effect_matrix_module.iter_combined_effects
+
+    def spy_iter_combined_effects(queryset):
+        read_ids.extend(queryset.values_list("id", flat=True))
+        return iter_combined_effects(queryset)
+
+    monkeypatch.setattr(effect_matrix_module, "iter_combined_effects", spy_iter_combined_effects)
+
+    # the matrix is not built on request
+    assert effect_matrix_module.get_effect_matrix(Expression, source=source.id) == (None, False)
+    matrix = effect_matrix_module.build_effect_matrix(Expression, source=source.id)
+    assert read_ids == [record.id for record in records]
+    columns = matrix.column_index([target.id for target in targets])
+    block = matrix.select("effect", matrix.row_index(), columns)
+    np.testing.assert_array_equal(block[:, :2], [[1.0, 2.0], [2.0, 3.0], [3.0, 4.0]])
+    assert np.isnan(block[:, 2:]).all()
+    pvalues = matrix.select(
+        "pvalue", matrix.row_index(regulator_ids=[records[1].regulator.genomicfeature_id]), columns
+    )
+    np.testing.assert_allclose(pvalues[:, :2], [[0.2, 0.3]])
+    with pytest.raises(ValueError):
+        matrix.column_index([max(matrix.target_ids) + 1])
+
+    # an unchanged group is not rebuilt
+    current, up_to_date = effect_matrix_module.get_effect_matrix(Expression, source=source.id)
+    assert current.path == matrix.path and up_to_date
+    assert effect_matrix_module.build_effect_matrix(Expression, source=source.id).path == matrix.path
+
+    # only the modified record is read, and the unchanged rows are remapped
+    # to the columns of a new GenomicFeature
+    records[1].save()
+    materialize(records[1], [10.0, 20.0, 30.0])
+    new_target = GenomicFeatureFactory()
+    read_ids.clear()
+    # the last complete version is returned until the matrix is rebuilt
+    current, up_to_date = effect_matrix_module.get_effect_matrix(Expression, source=source.id)
+    assert current.path == matrix.path and not up_to_date
+    rebuilt = effect_matrix_module.build_effect_matrix(Expression, source=source.id)
+    assert rebuilt.path != matrix.path
+    assert read_ids == [records[1].id]
+    columns = rebuilt.column_index([target.id for target in targets] + [new_target.id])
+    block = rebuilt.select("effect", rebuilt.row_index([record.id for record in records]), columns)
+    np.testing.assert_array_equal(block[:, :3], [[1.0, 2.0, np.nan], [10.0, 20.0, 30.0], [3.0, 4.0, np.nan]])
+    assert np.isnan(block[:, 3:]).all()
+
+
+def test_bulk_load_table(chrmap: QuerySet, user, django_capture_on_commit_callbacks):
+    genes = pd.read_csv(os.path.join(os.path.dirname(__file__), "test_data/genome/chr1_genes.csv.gz")).drop(
+        columns="id"
+    )
+
+    # ids are reserved for the rows, and `unknown` symbols are made unique.
+    # Only the cache of the loaded model is invalidated
+    chrmap_version = chrmap_cache.version
+    with django_capture_on_commit_callbacks(execute=True):
+        assert bulk_load_table(GenomicFeature, genes, user) == len(genes)
+    assert chrmap_cache.version == chrmap_version
+    loaded = pd.DataFrame.from_records(GenomicFeature.objects.order_by("id").values("id", "locus_tag", "symbol"))
+    assert loaded.locus_tag.tolist() == genes.locus_tag.tolist()
+    unknown = (genes.symbol == "unknown").to_numpy()
+    assert (loaded.symbol[unknown] == "unknown_" + loaded.id[unknown].astype(str)).all()
+    assert genomicfeature_cache.annotate(loaded.id)[0].tolist() == genes.locus_tag.tolist()
+
+    # every error is reported, and nothing is loaded
+    invalid = genes.head(3).assign(locus_tag=["new_1", "new_1", "new_2"], strand=["+", "x", "-"])
+    invalid.loc[2, "start"] = invalid.loc[2, "end"] + 1
+    with pytest.raises(ValueError) as exc_info:
+        bulk_load_table(GenomicFeature, pd.concat([invalid, genes.head(1)], ignore_index=True), user)
+    for message in ["`locus_tag` is duplicated in rows 0, 1", "`strand` is not one of", "`locus_tag` already exists"]:
+        assert message in str(exc_info.value)
+    with pytest.raises(ValueError, match="`start` cannot be greater than `end` in rows 2"):
+        bulk_load_table(GenomicFeature, invalid.assign(locus_tag=["new_1", "new_2", "new_3"], strand="+"), user)
+    assert GenomicFeature.objects.count() == len(genes)
+
+    # explicit ids are loaded, without COPY, and the sequence moves past them
+    explicit = genes.head(2).assign(id=[10_000, 10_001], locus_tag=["new_1", "new_2"])
+    assert bulk_load_table(GenomicFeature, explicit, user, use_copy=False) == 2
+    assert GenomicFeature.objects.get(id=10_001).locus_tag == "new_2"
+    assert GenomicFeatureFactory().id > 10_001
+
+    # the unique identifiers of a chromosome are checked against the database
+    plasmid = {key: "RDM_9" for key in ["refseq", "igenomes", "ensembl", "ucsc", "mitra", "numbered", "chr"]}
+    version = cache.get(CHRMAP_VERSION_CACHE_KEY)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert bulk_load_table(ChrMap, pd.DataFrame([{**plasmid, "seqlength": 100, "type": "plasmid"}]), user) == 1
+        # the caches are invalidated when the transaction commits
+        assert cache.get(CHRMAP_VERSION_CACHE_KEY) == version
+        assert chrmap_cache.seqlength("ucsc")["RDM_9"] == 100
+    assert cache.get(CHRMAP_VERSION_CACHE_KEY) != version
+    assert ChrMap.objects.get(ucsc="RDM_9").seqlength == 100
+    with pytest.raises(ValueError, match="`ucsc` already exists in rows 0"):
+        bulk_load_table(ChrMap, pd.DataFrame([{**plasmid, "refseq": "RDM_10", "seqlength": 100}]), user)
+
+
+def test_bulk_upload_job(settings):
+    settings.BULK_UPLOAD_JOB_SAVE_INTERVAL = 60
+    job = BulkUploadJob.create(user_id=1, model="Binding")
+    job.start([(1, "b.qbed"), (0, "a.qbed")])
+    job.row_valid(0)
+    job.row_invalid(1, "not a qbed file")
+    # the progress of the rows is not saved until the interval has passed
+    assert BulkUploadJob.get(job.job_id).as_dict()["row_counts"]["pending"] == 2
+    settings.BULK_UPLOAD_JOB_SAVE_INTERVAL = 0
+    job.row_saved(0)
+    assert BulkUploadJob.get(job.job_id).as_dict()["row_counts"] == {
+        "pending": 0,
+        "valid": 0,
+        "invalid": 1,
+        "saved": 1,
+    }
+    # a failed job saves no row, and the rows are listed in order
+    job.finish(["could not save the records"])
+    result = BulkUploadJob.get(job.job_id).as_dict()
+    assert result["status"] == "failed"
+    assert [(row["row"], row["status"]) for row in result["rows"]] == [(0, "valid"), (1, "invalid")]
+
+
+@pytest.mark.django_db
+def test_validate_genomic_files(chrmap: QuerySet):
+    qbed_path = os.path.join(os.path.dirname(__file__), "test_data/binding/callingcards/ccexperiment_511.qbed")
+    fields = {"chr": str, "start": int, "end": int, "depth": int, "strand": str}
+    jobs = [(qbed_path + ".gz", "\t", fields), (qbed_path, "\t", fields), (qbed_path + ".gz", ",", fields)]
+
+    results = validate_genomic_files(jobs, max_workers=2)
+
+    sidecar_path, inserts = results[0]
+    assert inserts == {"genomic_inserts": 222, "mito_inserts": 4, "plasmid_inserts": 47}
+    assert sidecar_path is not None and len(pd.read_parquet(sidecar_path)) > 0
+    os.unlink(sidecar_path)
+    # the plain text file is not gzipped, and the gzipped file is not comma separated
+    assert isinstance(results[1], OSError)
+    assert isinstance(results[2], ValueError)
+    # the files are validated the same in this process
+    assert validate_genomic_files(jobs[1:], max_workers=1)[0].__class__ is results[1].__class__
+
+
+def _validate_genomic_files_in_child(jobs: list[tuple], queue) -> None:
+    results = validate_genomic_files(jobs, max_workers=2)
+    queue.put([result if isinstance(result, tuple) else type(result).__name__ for result in results])
+
+
+@pytest.mark.django_db
+def test_validate_genomic_files_daemonic(chrmap: QuerySet):
+    qbed_path = os.path.join(os.path.dirname(__file__), "test_data/binding/callingcards/ccexperiment_511.qbed")
+    fields = {"chr": str, "start": int, "end": int, "depth": int, "strand": str}
+    jobs = [(qbed_path + ".gz", "\t", fields), (qbed_path, "\t", fields)]
+    # load the ChrMap table here, so that the child does not query the test database
+    chrmap_cache.df
+    # a daemonic process, eg a celery prefork worker, may not have children,
+    # so the files are validated in the process itself
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_validate_genomic_files_in_child, args=(jobs, queue), daemon=True)
+    process.start()
+    results = queue.get(timeout=60)
+    process.join(timeout=60)
+
+    assert process.exitcode == 0
+    sidecar_path, inserts = results[0]
+    assert inserts == {"genomic_inserts": 222, "mito_inserts": 4, "plasmid_inserts": 47}
+    os.unlink(sidecar_path)
+    assert results[1] in {"OSError", "BadGzipFile"}
+
+
+@pytest.mark.django_db
+def test_validate_genomic_file_chunks(chrmap: QuerySet, settings, tmpdir):
+    qbed_path = os.path.join(os.path.dirname(__file__), "test_data/binding/callingcards/ccexperiment_511.qbed.gz")
+    fields = {"chr": str, "start": int, "end": int, "depth": int, "strand": str}
+    df = pd.read_csv(qbed_path, sep="\t")
+    expected = {f"{key}_inserts": value for key, value in count_hops(df, "ucsc").items()}
+    settings.FILE_VALIDATION_CHUNKSIZE = 7
+
+    def write(df: pd.DataFrame) -> str:
+        path = tmpdir.join(f"{len(os.listdir(tmpdir))}.qbed.gz").strpath
+        df.to_csv(path, sep="\t", index=False, compression="gzip")
+        return path
+
+    # the hops are counted as the chunks are read, whether or not the file
+    # is sorted, and whether or not a coordinate is split across chunks
+    for path in [qbed_path, write(df.sample(frac=1, random_state=1)), write(pd.concat([df, df]).sort_values("chr"))]:
+        sidecar_path, inserts = validate_genomic_file(path, "\t", fields)
+        assert inserts == expected
+        os.unlink(sidecar_path)
+
+    # every chunk is parsed with the dtypes of the fields, so that a float
+    # column which is integer valued in one chunk is valid
+    bed = pd.DataFrame({"chr": "chrI", "start": range(1, 21), "end": range(2, 22), "score": 1.0})
+    bed.loc[10:, "score"] = 0.5
+    fields = {"chr": str, "start": int, "end": int, "score": float}
+    sidecar_path, _ = validate_genomic_file(write(bed.astype({"score": object}).replace(1.0, 1)), "\t", fields)
+    assert pd.read_parquet(sidecar_path)["score"].tolist() == bed["score"].tolist()
+    os.unlink(sidecar_path)
+
+    bed.loc[15, "start"] = 15.5
+    with pytest.raises(ValueError, match="decimal values"):
+        validate_genomic_file(write(bed), "\t", fields)
@@ -1,3 +1,4 @@
+import hashlib
 import io
 import os
 import re
@@ -5,13 +6,20 @@ import tarfile
 import tempfile
 from urllib.parse import urlencode
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import pytest
 from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.db.models.query import QuerySet
 from django.http import QueryDict
-from django.test import RequestFactory
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
@@ -26,7 +34,20 @@ from ..api.serializers import (
     PromoterSetSigSerializer,
 )
 from ..api.views import ChrMapViewSet, GenomicFeatureViewSet
-from ..models import Binding, BindingManualQC, ChrMap, DataSource, Expression, PromoterSetSig, Regulator
+from ..models import (
+    Binding,
+    BindingManualQC,
+    ChrMap,
+    DataSource,
+    Expression,
+    ExpressionEffect,
+    GenomicFeature,
+    PromoterSetSig,
+    Regulator,
+)
+from ..tasks import bulk_upload_task, effect_matrix_task, materialize_combined_effects_task
+from ..utils.chunked_upload import CHUNKED_UPLOAD_CACHE_KEY, ChunkedUpload
+from ..utils.parquet_sidecar import write_parquet_sidecar
 from .factories import (
     BindingFactory,
     CallingCardsBackgroundFactory,
@@ -97,6 +118,72 @@ def test_gene_list(user: User, genomicfeature_chr1_genes: QuerySet, rf: RequestF
     assert response.data["locus_tag"] == "YAL031W-A"
 
 
+def test_genomicfeature_bulk_load(user: User, chrmap: QuerySet):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    genes_path = os.path.join(os.path.dirname(__file__), "test_data/genome/chr1_genes.csv.gz")
+    with open(genes_path, "rb") as genes_file:
+        response = client.post(reverse("api:genomicfeature-bulk-load"), {"file": genes_file}, format="multipart")
+    assert response.status_code == 201, response.data
+    assert GenomicFeature.objects.count() == response.data["loaded"] == len(pd.read_csv(genes_path))
+
+    # the records already exist, so none are loaded
+    with open(genes_path, "rb") as genes_file:
+        response = client.post(reverse("api:genomicfeature-bulk-load"), {"file": genes_file}, format="multipart")
+    assert response.status_code == 400
+    assert "`id` already exists" in response.data
+
+
+def test_genomicfeature_export(user: User, genomicfeature_chr1_genes: QuerySet):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    # a small chunk size, so that the rows are written in several chunks
+    with override_settings(EXPORT_TABLE_CHUNKSIZE=7):
+        response = client.get(reverse("api:genomicfeature-export"))
+    assert response.status_code == 200
+    df = pd.read_csv(io.BytesIO(b"".join(response.streaming_content)), compression="gzip")
+    assert list(df.columns) == [field.attname for field in GenomicFeature._meta.concrete_fields]
+    assert df.id.tolist() == list(genomicfeature_chr1_genes.order_by("id").values_list("id", flat=True))
+
+    with override_settings(EXPORT_TABLE_USE_COPY=True):
+        response = client.get(reverse("api:genomicfeature-export"))
+    copy_df = pd.read_csv(io.BytesIO(b"".join(response.streaming_content)), compression="gzip")
+    assert list(copy_df.columns) == list(df.columns)
+    columns = ["id", "chr_id", "start", "end", "strand", "locus_tag", "symbol"]
+    pd.testing.assert_frame_equal(copy_df[columns], df[columns])
+
+
+def test_genomicfeature_cursor_pagination(user: User, genomicfeature_chr1_genes: QuerySet):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    ids = []
+    url = reverse("api:genomicfeature-list") + "?pagination=cursor&page_size=50"
+    with CaptureQueriesContext(connection) as queries:
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            assert "count" not in response.data
+            ids.extend(record["id"] for record in response.data["results"])
+            url = response.data["next"]
+    # the cursor mode does not count the records
+    assert not any("COUNT(" in query["sql"] for query in queries.captured_queries)
+    assert ids == list(genomicfeature_chr1_genes.order_by("id").values_list("id", flat=True))
+
+    # the page size is capped
+    with override_settings(CURSOR_PAGINATION_MAX_PAGE_SIZE=10):
+        response = client.get(reverse("api:genomicfeature-list"), {"pagination": "cursor", "page_size": 1000})
+    assert len(response.data["results"]) == 10
+
+    # the page number mode is the default
+    assert client.get(reverse("api:genomicfeature-list")).data["count"] == len(ids)
+
+
 @pytest.mark.django_db
 def test_single_binding_upload(
     cc_datasource: DataSource,
@@ -741,7 +828,12 @@ def test_expression_task_upload(
 
 @pytest.mark.django_db
 def test_expression_bulk_upload_and_combinedfile(
-    chrmap: QuerySet, hu_datasource: DataSource, mcisaac_datasource: DataSource, user: User, test_data_dict: dict
+    chrmap: QuerySet,
+    hu_datasource: DataSource,
+    mcisaac_datasource: DataSource,
+    user: User,
+    test_data_dict: dict,
+    monkeypatch,
 ):
     token = Token.objects.get(user=user)
     client = APIClient()
@@ -809,6 +901,55 @@ def test_expression_bulk_upload_and_combinedfile(
         assert "effect" in df.columns, df.columns
         assert "pvalue" in df.columns, df.columns
 
+        # once the effects are materialized, they are read from the
+        # database, and the combined file does not change
+        for expression in Expression.objects.all():
+            assert materialize_combined_effects_task.apply(args=("Expression", expression.id)).get() > 0
+        assert ExpressionEffect.objects.count() == len(df)
+        response = client.get(reverse("api:expression-combined"), {"regulator_symbol": "HAP5"})
+        materialized_df = pd.read_csv(io.BytesIO(b"".join(response.streaming_content)), compression="gzip")
+        pd.testing.assert_frame_equal(materialized_df, df)
+
+        # the matrix of a source has the effects and pvalues of the combined file
+        assert client.get(reverse("api:expression-matrix")).status_code == 400
+        expression = Expression.objects.get(source=mcisaac_datasource)
+        record_df = df[df.record_id == expression.id].dropna(subset=["target_id"])
+        # the columns of the matrix are the GenomicFeatures
+        existing_ids = set(GenomicFeature.objects.values_list("id", flat=True))
+        for target_id in set(record_df.target_id.astype(int)) - existing_ids:
+            GenomicFeatureFactory(id=target_id)
+        # the matrix is built by a task, which is launched once, and is
+        # unavailable until the task has run
+        launched = []
+        monkeypatch.setattr(effect_matrix_task, "delay", lambda *args: launched.append(args))
+        for _ in range(2):
+            response = client.get(reverse("api:expression-matrix"), {"source": mcisaac_datasource.id})
+            assert response.status_code == 503, response.data
+        assert launched == [("Expression", {"source": mcisaac_datasource.id})]
+        assert effect_matrix_task.apply(args=launched[0]).get() is not None
+        response = client.get(reverse("api:expression-matrix"), {"source": mcisaac_datasource.id})
+        assert response.status_code == 200, response.data
+        matrix_df = pa.ipc.open_stream(response.content).read_all().to_pandas()
+        assert matrix_df.record_id.tolist() == [expression.id]
+        np.testing.assert_array_equal(
+            matrix_df.loc[0, record_df.target_id.astype(int).astype(str).tolist()].to_numpy(dtype=float),
+            record_df.effect.to_numpy(),
+        )
+        targets = record_df.target_id.astype(int).tolist()[:5]
+        response = client.get(
+            reverse("api:expression-matrix"),
+            {
+                "source": mcisaac_datasource.id,
+                "value": "pvalue",
+                "targets": ",".join(map(str, targets)),
+                "output_format": "npz",
+            },
+        )
+        assert response.status_code == 200, response.data
+        arrays = np.load(io.BytesIO(response.content))
+        np.testing.assert_array_equal(arrays["target_id"], targets)
+        np.testing.assert_allclose(arrays["values"][0], record_df.pvalue[:5])
+
 
 # @pytest.mark.django_db
 # def test_rank_response_summary(
@@ -900,3 +1041,283 @@ def test_expression_bulk_upload_and_combinedfile(
 
 #     response = client.get(reverse("api:rankresponse-summary"), {"rank_response_id": RankResponse.objects.first().id})
 #     assert response.status_code == 200, response.data
+
+
+@pytest.mark.django_db
+def test_expression_bulk_upload_job(
+    chrmap: QuerySet,
+    hu_datasource: DataSource,
+    mcisaac_datasource: DataSource,
+    user: User,
+    test_data_dict: dict,
+    django_capture_on_commit_callbacks,
+    monkeypatch,
+):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    GenomicFeatureFactory.create(symbol="HAP5")
+
+    csv_path = next(
+        file for file in test_data_dict["config"]["files"] if os.path.basename(file) == "expression_bulk_upload.csv"
+    )
+    expression_filepaths = [
+        file
+        for file in test_data_dict["expression"]["mcisaac"]["files"] + test_data_dict["expression"]["hu"]["files"]
+        if os.path.basename(file) in ["hap5_15min_mcisaac_chr1.csv.gz", "hap5_hu_chr1.csv.gz"]
+    ]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_file_path = os.path.join(temp_dir, "tarred_dir.tar.gz")
+        with tarfile.open(tar_file_path, "w:gz") as tar:
+            for path in expression_filepaths:
+                tar.add(path, arcname=os.path.basename(path))
+
+        with open(csv_path, "rb") as csv_handle, open(tar_file_path, "rb") as tar_handle:
+            data = {
+                "csv_file": SimpleUploadedFile("bulk_upload.csv", csv_handle.read(), content_type="text/csv"),
+                "tarred_dir": SimpleUploadedFile("tarred_dir.tar", tar_handle.read(), content_type="application/gzip"),
+                "as_job": True,
+            }
+        with django_capture_on_commit_callbacks() as callbacks:
+            response = client.post(reverse("api:expression-bulk-upload"), data, format="multipart")
+
+    assert response.status_code == 202, response.data
+    job_id = response.data["job_id"]
+    assert Expression.objects.count() == 0
+
+    response = client.get(reverse("api:expression-bulk-upload-status"), {"job_id": job_id})
+    assert response.status_code == 200, response.data
+    assert response.data["status"] == "pending"
+
+    # the job is dispatched once the request is committed
+    monkeypatch.setattr(bulk_upload_task, "delay", lambda *args: bulk_upload_task.apply(args=args))
+    callbacks[0]()
+
+    assert Expression.objects.count() == 2, Expression.objects.count()
+    response = client.get(reverse("api:expression-bulk-upload-status"), {"job_id": job_id})
+    assert response.data["status"] == "succeeded", response.data
+    assert response.data["total_rows"] == 2
+    assert response.data["row_counts"]["saved"] == 2
+    assert response.data["rows_per_second"] > 0
+    # the staged files are deleted
+    assert not os.listdir(os.path.join(settings.MEDIA_ROOT, "bulk_upload", job_id))
+
+    response = client.get(reverse("api:expression-bulk-upload-status"), {"job_id": "unknown"})
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_expression_chunked_upload(hu_datasource: DataSource, chrmap: QuerySet, test_data_dict: dict, user: User):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    rtg3_regulator = RegulatorFactory.create(genomicfeature=GenomicFeatureFactory.create(symbol="RTG3"))
+    expression_file_path = next(
+        file for file in test_data_dict["expression"]["hu"]["files"] if os.path.basename(file) in "RTG3.csv.gz"
+    )
+    with open(expression_file_path, "rb") as file_obj:
+        content = file_obj.read()
+    chunks = [content[start : start + 1000] for start in range(0, len(content), 1000)]
+
+    response = client.post(
+        reverse("api:expression-chunked-upload"),
+        {"filename": "RTG3.csv.gz", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()},
+        format="json",
+    )
+    assert response.status_code == 201, response.data
+    upload_url = reverse("api:expression-chunked-upload-status", kwargs={"upload_id": response.data["upload_id"]})
+
+    def put_chunk(number: int, chunk: bytes, sha256: str):
+        return client.put(
+            f"{upload_url}chunks/{number}/",
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_X_CHUNK_SHA256=sha256,
+        )
+
+    # the chunks are sent out of order, and a corrupted chunk is rejected
+    for number in range(len(chunks), 1, -1):
+        response = put_chunk(number, chunks[number - 1], hashlib.sha256(chunks[number - 1]).hexdigest())
+        assert response.status_code == 201, response.data
+    response = put_chunk(1, chunks[0][:-1], hashlib.sha256(chunks[0]).hexdigest())
+    assert response.status_code == 400, response.data
+
+    # finalizing with a missing chunk fails, and the upload can be resumed
+    response = client.post(f"{upload_url}finalize/", {}, format="multipart")
+    assert response.status_code == 400, response.data
+    assert [chunk["number"] for chunk in client.get(upload_url).data["chunks"]] == list(range(2, len(chunks) + 1))
+    assert put_chunk(1, chunks[0], hashlib.sha256(chunks[0]).hexdigest()).status_code == 201
+
+    expression_data = model_to_dict_select(ExpressionFactory.build())
+    # the file is the assembled upload
+    expression_data.pop("file")
+    expression_data["source"] = hu_datasource.id
+    expression_data["regulator"] = rtg3_regulator.id
+    response = client.post(f"{upload_url}finalize/", expression_data, format="multipart")
+
+    assert response.status_code == 201, response.data
+    expression = Expression.objects.get()
+    with expression.file.open("rb") as f:
+        assert f.read() == content
+
+
+@pytest.mark.django_db
+def test_binding_chunked_upload_null_file_source(
+    harbison_datasource: DataSource, chrmap: QuerySet, fileformat: QuerySet, test_data_dict: dict, user: User
+):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    RegulatorFactory.create(genomicfeature=GenomicFeatureFactory.create(symbol="RTG3"))
+    binding_path = next(
+        file
+        for file in test_data_dict["binding"]["harbison"]["files"]
+        if os.path.basename(file) == "140_H2O2Lo.csv.gz"
+    )
+    with open(binding_path, "rb") as file_obj:
+        content = file_obj.read()
+
+    response = client.post(reverse("api:binding-chunked-upload"), {"filename": "140_H2O2Lo.csv.gz"}, format="json")
+    assert response.status_code == 201, response.data
+    upload_id = response.data["upload_id"]
+    upload_url = reverse("api:binding-chunked-upload-status", kwargs={"upload_id": upload_id})
+    response = client.put(
+        f"{upload_url}chunks/1/",
+        content,
+        content_type="application/octet-stream",
+        HTTP_X_CHUNK_SHA256=hashlib.sha256(content).hexdigest(),
+    )
+    assert response.status_code == 201, response.data
+
+    data = model_to_dict_select(BindingFactory.build())
+    data.pop("file")
+    data.pop("source")
+    data["source_name"] = harbison_datasource.name
+    data.pop("regulator")
+    data["regulator_symbol"] = "RTG3"
+    data["condition"] = "H2O2Lo"
+    response = client.post(f"{upload_url}finalize/", data, format="multipart")
+
+    # the file of a NULL_BINDING_FILE_DATASOURCES source is stored on the
+    # PromoterSetSig, from the assembled upload
+    assert response.status_code == 201, response.data
+    assert Binding.objects.get().file.name == ""
+    with PromoterSetSig.objects.get(binding=Binding.objects.get()).file.open("rb") as f:
+        assert f.read() == content
+
+    # the chunks of an upload which has expired are deleted
+    cache.delete(CHUNKED_UPLOAD_CACHE_KEY.format(upload_id=upload_id))
+    assert ChunkedUpload.delete_expired() == 1
+    assert ChunkedUpload(upload_id, {}).chunks() == []
+
+
+@pytest.mark.django_db
+def test_expression_download(user: User):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    expression = ExpressionFactory.create(file=ContentFile(b"data", name="upload.csv.gz"))
+    url = reverse("api:expression-download", kwargs={"pk": expression.pk})
+
+    # by default, the file is streamed by the web process
+    response = client.get(url)
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"data"
+
+    # if downloads are redirected, nginx serves the local file
+    with override_settings(FILE_DOWNLOAD_REDIRECT=True):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response["X-Accel-Redirect"] == f"/protected-media/{expression.file.name}"
+    assert response.content == b""
+
+
+@pytest.mark.django_db
+def test_expression_conditional_and_range_requests(user: User):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    expression = ExpressionFactory.create(file=ContentFile(b"data", name="upload.csv.gz"))
+    url = reverse("api:expression-download", kwargs={"pk": expression.pk})
+
+    response = client.get(url)
+    etag = response["ETag"]
+    assert response["Accept-Ranges"] == "bytes"
+    assert "Last-Modified" in response
+
+    # an unchanged file is not sent again
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    response = client.get(url, HTTP_RANGE="bytes=1-2")
+    assert response.status_code == 206
+    assert response["Content-Range"] == "bytes 1-2/4"
+    assert b"".join(response.streaming_content) == b"at"
+
+    # a range is ignored if the file has changed since the client's copy
+    response = client.get(url, HTTP_RANGE="bytes=1-2", HTTP_IF_RANGE='"stale"')
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"data"
+
+    response = client.get(url, HTTP_RANGE="bytes=10-")
+    assert response.status_code == 416
+
+    # the export is generated, so it has a weak ETag and no ranges
+    export_url = reverse("api:expression-export")
+    response = client.get(export_url)
+    assert response["ETag"].startswith("W/")
+    # the latest modified_date of the records can go down, so there is no Last-Modified
+    assert "Last-Modified" not in response
+    assert client.get(export_url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+    # a login does not change the ETag
+    update_last_login(None, user)
+    assert client.get(export_url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+    # a change made with update(), eg a new sidecar, changes the ETag
+    sidecar_path = tempfile.NamedTemporaryFile(suffix=".parquet", delete=False).name
+    write_parquet_sidecar(expression, sidecar_path)
+    assert client.get(export_url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
+
+
+@pytest.mark.django_db
+def test_regulator_list_cache(user: User, django_assert_max_num_queries):
+    token = Token.objects.get(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    regulator = RegulatorFactory.create()
+    url = reverse("api:regulator-list")
+
+    response = client.get(url, {"regulator_symbol": "", "page": 1})
+    assert response["X-Response-Cache"] == "miss"
+
+    # the same query, with its parameters in another order, is served from
+    # the cache. The only query, in the request's savepoint, authenticates
+    # the token
+    with django_assert_max_num_queries(3):
+        cached = client.get(url, {"page": 1, "regulator_symbol": ""})
+    assert cached["X-Response-Cache"] == "hit"
+    assert cached.data == response.data
+
+    # a login does not invalidate the cached responses
+    update_last_login(None, user)
+    assert client.get(url, {"page": 1, "regulator_symbol": ""})["X-Response-Cache"] == "hit"
+
+    # a change to a regulator invalidates the cached responses
+    regulator.notes = "changed"
+    regulator.save()
+    response = client.get(url, {"page": 1})
+    assert response["X-Response-Cache"] == "miss"
+    assert response.data["results"][0]["notes"] == "changed"
+
+    stats = client.get(reverse("api:regulator-cache-stats")).data
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_ratio"] == pytest.approx(1 / 2)
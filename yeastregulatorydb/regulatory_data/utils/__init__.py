@@ -1,12 +1,27 @@
+from .chrmap_cache import ChrMapCache, chrmap_cache
 from .count_hops import count_hops
 from .extract_file_from_storage import extract_file_from_storage
+from .genomicfeature_cache import GenomicFeatureCache, genomicfeature_cache
+from .local_file_cache import LocalFileCache, get_local_file_cache
+from .promoter_interval_index import GenomicPositions, PromoterIntervalIndex, get_promoter_interval_index
 from .validate_chr_col import validate_chr_col
 from .validate_df import validate_df
 from .validate_genomic_df import validate_genomic_df
+from .versioned_cache import VersionedCache
 
 __all__ = [
+    "ChrMapCache",
+    "GenomicFeatureCache",
+    "GenomicPositions",
+    "LocalFileCache",
+    "PromoterIntervalIndex",
+    "VersionedCache",
+    "chrmap_cache",
     "count_hops",
     "extract_file_from_storage",
+    "genomicfeature_cache",
+    "get_local_file_cache",
+    "get_promoter_interval_index",
     "validate_chr_col",
     "validate_df",
     "validate_genomic_df",
@@ -0,0 +1,151 @@
+import hashlib
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .chrmap_cache import chrmap_cache
+from .local_file_cache import storage_version
+from .parquet_sidecar import read_stored_table
+from .promoter_interval_index import get_promoter_interval_index
+from .promoter_sig import total_hops, unique_hops
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_HOP_COUNTS_DIR = "background_hop_counts"
+
+
+def _listdir(path: str) -> tuple[list[str], list[str]]:
+    # FileSystemStorage raises if the directory does not exist. S3 storages,
+    # where directories are only key prefixes, return empty lists
+    try:
+        return default_storage.listdir(path)
+    except FileNotFoundError:
+        return [], []
+
+
+def background_hop_counts_dir(background_id: int, promoterset_id: int) -> str:
+    """
+    :return: the storage directory of the background hop counts of a
+        (CallingCardsBackground, PromoterSet) pair
+    :rtype: str
+    """
+    return f"{BACKGROUND_HOP_COUNTS_DIR}/{background_id}/{promoterset_id}"
+
+
+def background_hop_counts_name(background_record, promoterset_record) -> str:
+    """
+    Return the storage name of the background hop counts of a
+    (CallingCardsBackground, PromoterSet) pair. The name includes a digest of
+    the storage versions of both files and the ChrMap checksum, so the counts
+    are invalidated when either file, or the content of ChrMap, changes. The
+    checksum, unlike the ChrMap version, is the same in every process.
+
+    :param background_record: a CallingCardsBackground record
+    :type background_record: CallingCardsBackground
+    :param promoterset_record: a PromoterSet record
+    :type promoterset_record: PromoterSet
+
+    :return: the storage name of the counts
+    :rtype: str
+    """
+    token = ":".join(
+        [
+            background_record.file.name,
+            storage_version(background_record.file.name, default_storage),
+            promoterset_record.file.name,
+            storage_version(promoterset_record.file.name, default_storage),
+            chrmap_cache.checksum,
+        ]
+    )
+    digest = hashlib.sha256(token.encode()).hexdigest()[:16]
+    return f"{background_hop_counts_dir(background_record.id, promoterset_record.id)}/{digest}.parquet"
+
+
+def compute_background_hop_counts(background_record, promoterset_record) -> pd.DataFrame:
+    """
+    Count the background hops in each promoter of a promoter set.
+
+    :param background_record: a CallingCardsBackground record
+    :type background_record: CallingCardsBackground
+    :param promoterset_record: a PromoterSet record
+    :type promoterset_record: PromoterSet
+
+    :return: a dataframe with the columns `background_hops` and
+        `background_total_hops`, in the order of the promoter set
+        :class:`~yeastregulatorydb.regulatory_data.utils.promoter_interval_index.PromoterIntervalIndex`
+    :rtype: pd.DataFrame
+    """
+    chr_codes = chrmap_cache.chr_codes(settings.CHR_FORMAT)
+    promoter_index = get_promoter_interval_index(promoterset_record)
+    background_df = read_stored_table(background_record, sep=background_record.get_fileformat().separator)
+    return pd.DataFrame(
+        {
+            "background_hops": promoter_index.count(unique_hops(background_df, chr_codes)),
+            "background_total_hops": np.int64(total_hops(background_df, chr_codes)),
+        }
+    )
+
+
+def get_background_hop_counts(background_record, promoterset_record) -> tuple[np.ndarray, int]:
+    """
+    Return the number of background hops in each promoter of a promoter set,
+    and the total number of background hops. The counts are read from storage
+    if they are up to date. Otherwise, they are calculated with
+    :func:`compute_background_hop_counts` and saved, and any out of date counts
+    for the pair are deleted.
+
+    :param background_record: a CallingCardsBackground record
+    :type background_record: CallingCardsBackground
+    :param promoterset_record: a PromoterSet record
+    :type promoterset_record: PromoterSet
+
+    :return: the per promoter background hop counts, and the total background hops
+    :rtype: tuple[np.ndarray, int]
+    """
+    name = background_hop_counts_name(background_record, promoterset_record)
+
+    if default_storage.exists(name):
+        with default_storage.open(name, "rb") as counts_file:
+            df = pd.read_parquet(counts_file)
+    else:
+        logger.info(f"Counting the hops of {background_record} in promoter set {promoterset_record}")
+        df = compute_background_hop_counts(background_record, promoterset_record)
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        saved_name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        # another worker may have saved the same counts first, in which case
+        # the storage will have renamed this copy
+        if saved_name != name:
+            default_storage.delete(saved_name)
+        counts_dir = background_hop_counts_dir(background_record.id, promoterset_record.id)
+        for file_name in _listdir(counts_dir)[1]:
+            if f"{counts_dir}/{file_name}" != name:
+                default_storage.delete(f"{counts_dir}/{file_name}")
+
+    total = int(df["background_total_hops"].iloc[0]) if len(df) else 0
+    return df["background_hops"].to_numpy(dtype=np.int64), total
+
+
+def delete_background_hop_counts(background_id: int | None = None, promoterset_id: int | None = None) -> None:
+    """
+    Delete the stored background hop counts of a CallingCardsBackground, or of
+    a PromoterSet, eg when the record is deleted.
+
+    :param background_id: a CallingCardsBackground id
+    :type background_id: int, optional
+    :param promoterset_id: a PromoterSet id
+    :type promoterset_id: int, optional
+    """
+    background_ids = [str(background_id)] if background_id is not None else _listdir(BACKGROUND_HOP_COUNTS_DIR)[0]
+    for bg_id in background_ids:
+        background_dir = f"{BACKGROUND_HOP_COUNTS_DIR}/{bg_id}"
+        promoterset_ids = [str(promoterset_id)] if promoterset_id is not None else _listdir(background_dir)[0]
+        for ps_id in promoterset_ids:
+            counts_dir = f"{background_dir}/{ps_id}"
+            for file_name in _listdir(counts_dir)[1]:
+                default_storage.delete(f"{counts_dir}/{file_name}")
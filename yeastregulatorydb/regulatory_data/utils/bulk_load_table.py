@@ -0,0 +1,291 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from django.core.management.color import no_style
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from ..models import ChrMap, GenomicFeature
+from .chrmap_cache import chrmap_cache
+from .genomicfeature_cache import genomicfeature_cache
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+BULK_LOAD_MODELS: dict[str, type[models.Model]] = {
+    "chrmap": ChrMap,
+    "genomicfeature": GenomicFeature,
+}
+
+# the BaseModel fields, which are set by the loader rather than read from the table
+_BASE_FIELDS = {"uploader", "upload_date", "modifier", "modified_date"}
+
+# the GenomicFeature fields which, if left as `unknown`, are set to
+# `unknown_<id>`. See GenomicFeature.save()
+UNKNOWN_SUFFIX_FIELDS = ["locus_tag", "symbol", "alias"]
+
+# the number of rows in each error message
+_MAX_ERROR_ROWS = 10
+
+
+def _rows(mask: pd.Series) -> str:
+    rows = mask[mask].index.tolist()
+    text = ", ".join(map(str, rows[:_MAX_ERROR_ROWS]))
+    return text + ", ..." if len(rows) > _MAX_ERROR_ROWS else text
+
+
+def read_table(path_or_buffer, name: str | None = None) -> pd.DataFrame:
+    """
+    Read a CSV, optionally gzipped, of ChrMap or GenomicFeature records. Only
+    empty fields are missing values, so that eg a symbol `NA` is read as a string.
+
+    :param path_or_buffer: a path, or a file object, eg an uploaded file
+    :param name: the name of the file, used to detect gzip compression of a
+        file object. Defaults to None, which infers the compression from a path
+    :type name: str, optional
+
+    :return: the table
+    :rtype: pd.DataFrame
+    """
+    compression = "infer" if name is None else ("gzip" if name.endswith(".gz") else None)
+    return pd.read_csv(path_or_buffer, compression=compression, keep_default_na=False, na_values=[""])
+
+
+def validate_table(model: type[models.Model], df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Validate a table of records of `model` against the model fields, one
+    column at a time. Each column is checked for missing values, integer
+    values, max length, choices, uniqueness within the table and in the
+    database, and that foreign keys exist. GenomicFeature coordinates are
+    checked against the length of their chromosome. Every error in the
+    table is reported, not only the first.
+
+    :param model: one of `BULK_LOAD_MODELS`
+    :type model: type[models.Model]
+    :param df: a column for each field of the model, named by the field, eg
+        `chr` rather than `chr_id`. Columns of fields with a default are
+        optional. An `id` column is optional, and must be complete if present
+    :type df: pd.DataFrame
+
+    :return: a column for each field of the model, named by the field
+        attname, eg `chr_id`, and an `id` column if there is one in `df`.
+        Missing columns are set to the field default
+    :rtype: pd.DataFrame
+
+    :raises ValueError: with a line for each error in the table
+    """
+    fields = [
+        field for field in model._meta.concrete_fields if field.name not in _BASE_FIELDS and not field.primary_key
+    ]
+    unknown_suffix_fields = UNKNOWN_SUFFIX_FIELDS if model is GenomicFeature else []
+    df = df.reset_index(drop=True)
+    errors = []
+    validated = pd.DataFrame(index=df.index)
+
+    unexpected = sorted(set(df.columns) - {field.name for field in fields} - {"id"})
+    if unexpected:
+        errors.append(f"Unexpected columns: {unexpected}")
+
+    if "id" in df.columns:
+        ids = pd.to_numeric(df["id"], errors="coerce")
+        invalid = ids.isna() | (ids % 1 != 0) | (ids < 1)
+        if invalid.any():
+            errors.append(f"`id` must be a positive integer in rows {_rows(invalid)}")
+        if ids.duplicated().any():
+            errors.append(f"`id` is duplicated in rows {_rows(ids.duplicated(keep=False))}")
+        existing = model.objects.filter(pk__in=ids.dropna().astype(int).tolist()).values_list("pk", flat=True)
+        if existing:
+            errors.append(f"`id` already exists in rows {_rows(ids.isin(list(existing)))}")
+        validated["id"] = ids.astype("Int64")
+
+    for field in fields:
+        if field.name not in df.columns:
+            if field.has_default():
+                validated[field.attname] = field.get_default()
+            else:
+                errors.append(f"Column `{field.name}` is required")
+            continue
+        column = df[field.name]
+        missing = column.isna()
+        if missing.any():
+            errors.append(f"`{field.name}` is missing in rows {_rows(missing)}")
+
+        if isinstance(field, (models.IntegerField, models.ForeignKey)):
+            values = pd.to_numeric(column, errors="coerce")
+            invalid = ~missing & (values.isna() | (values % 1 != 0))
+            if isinstance(field, models.PositiveIntegerField):
+                invalid |= values < 0
+            if invalid.any():
+                errors.append(f"`{field.name}` must be a non negative integer in rows {_rows(invalid)}")
+            values = values.where(~invalid).astype("Int64")
+        else:
+            values = column.where(missing, column.astype(str))
+            if field.max_length is not None:
+                too_long = values.str.len() > field.max_length
+                if too_long.any():
+                    errors.append(
+                        f"`{field.name}` is longer than {field.max_length} characters in rows {_rows(too_long)}"
+                    )
+            if field.choices:
+                invalid = ~missing & ~values.isin([choice for choice, _ in field.choices])
+                if invalid.any():
+                    errors.append(f"`{field.name}` is not one of {field.choices} in rows {_rows(invalid)}")
+
+        if field.unique:
+            # `unknown` values are replaced by unique values when they are loaded
+            checked = ~missing
+            if field.name in unknown_suffix_fields:
+                checked &= values != "unknown"
+            duplicated = checked & values.duplicated(keep=False)
+            if duplicated.any():
+                errors.append(f"`{field.name}` is duplicated in rows {_rows(duplicated)}")
+            existing = model.objects.filter(**{f"{field.attname}__in": values[checked].tolist()}).values_list(
+                field.attname, flat=True
+            )
+            if existing:
+                errors.append(f"`{field.name}` already exists in rows {_rows(checked & values.isin(list(existing)))}")
+
+        if isinstance(field, models.ForeignKey):
+            related_ids = values.dropna().unique().tolist()
+            found = set(field.related_model.objects.filter(pk__in=related_ids).values_list("pk", flat=True))
+            not_found = values.notna() & ~values.isin(list(found))
+            if not_found.any():
+                errors.append(f"`{field.name}` is not a {field.related_model.__name__} id in rows {_rows(not_found)}")
+
+        validated[field.attname] = values
+
+    if model is GenomicFeature and not errors:
+        seqlengths = pd.Series(dict(ChrMap.objects.values_list("pk", "seqlength")))
+        seqlength = validated["chr_id"].map(seqlengths)
+        # see the `start_cannot_be_less_than_one` constraint, and GenomicFeatureSerializer
+        for mask, message in [
+            (validated["start"] < 1, "`start` cannot be less than 1"),
+            (validated["start"] > validated["end"], "`start` cannot be greater than `end`"),
+            (validated["end"] > seqlength, "`end` cannot exceed the length of the chromosome"),
+        ]:
+            if mask.any():
+                errors.append(f"{message} in rows {_rows(mask.fillna(False).astype(bool))}")
+
+    if errors:
+        raise ValueError("\n".join(errors))
+    return validated
+
+
+def reserve_ids(model: type[models.Model], count: int) -> np.ndarray:
+    """
+    Reserve `count` primary keys of `model` from its sequence, in a single
+    query. The ids are unique, but not necessarily consecutive.
+
+    :param model: a model with an auto incremented primary key
+    :type model: type[models.Model]
+    :param count: the number of ids to reserve
+    :type count: int
+
+    :return: the reserved ids
+    :rtype: np.ndarray
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [model._meta.db_table, model._meta.pk.column, count],
+            )
+            return np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    # without a sequence, the ids follow the largest id in the table
+    start = (model.objects.aggregate(models.Max("pk"))["pk__max"] or 0) + 1
+    return np.arange(start, start + count, dtype=np.int64)
+
+
+def _copy_records(connection, model: type[models.Model], df: pd.DataFrame, batch_size: int) -> None:
+    quote_name = connection.ops.quote_name
+    columns = {field.attname: field.column for field in model._meta.concrete_fields}
+    char_columns = [
+        quote_name(field.column) for field in model._meta.concrete_fields if isinstance(field, models.CharField)
+    ]
+    # FORCE_NOT_NULL, so that an empty string is not loaded as NULL
+    sql = (
+        f"COPY {quote_name(model._meta.db_table)} ({', '.join(quote_name(columns[name]) for name in df.columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(char_columns)}))"
+    )
+    with connection.cursor() as cursor:
+        # the psycopg cursor
+        with cursor.cursor.copy(sql) as copy:
+            for start in range(0, len(df), batch_size):
+                copy.write(df.iloc[start : start + batch_size].to_csv(index=False, header=False))
+
+
+def bulk_load_table(
+    model: type[models.Model], df: pd.DataFrame, user, use_copy: bool = True, batch_size: int = 5000
+) -> int:
+    """
+    Validate, see :func:`validate_table`, and insert a table of ChrMap or
+    GenomicFeature records in a single transaction. Rows without an `id` are
+    assigned ids reserved from the table sequence in one query, see
+    :func:`reserve_ids`, and GenomicFeature `locus_tag`, `symbol` and `alias`
+    values which are `unknown` are set to `unknown_<id>`. The records are
+    inserted with `COPY ... FROM STDIN` on PostgreSQL, if `use_copy` is set,
+    and otherwise with `bulk_create`.
+
+    Note that, as with `bulk_create`, the `post_save` signal is not sent. The
+    cache of the model, ie the ChrMapCache or the GenomicFeatureCache, and its
+    ResponseCache version are invalidated by this function when the
+    transaction commits.
+
+    :param model: one of `BULK_LOAD_MODELS`
+    :type model: type[models.Model]
+    :param df: the records, see :func:`validate_table`
+    :type df: pd.DataFrame
+    :param user: the uploader, and modifier, of the records
+    :type user: User
+    :param use_copy: whether to insert with `COPY` on PostgreSQL. Defaults to True
+    :type use_copy: bool
+    :param batch_size: the number of rows inserted at a time. Defaults to 5000
+    :type batch_size: int
+
+    :return: the number of records inserted
+    :rtype: int
+
+    :raises ValueError: if the table is not valid
+    """
+    df = validate_table(model, df)
+    connection = connections[router.db_for_write(model)]
+    with transaction.atomic(using=connection.alias):
+        explicit_ids = "id" in df.columns
+        if not explicit_ids:
+            df.insert(0, "id", reserve_ids(model, len(df)))
+        if model is GenomicFeature:
+            for field in UNKNOWN_SUFFIX_FIELDS:
+                unknown = df[field] == "unknown"
+                df.loc[unknown, field] = "unknown_" + df.loc[unknown, "id"].astype(str)
+        now = timezone.now()
+        df["uploader_id"] = user.pk
+        df["upload_date"] = now.date()
+        df["modifier_id"] = user.pk
+        df["modified_date"] = now
+
+        if use_copy and connection.vendor == "postgresql":
+            _copy_records(connection, model, df, batch_size)
+        else:
+            model.objects.bulk_create(
+                [model(**record) for record in df.astype(object).to_dict("records")], batch_size=batch_size
+            )
+
+        if explicit_ids:
+            # move the sequence past the ids which were loaded
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                    cursor.execute(sql)
+
+        # the caches are invalidated when the outermost transaction commits,
+        # eg the request transaction, so that other processes do not reload
+        # the tables before the records are visible to them
+        if model is ChrMap:
+            chrmap_cache.invalidate_on_commit(using=connection.alias)
+        elif model is GenomicFeature:
+            genomicfeature_cache.invalidate_on_commit(using=connection.alias)
+        transaction.on_commit(lambda: response_cache.invalidate(model._meta.label), using=connection.alias)
+
+    logger.info(f"Loaded {len(df)} {model.__name__} records")
+    return len(df)
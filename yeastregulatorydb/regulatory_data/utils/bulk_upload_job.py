@@ -0,0 +1,164 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+BULK_UPLOAD_JOB_CACHE_KEY = "bulk_upload_job:{job_id}"
+
+
+class BulkUploadJob:
+    """
+    The progress of a bulk upload which runs as a celery job, see
+    :func:`~yeastregulatorydb.regulatory_data.tasks.bulk_upload_task.bulk_upload_task`.
+    The progress is kept in the django cache, for `BULK_UPLOAD_JOB_TIMEOUT`
+    seconds, so that the request process can report the progress of a job
+    which runs on a worker.
+
+    The job `status` is one of `pending`, `validating`, `saving`,
+    `succeeded` or `failed`, and each row of the samplesheet is one of
+    `pending`, `valid`, `invalid` or `saved`. As with the synchronous bulk
+    upload, either every row is saved or none are.
+
+    The rows are kept by their index, and the progress of the rows is saved
+    at most every `BULK_UPLOAD_JOB_SAVE_INTERVAL` seconds, so that a job with
+    many rows does not write its whole state to the cache for every row. The
+    job is saved whenever its status changes.
+
+    Example usage:
+
+    .. code-block:: python
+
+        job = BulkUploadJob.create(user_id=request.user.pk, model="Binding")
+        ...
+        job = BulkUploadJob.get(job_id)
+        job.as_dict()
+    """
+
+    def __init__(self, job_id: str, state: dict) -> None:
+        self.job_id = job_id
+        self.state = state
+        self._saved_at = 0.0
+
+    @classmethod
+    def create(cls, user_id: int, model: str) -> "BulkUploadJob":
+        """
+        :param user_id: the id of the user who submitted the upload
+        :type user_id: int
+        :param model: the name of the model of the records, eg `Binding`
+        :type model: str
+
+        :return: a new, pending, job
+        :rtype: BulkUploadJob
+        """
+        job = cls(
+            uuid.uuid4().hex,
+            {
+                "status": "pending",
+                "model": model,
+                "user_id": user_id,
+                "rows": {},
+                "errors": [],
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+            },
+        )
+        job.save()
+        return job
+
+    @classmethod
+    def get(cls, job_id: str) -> "BulkUploadJob | None":
+        """
+        :param job_id: the job id
+        :type job_id: str
+
+        :return: the job, or None if there is no job `job_id`, or it has expired
+        :rtype: BulkUploadJob | None
+        """
+        state = cache.get(BULK_UPLOAD_JOB_CACHE_KEY.format(job_id=job_id))
+        return None if state is None else cls(job_id, state)
+
+    def save(self) -> None:
+        cache.set(
+            BULK_UPLOAD_JOB_CACHE_KEY.format(job_id=self.job_id), self.state, timeout=settings.BULK_UPLOAD_JOB_TIMEOUT
+        )
+        self._saved_at = time.monotonic()
+
+    def _row_updated(self) -> None:
+        if time.monotonic() - self._saved_at >= settings.BULK_UPLOAD_JOB_SAVE_INTERVAL:
+            self.save()
+
+    def start(self, rows: list[tuple[int, str]]) -> None:
+        """
+        :param rows: the (index, file name) of each row of the samplesheet
+        :type rows: list[tuple[int, str]]
+        """
+        self.state["status"] = "validating"
+        self.state["started"] = time.time()
+        self.state["rows"] = {
+            index: {"row": index, "file": file, "status": "pending", "error": None} for index, file in rows
+        }
+        self.save()
+
+    def row_valid(self, index: int) -> None:
+        self.state["rows"][index]["status"] = "valid"
+        self._row_updated()
+
+    def row_invalid(self, index: int, error: str) -> None:
+        row = self.state["rows"][index]
+        row["status"] = "invalid"
+        row["error"] = error
+        self._row_updated()
+
+    def saving(self) -> None:
+        self.state["status"] = "saving"
+        self.save()
+
+    def row_saved(self, index: int) -> None:
+        self.state["rows"][index]["status"] = "saved"
+        self._row_updated()
+
+    def finish(self, errors: list[str] | None = None) -> None:
+        """
+        :param errors: the errors of the upload, if it failed. Defaults to
+            None, which means that the upload succeeded
+        :type errors: list[str], optional
+        """
+        self.state["status"] = "failed" if errors else "succeeded"
+        self.state["errors"] = errors or []
+        if errors:
+            # the transaction is rolled back, so no row is saved
+            for row in self.state["rows"].values():
+                if row["status"] == "saved":
+                    row["status"] = "valid"
+        self.state["finished"] = time.time()
+        self.save()
+
+    def as_dict(self) -> dict:
+        """
+        :return: the job state, with the rows as a list in the order of the
+            samplesheet, a count of the rows in each status, and the
+            throughput of the job in rows per second. A row is processed once
+            it has been validated, and again once it has been saved
+        :rtype: dict
+        """
+        rows = [self.state["rows"][index] for index in sorted(self.state["rows"])]
+        counts = {status: 0 for status in ["pending", "valid", "invalid", "saved"]}
+        for row in rows:
+            counts[row["status"]] += 1
+        elapsed = None
+        rows_per_second = None
+        if self.state["started"] is not None:
+            elapsed = (self.state["finished"] or time.time()) - self.state["started"]
+            processed = len(rows) - counts["pending"] + counts["saved"]
+            rows_per_second = processed / elapsed if elapsed > 0 else None
+        return {
+            "job_id": self.job_id,
+            **{key: value for key, value in self.state.items() if key != "user_id"},
+            "rows": rows,
+            "total_rows": len(rows),
+            "row_counts": counts,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": rows_per_second,
+        }
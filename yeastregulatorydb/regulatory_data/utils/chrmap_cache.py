@@ -0,0 +1,167 @@
+import hashlib
+
+import pandas as pd
+
+from ..models.ChrMap import ChrMap
+from .versioned_cache import VersionedCache
+
+CHRMAP_VERSION_CACHE_KEY = "chrmap_version"
+
+
+class ChrMapCache(VersionedCache):
+    """
+    A process-wide cache of the ChrMap table. The table is small and is read
+    on every file validation and every promoter significance task, so it is
+    held in memory as a DataFrame along with lookup dictionaries.
+
+    The cache is invalidated, when the transaction commits, by the
+    `post_save` and `post_delete` receivers in the ChrMap model module, see
+    :class:`~yeastregulatorydb.regulatory_data.utils.versioned_cache.VersionedCache`.
+    Note that `bulk_create`, `update` and raw SQL do not send these signals --
+    call :meth:`invalidate_on_commit` after using them.
+
+    Example usage:
+
+    .. code-block:: python
+
+        from yeastregulatorydb.regulatory_data.utils.chrmap_cache import chrmap_cache
+
+        seqlengths = chrmap_cache.seqlength("ucsc")
+        ucsc_to_refseq = chrmap_cache.translate("ucsc", "refseq")
+    """
+
+    FORMATS = ["refseq", "igenomes", "ensembl", "ucsc", "mitra", "numbered", "chr"]
+
+    version_cache_key = CHRMAP_VERSION_CACHE_KEY
+
+    def __init__(self) -> None:
+        super().__init__()
+        # the version, and the checksum, of the table
+        self._checksum: tuple[str, str] | None = None
+        self._pinned = False
+
+    def load(self) -> pd.DataFrame:
+        columns = [field.attname for field in ChrMap._meta.concrete_fields]
+        return pd.DataFrame.from_records(list(ChrMap.objects.order_by("id").values()), columns=columns)
+
+    def get(self) -> tuple[str, pd.DataFrame]:
+        with self._lock:
+            if self._pinned:
+                return self._version, self._value  # type: ignore[return-value]
+        return super().get()
+
+    def _table(self) -> tuple[str, pd.DataFrame]:
+        return self.get()
+
+    def _check_format(self, chr_format: str) -> None:
+        if chr_format not in self.FORMATS:
+            raise ValueError(f"{chr_format} is not a chromosome format in ChrMap. Must be one of {self.FORMATS}")
+
+    @property
+    def checksum(self) -> str:
+        """
+        Unlike :attr:`version`, which changes whenever the cache is
+        invalidated, the checksum only changes if the chromosome names,
+        lengths or types in ChrMap change.
+
+        :return: a checksum of the content of the ChrMap table
+        :rtype: str
+        """
+        version, df = self._table()
+        with self._lock:
+            if self._checksum is None or self._checksum[0] != version:
+                content = df[self.FORMATS + ["seqlength", "type"]].to_csv(index=False)
+                self._checksum = (version, hashlib.sha256(content.encode()).hexdigest())
+            return self._checksum[1]
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        :return: a copy of the ChrMap table
+        :rtype: pd.DataFrame
+        """
+        return self._table()[1].copy()
+
+    def seqlength(self, chr_format: str) -> dict[str, int]:
+        """
+        :param chr_format: a chromosome format, eg `ucsc`
+        :type chr_format: str
+
+        :return: a dictionary of chromosome name in `chr_format` to sequence length
+        :rtype: dict
+
+        :raises ValueError: if `chr_format` is not a chromosome format in ChrMap
+        """
+        self._check_format(chr_format)
+        df = self._table()[1]
+        return dict(zip(df[chr_format], df["seqlength"].astype(int)))
+
+    def chr_type(self, chr_format: str) -> dict[str, str]:
+        """
+        :param chr_format: a chromosome format, eg `ucsc`
+        :type chr_format: str
+
+        :return: a dictionary of chromosome name in `chr_format` to type, one
+            of `genomic`, `mito` or `plasmid`
+        :rtype: dict
+
+        :raises ValueError: if `chr_format` is not a chromosome format in ChrMap
+        """
+        self._check_format(chr_format)
+        df = self._table()[1]
+        return dict(zip(df[chr_format], df["type"]))
+
+    def chr_codes(self, chr_format: str) -> dict[str, int]:
+        """
+        :param chr_format: a chromosome format, eg `ucsc`
+        :type chr_format: str
+
+        :return: a dictionary of chromosome name in `chr_format` to a stable
+            integer code, which is the order of the chromosome in ChrMap
+        :rtype: dict
+
+        :raises ValueError: if `chr_format` is not a chromosome format in ChrMap
+        """
+        self._check_format(chr_format)
+        df = self._table()[1]
+        return {chr_name: code for code, chr_name in enumerate(df[chr_format])}
+
+    def translate(self, from_format: str, to_format: str) -> dict[str, str]:
+        """
+        :param from_format: the chromosome format to translate from, eg `ucsc`
+        :type from_format: str
+        :param to_format: the chromosome format to translate to, eg `refseq`
+        :type to_format: str
+
+        :return: a dictionary of chromosome name in `from_format` to the name in `to_format`
+        :rtype: dict
+
+        :raises ValueError: if either format is not a chromosome format in ChrMap
+        """
+        self._check_format(from_format)
+        self._check_format(to_format)
+        df = self._table()[1]
+        return dict(zip(df[from_format], df[to_format]))
+
+    def pin(self, version: str, df: pd.DataFrame) -> None:
+        """
+        Serve `df` as the ChrMap table, without checking the version in the
+        django cache or reading the database, until :meth:`invalidate` is
+        called. This is for worker processes which are passed the table by
+        their parent, eg the file validation workers of a bulk upload.
+
+        :param version: the version of `df`, see :attr:`version`
+        :type version: str
+        :param df: the ChrMap table, see :attr:`df`
+        :type df: pd.DataFrame
+        """
+        with self._lock:
+            self._version = version
+            self._value = df
+            self._pinned = True
+
+    def reset(self) -> None:
+        self._pinned = False
+
+
+chrmap_cache = ChrMapCache()
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from typing import BinaryIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+CHUNKED_UPLOAD_CACHE_KEY = "chunked_upload:{upload_id}"
+CHUNKED_UPLOAD_DIR = "chunked_upload"
+
+# the size of the blocks in which a chunk is read from the request, and in
+# which the chunks are copied when they are assembled
+_BLOCK_SIZE = 1024 * 1024
+
+
+class ChunkedUpload:
+    """
+    A resumable upload of a single file in numbered chunks. Each chunk is
+    streamed from the request to a local temporary file, checked against its
+    sha256, and saved to the default storage as
+    `chunked_upload/<upload_id>/<number>.<sha256>`, so that any web process
+    can list the chunks which have been received, and the client can resume
+    an interrupted upload by sending only the missing chunks. When the upload
+    is finalized, the chunks are copied, in order, to a local file which is
+    passed to the serializer of the record.
+
+    The upload metadata is kept in the django cache for
+    `CHUNKED_UPLOAD_TIMEOUT` seconds. The chunks of an upload which expires
+    before it is finalized are deleted by :meth:`delete_expired`, see the
+    `clean_chunked_uploads` command.
+
+    Example usage:
+
+    .. code-block:: python
+
+        upload = ChunkedUpload.create(user_id, "Binding", "sample.qbed.gz")
+        upload.write_chunk(1, request.stream, sha256)
+        ...
+        with upload.assemble() as file:
+            serializer = BindingSerializer(data={**data, "file": file})
+        upload.delete()
+    """
+
+    def __init__(self, upload_id: str, state: dict) -> None:
+        self.upload_id = upload_id
+        self.state = state
+
+    @classmethod
+    def create(
+        cls, user_id: int, model: str, filename: str, size: int | None = None, sha256: str | None = None
+    ) -> "ChunkedUpload":
+        """
+        :param user_id: the id of the user who started the upload
+        :type user_id: int
+        :param model: the name of the model of the record, eg `Binding`
+        :type model: str
+        :param filename: the name of the file, eg `sample.qbed.gz`
+        :type filename: str
+        :param size: the size of the file in bytes, which is checked when the
+            upload is finalized. Defaults to None
+        :type size: int, optional
+        :param sha256: the sha256 hex digest of the file, which is checked
+            when the upload is finalized. Defaults to None
+        :type sha256: str, optional
+
+        :return: a new upload
+        :rtype: ChunkedUpload
+        """
+        upload = cls(
+            uuid.uuid4().hex,
+            {
+                "user_id": user_id,
+                "model": model,
+                "filename": os.path.basename(filename),
+                "size": size,
+                "sha256": sha256.lower() if sha256 else None,
+                "created": time.time(),
+            },
+        )
+        cache.set(
+            CHUNKED_UPLOAD_CACHE_KEY.format(upload_id=upload.upload_id), upload.state, settings.CHUNKED_UPLOAD_TIMEOUT
+        )
+        return upload
+
+    @classmethod
+    def get(cls, upload_id: str) -> "ChunkedUpload | None":
+        """
+        :param upload_id: the upload id
+        :type upload_id: str
+
+        :return: the upload, or None if there is no upload `upload_id`, or it has expired
+        :rtype: ChunkedUpload | None
+        """
+        state = cache.get(CHUNKED_UPLOAD_CACHE_KEY.format(upload_id=upload_id))
+        return None if state is None else cls(upload_id, state)
+
+    @classmethod
+    def delete_expired(cls) -> int:
+        """
+        Delete the chunks of the uploads whose metadata has expired, ie which
+        were neither finalized nor abandoned within `CHUNKED_UPLOAD_TIMEOUT`
+        seconds.
+
+        :return: the number of uploads whose chunks were deleted
+        :rtype: int
+        """
+        try:
+            upload_ids, _ = default_storage.listdir(CHUNKED_UPLOAD_DIR)
+        except FileNotFoundError:
+            return 0
+        deleted = 0
+        for upload_id in upload_ids:
+            if cls.get(upload_id) is None:
+                cls(upload_id, {}).delete()
+                deleted += 1
+        return deleted
+
+    @property
+    def storage_dir(self) -> str:
+        return f"{CHUNKED_UPLOAD_DIR}/{self.upload_id}"
+
+    def _chunk_names(self) -> list[tuple[int, str]]:
+        # the number and sha256 of each chunk, from their names only, so that
+        # the storage is not asked for the size of each chunk
+        try:
+            _, filenames = default_storage.listdir(self.storage_dir)
+        except FileNotFoundError:
+            return []
+        names = []
+        for filename in filenames:
+            number, _, sha256 = filename.partition(".")
+            if number.isdigit() and sha256:
+                names.append((int(number), sha256))
+        return sorted(names)
+
+    def chunks(self) -> list[dict]:
+        """
+        :return: the number, size and sha256 of each chunk which has been
+            received, in order of number
+        :rtype: list[dict]
+        """
+        return [
+            {"number": number, "size": default_storage.size(f"{self.storage_dir}/{number}.{sha256}"), "sha256": sha256}
+            for number, sha256 in self._chunk_names()
+        ]
+
+    def write_chunk(self, number: int, stream: BinaryIO, sha256: str, max_bytes: int | None = None) -> dict:
+        """
+        Stream a chunk to the default storage. A chunk which has already been
+        received is replaced.
+
+        :param number: the number of the chunk, starting at 1
+        :type number: int
+        :param stream: the content of the chunk, eg the request stream
+        :type stream: BinaryIO
+        :param sha256: the sha256 hex digest of the chunk
+        :type sha256: str
+        :param max_bytes: the maximum size of the chunk. Defaults to
+            `CHUNKED_UPLOAD_MAX_CHUNK_BYTES`
+        :type max_bytes: int, optional
+
+        :return: the number, size and sha256 of the chunk
+        :rtype: dict
+
+        :raises ValueError: if the number is less than 1, the chunk is larger
+            than `max_bytes`, or the content does not match `sha256`
+        """
+        if number < 1:
+            raise ValueError("The chunk number must be at least 1")
+        max_bytes = max_bytes or settings.CHUNKED_UPLOAD_MAX_CHUNK_BYTES
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.TemporaryFile() as tmp:
+            while block := stream.read(_BLOCK_SIZE):
+                size += len(block)
+                if size > max_bytes:
+                    raise ValueError(f"The chunk is larger than {max_bytes} bytes")
+                digest.update(block)
+                tmp.write(block)
+            if digest.hexdigest() != sha256.lower():
+                raise ValueError(f"The sha256 of chunk {number} is {digest.hexdigest()}, not {sha256}")
+            # a chunk which is sent again, eg after a dropped connection, replaces the previous one
+            for previous_number, previous_sha256 in self._chunk_names():
+                if previous_number == number:
+                    default_storage.delete(f"{self.storage_dir}/{number}.{previous_sha256}")
+            tmp.seek(0)
+            default_storage.save(f"{self.storage_dir}/{number}.{digest.hexdigest()}", File(tmp))
+        return {"number": number, "size": size, "sha256": digest.hexdigest()}
+
+    def assemble(self) -> File:
+        """
+        Copy the chunks, in order, to a local temporary file, which is
+        deleted when it is closed.
+
+        :return: the file, named by the filename of the upload
+        :rtype: File
+
+        :raises ValueError: if there are no chunks, a chunk is missing, or the
+            file does not match the size or sha256 of the upload
+        """
+        chunk_names = self._chunk_names()
+        numbers = [number for number, _ in chunk_names]
+        if not numbers:
+            raise ValueError("No chunks have been uploaded")
+        missing = sorted(set(range(1, numbers[-1] + 1)) - set(numbers))
+        if missing:
+            raise ValueError(f"Missing chunks: {missing}")
+
+        digest = hashlib.sha256()
+        size = 0
+        tmp = tempfile.NamedTemporaryFile(suffix=f"_{self.state['filename']}")
+        try:
+            for number, sha256 in chunk_names:
+                with default_storage.open(f"{self.storage_dir}/{number}.{sha256}", "rb") as f:
+                    while block := f.read(_BLOCK_SIZE):
+                        size += len(block)
+                        digest.update(block)
+                        tmp.write(block)
+            if self.state["size"] is not None and size != self.state["size"]:
+                raise ValueError(f"The chunks are {size} bytes, not {self.state['size']}")
+            if self.state["sha256"] is not None and digest.hexdigest() != self.state["sha256"]:
+                raise ValueError(f"The sha256 of the file is {digest.hexdigest()}, not {self.state['sha256']}")
+        except BaseException:
+            tmp.close()
+            raise
+        tmp.flush()
+        tmp.seek(0)
+        return File(tmp, name=self.state["filename"])
+
+    def delete(self) -> None:
+        """Delete the chunks and the upload metadata"""
+        for number, sha256 in self._chunk_names():
+            default_storage.delete(f"{self.storage_dir}/{number}.{sha256}")
+        cache.delete(CHUNKED_UPLOAD_CACHE_KEY.format(upload_id=self.upload_id))
+
+    def as_dict(self) -> dict:
+        """
+        :return: the upload metadata and the chunks which have been received
+        :rtype: dict
+        """
+        chunks = self.chunks()
+        return {
+            "upload_id": self.upload_id,
+            **{key: value for key, value in self.state.items() if key != "user_id"},
+            "chunks": chunks,
+            "received_bytes": sum(chunk["size"] for chunk in chunks),
+        }
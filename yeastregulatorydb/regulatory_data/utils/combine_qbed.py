@@ -0,0 +1,158 @@
+import csv
+import gzip
+import heapq
+import io
+import itertools
+import logging
+from collections.abc import Iterable, Iterator
+
+import pandas as pd
+import pyarrow.parquet as pq
+from django.db import models
+
+from .extract_file_from_storage import extract_file_from_storage
+from .prefetch_stored_files import prefetch_stored_files
+
+logger = logging.getLogger(__name__)
+
+QBED_COLUMNS = ["chr", "start", "end", "depth", "strand"]
+# qbed files are coordinate sorted if they are sorted by these columns, ie
+# `sort -k1,1 -k2,2n -k3,3n -k5,5`
+QBED_SORT_KEY = ["chr", "start", "end", "strand"]
+QBED_CHUNKSIZE = 100_000
+
+
+def iter_qbed_chunks(record: models.Model, chunksize: int = QBED_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """
+    Read the qbed stored in `record.file` in chunks. If the record has a
+    parquet sidecar, the chunks are read from the sidecar.
+
+    :param record: a model instance with a qbed `file`, eg a Binding record
+    :type record: models.Model
+    :param chunksize: the number of rows in each chunk
+    :type chunksize: int
+
+    :return: an iterator of dataframes with the columns in `QBED_COLUMNS`
+    :rtype: Iterator[pd.DataFrame]
+    """
+    sidecar = getattr(record, "sidecar", None)
+    if sidecar:
+        parquet_file = pq.ParquetFile(extract_file_from_storage(sidecar))
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=QBED_COLUMNS):
+            yield batch.to_pandas()
+        return
+
+    with pd.read_csv(
+        extract_file_from_storage(record.file), sep="\t", usecols=QBED_COLUMNS, chunksize=chunksize
+    ) as reader:
+        for chunk in reader:
+            yield chunk[QBED_COLUMNS]
+
+
+def is_coordinate_sorted(chunks: Iterable[pd.DataFrame]) -> bool:
+    """
+    Check, one chunk at a time, whether a qbed is sorted by `QBED_SORT_KEY`.
+
+    :param chunks: the qbed chunks, eg from :func:`iter_qbed_chunks`
+    :type chunks: Iterable[pd.DataFrame]
+
+    :return: True if the rows are sorted across all chunks
+    :rtype: bool
+    """
+    previous_row = None
+    for chunk in chunks:
+        keys = chunk[QBED_SORT_KEY]
+        if previous_row is not None:
+            keys = pd.concat([previous_row, keys], ignore_index=True)
+        if not pd.MultiIndex.from_frame(keys).is_monotonic_increasing:
+            return False
+        if len(keys):
+            previous_row = keys.iloc[[-1]]
+    return True
+
+
+def _iter_rows(chunks: Iterable[pd.DataFrame]) -> Iterator[tuple]:
+    for chunk in chunks:
+        yield from chunk[QBED_COLUMNS].itertuples(index=False, name=None)
+
+
+def _sort_key(row: tuple) -> tuple:
+    chr_name, start, end, _, strand = row
+    return chr_name, start, end, strand
+
+
+def merge_qbed_rows(chunk_iterables: list[Iterable[pd.DataFrame]], sum_depth: bool = False) -> Iterator[tuple]:
+    """
+    k-way merge of coordinate sorted qbeds. Only the current row of each
+    input is held in memory.
+
+    :param chunk_iterables: for each qbed, an iterable of sorted chunks, eg
+        from :func:`iter_qbed_chunks`
+    :type chunk_iterables: list[Iterable[pd.DataFrame]]
+    :param sum_depth: If True, rows with the same `QBED_SORT_KEY` are combined
+        into a single row, and their depths are summed. Defaults to False
+    :type sum_depth: bool
+
+    :return: an iterator of sorted (chr, start, end, depth, strand) tuples
+    :rtype: Iterator[tuple]
+    """
+    merged = heapq.merge(*[_iter_rows(chunks) for chunks in chunk_iterables], key=_sort_key)
+    if not sum_depth:
+        yield from merged
+        return
+    for (chr_name, start, end, strand), rows in itertools.groupby(merged, key=_sort_key):
+        yield chr_name, start, end, sum(row[3] for row in rows), strand
+
+
+def combine_qbed_records(
+    records: Iterable[models.Model],
+    output: io.IOBase,
+    sum_depth: bool = False,
+    chunksize: int = QBED_CHUNKSIZE,
+) -> int:
+    """
+    Combine the qbeds of `records`, eg the passing replicates of a calling
+    cards experiment, into a single gzipped, tab delimited qbed written to
+    `output`. The qbeds are read in chunks, so memory use does not depend on
+    the size or number of the qbeds. If every qbed is coordinate sorted (see
+    :func:`is_coordinate_sorted`), they are k-way merged and the output is
+    sorted. Otherwise, the chunks are concatenated.
+
+    :param records: model instances with qbed files
+    :type records: Iterable[models.Model]
+    :param output: a binary file object to write the gzipped qbed to, eg a
+        `tempfile.SpooledTemporaryFile`
+    :type output: io.IOBase
+    :param sum_depth: If True, and the qbeds are sorted, duplicate insertions
+        are combined and their depths summed. See :func:`merge_qbed_rows`
+    :type sum_depth: bool
+    :param chunksize: the number of rows read, and written, at a time
+    :type chunksize: int
+
+    :return: the number of rows written
+    :rtype: int
+    """
+    # every qbed is read twice, so they are all downloaded, concurrently, first
+    records = list(prefetch_stored_files(records))
+    is_sorted = all(is_coordinate_sorted(iter_qbed_chunks(record, chunksize)) for record in records)
+    if sum_depth and not is_sorted:
+        logger.warning("Not all qbeds are coordinate sorted. The replicates are concatenated without summing depth")
+
+    row_count = 0
+    with gzip.GzipFile(fileobj=output, mode="wb") as gzipped_file, io.TextIOWrapper(
+        gzipped_file, encoding="utf-8", newline=""
+    ) as text_file:
+        writer = csv.writer(text_file, delimiter="\t", lineterminator="\n")
+        writer.writerow(QBED_COLUMNS)
+        if is_sorted:
+            rows = merge_qbed_rows([iter_qbed_chunks(record, chunksize) for record in records], sum_depth)
+            while batch := list(itertools.islice(rows, chunksize)):
+                writer.writerows(batch)
+                row_count += len(batch)
+        else:
+            for record in records:
+                for chunk in iter_qbed_chunks(record, chunksize):
+                    chunk.to_csv(text_file, sep="\t", header=False, index=False, lineterminator="\n")
+                    row_count += len(chunk)
+
+    return row_count
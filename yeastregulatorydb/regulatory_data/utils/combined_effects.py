@@ -0,0 +1,198 @@
+import itertools
+import logging
+from collections.abc import Iterator
+
+import pandas as pd
+from django.db import models, transaction
+
+from ..models import Expression, ExpressionEffect, PromoterSetSig, PromoterSetSigEffect
+from .genomicfeature_cache import genomicfeature_cache
+from .parquet_sidecar import read_stored_table
+from .prefetch_stored_files import prefetch_stored_files
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# the model in which the combined effects of each model are materialized
+COMBINED_EFFECT_MODELS: dict[type[models.Model], type[models.Model]] = {
+    Expression: ExpressionEffect,
+    PromoterSetSig: PromoterSetSigEffect,
+}
+
+COMBINED_EFFECT_COLUMNS = ["regulator_id", "target_id", "record_id", "effect", "pvalue"]
+
+COMBINED_COLUMNS = [
+    "regulator_id",
+    "regulator_locus_tag",
+    "regulator_symbol",
+    "target_id",
+    "target_locus_tag",
+    "target_symbol",
+    "record_id",
+    "effect",
+    "pvalue",
+]
+
+
+def read_combined_effects(record: models.Model) -> pd.DataFrame:
+    """
+    Read the effect, pvalue and target of each row of the file of a record.
+
+    :param record: a record with `get_fileformat()` and `get_genomicfeature()`
+        methods, eg an Expression or PromoterSetSig record
+    :type record: models.Model
+
+    :return: a dataframe with the columns in `COMBINED_EFFECT_COLUMNS`. The
+        target ids are GenomicFeature ids, and are NA if the fileformat has no
+        feature identifier column
+    :rtype: pd.DataFrame
+
+    :raises AttributeError: if the record does not have the methods above
+    """
+    try:
+        fileformat = record.get_fileformat()
+    except AttributeError as exc:
+        raise AttributeError(
+            "Could not find 'get_fileformat()' method on the record. "
+            "This method should return a FileFormat instance. "
+            "Please report this as an issue to: https://github.com/cmatKhan/yeastregulatorydb/issues"
+        ) from exc
+    try:
+        regulator = record.get_genomicfeature()
+    except AttributeError as exc:
+        raise AttributeError(
+            "Could not find 'get_genomicfeature()' method on the record. "
+            "This method should return a GenomicFeature instance. "
+            "Please report this as an issue to: https://github.com/cmatKhan/yeastregulatorydb/issues"
+        ) from exc
+
+    effect_column = fileformat.effect_col
+    pval_column = fileformat.pval_col
+    identifier_column = fileformat.feature_identifier_col
+
+    # only the effect, pvalue and identifier columns are used
+    df = read_stored_table(record, columns=[effect_column, pval_column, identifier_column], compression="gzip")
+    df = df.rename(columns={effect_column: "effect", pval_column: "pvalue", identifier_column: "target_id"})
+    # if there is not a column named "effect", add one with NA values. Do the
+    # same for "pvalue" and "target_id"
+    if "effect" not in df.columns:
+        df["effect"] = float("NaN")
+    if "pvalue" not in df.columns:
+        df["pvalue"] = float("NaN")
+    if "target_id" not in df.columns:
+        df["target_id"] = pd.NA
+    # the identifier column is typed `str` in the parquet sidecars, but it
+    # stores GenomicFeature ids, which are integers
+    df["target_id"] = pd.to_numeric(df["target_id"], errors="coerce").astype("Int64")
+    df["effect"] = pd.to_numeric(df["effect"], errors="coerce")
+    df["pvalue"] = pd.to_numeric(df["pvalue"], errors="coerce")
+    df["regulator_id"] = regulator.genomicfeature_id
+    df["record_id"] = record.id
+
+    return df[COMBINED_EFFECT_COLUMNS]
+
+
+def annotate_combined_effects(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the locus tag and symbol of the regulator and target of each row, see
+    :class:`~yeastregulatorydb.regulatory_data.utils.genomicfeature_cache.GenomicFeatureCache`
+
+    :param df: a dataframe with the columns in `COMBINED_EFFECT_COLUMNS`
+    :type df: pd.DataFrame
+
+    :return: a dataframe with the columns in `COMBINED_COLUMNS`
+    :rtype: pd.DataFrame
+    """
+    df = df.copy()
+    df["regulator_locus_tag"], df["regulator_symbol"] = genomicfeature_cache.annotate(df["regulator_id"])
+    df["target_locus_tag"], df["target_symbol"] = genomicfeature_cache.annotate(df["target_id"])
+    return df[COMBINED_COLUMNS]
+
+
+def materialize_combined_effects(record: models.Model) -> int:
+    """
+    Replace the materialized combined effects of a record with the effects in
+    its file, and mark them as up to date with the `modified_date` of the
+    record. If the record is modified while its file is read, it is not marked,
+    and the effects are read from the file until they are materialized again.
+
+    :param record: an Expression or PromoterSetSig record
+    :type record: models.Model
+
+    :return: the number of effects written
+    :rtype: int
+
+    :raises KeyError: if the effects of the model of `record` are not materialized
+    """
+    model = type(record)
+    effect_model = COMBINED_EFFECT_MODELS[model]
+    modified_date = record.modified_date
+    df = read_combined_effects(record)
+    effects = [
+        effect_model(
+            record_id=record.id,
+            regulator_id=row.regulator_id,
+            target_id=None if pd.isna(row.target_id) else row.target_id,
+            effect=None if pd.isna(row.effect) else row.effect,
+            pvalue=None if pd.isna(row.pvalue) else row.pvalue,
+        )
+        for row in df.itertuples(index=False)
+    ]
+    with transaction.atomic():
+        effect_model.objects.filter(record_id=record.id).delete()
+        effect_model.objects.bulk_create(effects, batch_size=10_000)
+        model.objects.filter(pk=record.pk, modified_date=modified_date).update(effects_modified_date=modified_date)
+    # update() does not send post_save
+    response_cache.invalidate_on_commit(model._meta.label)
+    return len(effects)
+
+
+def _materialized_effects(effect_model: type[models.Model], record_ids: list[int]) -> dict[int, pd.DataFrame]:
+    # one query for a batch of records. The rows are in the order they were
+    # written, ie the order of the file
+    df = pd.DataFrame.from_records(
+        effect_model.objects.filter(record_id__in=record_ids)
+        .order_by("record_id", "id")
+        .values_list(*COMBINED_EFFECT_COLUMNS),
+        columns=COMBINED_EFFECT_COLUMNS,
+    )
+    df["target_id"] = df["target_id"].astype("Int64")
+    df[["effect", "pvalue"]] = df[["effect", "pvalue"]].astype(float)
+    return {
+        record_id: record_df.reset_index(drop=True) for record_id, record_df in df.groupby("record_id", sort=False)
+    }
+
+
+def iter_combined_effects(queryset: models.QuerySet, batch_size: int = 100) -> Iterator[pd.DataFrame]:
+    """
+    Yield the combined effects of each record in `queryset`, in order. The
+    effects of records which are materialized and up to date are read from
+    the materialized table, a batch of records at a time. The effects of the
+    other records are read from their files, see :func:`read_combined_effects`.
+
+    :param queryset: a queryset of records, eg the filtered queryset of a viewset
+    :type queryset: models.QuerySet
+    :param batch_size: the number of records whose materialized effects are
+        read in one query
+    :type batch_size: int
+
+    :return: an iterator of dataframes with the columns in `COMBINED_EFFECT_COLUMNS`
+    :rtype: Iterator[pd.DataFrame]
+    """
+    effect_model = COMBINED_EFFECT_MODELS.get(queryset.model)
+    records = queryset.iterator()
+    while batch := list(itertools.islice(records, batch_size)):
+        if effect_model is None:
+            up_to_date = set()
+        else:
+            up_to_date = {record.id for record in batch if record.effects_modified_date == record.modified_date}
+        materialized = _materialized_effects(effect_model, list(up_to_date)) if up_to_date else {}
+        # the stored files of the records which are not materialized are
+        # downloaded while the current record is read
+        from_files = prefetch_stored_files(record for record in batch if record.id not in up_to_date)
+        for record in batch:
+            if record.id in up_to_date:
+                # a record with an empty file has no materialized rows
+                yield materialized.get(record.id, pd.DataFrame(columns=COMBINED_EFFECT_COLUMNS))
+            else:
+                yield read_combined_effects(next(from_files))
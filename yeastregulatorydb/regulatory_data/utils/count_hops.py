@@ -1,6 +1,6 @@
 import pandas as pd
 
-from ..models import ChrMap
+from .chrmap_cache import chrmap_cache
 
 
 def count_hops(df: pd.DataFrame, chr_format: str, consider_strand: bool = False) -> dict[str, int]:
@@ -36,8 +36,7 @@ def count_hops(df: pd.DataFrame, chr_format: str, consider_strand: bool = False)
     if not consider_strand:
         df_internal = df.groupby(["chr", "start", "end"]).aggregate({"depth": "sum"}).reset_index()
 
-    chr_map = ChrMap.objects.values(chr_format, "type")
-    chr_map_df = pd.DataFrame.from_records(chr_map)
+    chr_map_df = chrmap_cache.df[[chr_format, "type"]]
 
     df_internal = (
         df_internal.merge(chr_map_df, how="left", left_on="chr", right_on=chr_format)
@@ -0,0 +1,388 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+from ..models import Expression, GenomicFeature, PromoterSetSig
+from .combined_effects import iter_combined_effects
+
+logger = logging.getLogger(__name__)
+
+EFFECT_MATRIX_VALUES = ["effect", "pvalue"]
+
+EFFECT_MATRIX_BUILD_CACHE_KEY = "effect_matrix_build:{model}:{group}"
+
+# the fields which identify a matrix of each model, and the lookup of each
+# field on the model. There is one matrix for each combination of values
+EFFECT_MATRIX_GROUP_LOOKUPS: dict[type[models.Model], dict[str, str]] = {
+    Expression: {"source": "source_id"},
+    PromoterSetSig: {"source": "binding__source_id", "promoter": "promoter_id"},
+}
+
+# the lookup of the regulator GenomicFeature id of a record of each model
+EFFECT_MATRIX_REGULATOR_LOOKUPS: dict[type[models.Model], str] = {
+    Expression: "regulator__genomicfeature_id",
+    PromoterSetSig: "binding__regulator__genomicfeature_id",
+}
+
+# the number of rows copied from the previous version of a matrix at a time
+_COPY_CHUNKSIZE = 256
+
+
+class EffectMatrix:
+    """
+    A read-only, memory-mapped regulator x target matrix of the effects and
+    pvalues of the records in a group, eg the Expression records of a
+    DataSource. There is one row for each record, ordered by record id, and
+    one column for each GenomicFeature, ordered by GenomicFeature id. Targets
+    which are not in the file of a record are NaN.
+
+    Only the pages of the matrix which are sliced are read from disk, so a
+    block of rows and columns is selected without loading the matrix.
+
+    Example usage:
+
+    .. code-block:: python
+
+        matrix = get_effect_matrix(Expression, source=1)
+        block = matrix.select("pvalue", matrix.row_index(regulator_ids=[10, 11]), matrix.column_index())
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: the directory of a version of a matrix, see :func:`build_effect_matrix`
+        :type path: str
+        """
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        self.signature = manifest["signature"]
+        self.modified_dates = manifest["modified_dates"]
+        self.record_ids = np.load(os.path.join(path, "record_ids.npy"))
+        self.regulator_ids = np.load(os.path.join(path, "regulator_ids.npy"))
+        self.target_ids = np.load(os.path.join(path, "target_ids.npy"))
+        self.values = {
+            value: np.load(os.path.join(path, f"{value}.npy"), mmap_mode="r") for value in EFFECT_MATRIX_VALUES
+        }
+
+    @staticmethod
+    def _positions(index: np.ndarray, ids: list[int], label: str) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(index, ids).clip(max=max(len(index) - 1, 0))
+        missing = ids[index[positions] != ids] if len(index) else ids
+        if len(missing):
+            raise ValueError(f"The {label} {missing.tolist()} are not in the matrix")
+        return positions
+
+    def row_index(self, record_ids: list[int] | None = None, regulator_ids: list[int] | None = None) -> np.ndarray:
+        """
+        :param record_ids: the ids of the records to select, in order
+        :type record_ids: list[int], optional
+        :param regulator_ids: the GenomicFeature ids of the regulators to
+            select. Every record of each regulator is selected, in record order
+        :type regulator_ids: list[int], optional
+
+        :return: the positions of the selected rows. All rows if neither
+            `record_ids` nor `regulator_ids` is passed
+        :rtype: np.ndarray
+
+        :raises ValueError: if a record or regulator is not in the matrix
+        """
+        if record_ids is not None:
+            return self._positions(self.record_ids, record_ids, "records")
+        if regulator_ids is not None:
+            missing = np.setdiff1d(regulator_ids, self.regulator_ids)
+            if len(missing):
+                raise ValueError(f"The regulators {missing.tolist()} are not in the matrix")
+            return np.flatnonzero(np.isin(self.regulator_ids, regulator_ids))
+        return np.arange(len(self.record_ids))
+
+    def column_index(self, target_ids: list[int] | None = None) -> np.ndarray:
+        """
+        :param target_ids: the GenomicFeature ids of the targets to select, in order
+        :type target_ids: list[int], optional
+
+        :return: the positions of the selected columns. All columns if
+            `target_ids` is not passed
+        :rtype: np.ndarray
+
+        :raises ValueError: if a target is not in the matrix
+        """
+        if target_ids is not None:
+            return self._positions(self.target_ids, target_ids, "targets")
+        return np.arange(len(self.target_ids))
+
+    def select(self, value: str, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """
+        :param value: one of `EFFECT_MATRIX_VALUES`
+        :type value: str
+        :param rows: row positions, see :meth:`row_index`
+        :type rows: np.ndarray
+        :param columns: column positions, see :meth:`column_index`
+        :type columns: np.ndarray
+
+        :return: a `len(rows)` x `len(columns)` array
+        :rtype: np.ndarray
+        """
+        return self.values[value][np.ix_(rows, columns)]
+
+
+def effect_matrix_dir(model: type[models.Model], group: dict) -> str:
+    """
+    :param model: a model in `EFFECT_MATRIX_GROUP_LOOKUPS`
+    :type model: type[models.Model]
+    :param group: the value of each group field of the model, eg `{"source": 1}`
+    :type group: dict
+
+    :return: the directory in `EFFECT_MATRIX_DIR` which holds the versions of
+        the matrix of the group
+    :rtype: str
+
+    :raises ValueError: if `group` does not set exactly the group fields of the model
+    """
+    lookups = EFFECT_MATRIX_GROUP_LOOKUPS[model]
+    if set(group) != set(lookups):
+        raise ValueError(f"A {model.__name__} matrix is identified by {sorted(lookups)}, not {sorted(group)}")
+    name = "_".join(f"{field}-{int(group[field])}" for field in lookups)
+    return os.path.join(settings.EFFECT_MATRIX_DIR, model._meta.model_name, name)
+
+
+def _group_queryset(model: type[models.Model], group: dict) -> models.QuerySet:
+    lookups = EFFECT_MATRIX_GROUP_LOOKUPS[model]
+    return model.objects.filter(**{lookups[field]: value for field, value in group.items()})
+
+
+def effect_matrix_signature(model: type[models.Model], group: dict) -> list:
+    """
+    A signature which changes whenever a record is added to, removed from, or
+    modified in the group, or a GenomicFeature is added or removed. Ids only
+    increase, and `modified_date` is set on every save, so the count, the
+    largest id and the latest `modified_date` of the records change when any
+    record does.
+
+    :param model: a model in `EFFECT_MATRIX_GROUP_LOOKUPS`
+    :type model: type[models.Model]
+    :param group: the value of each group field of the model
+    :type group: dict
+
+    :return: a JSON serializable signature
+    :rtype: list
+    """
+    records = _group_queryset(model, group).aggregate(
+        count=models.Count("id"), max_id=models.Max("id"), max_modified=models.Max("modified_date")
+    )
+    features = GenomicFeature.objects.aggregate(count=models.Count("id"), max_id=models.Max("id"))
+    max_modified = records["max_modified"].isoformat() if records["max_modified"] else None
+    return [records["count"], records["max_id"], max_modified, features["count"], features["max_id"]]
+
+
+def _current_matrix(group_dir: str) -> EffectMatrix | None:
+    try:
+        with open(os.path.join(group_dir, "CURRENT"), encoding="utf-8") as current_file:
+            return EffectMatrix(os.path.join(group_dir, current_file.read().strip()))
+    except FileNotFoundError:
+        return None
+
+
+def _copy_unchanged_rows(
+    previous: EffectMatrix,
+    matrices: dict[str, np.ndarray],
+    record_ids: np.ndarray,
+    modified_dates: list[str],
+    target_ids: np.ndarray,
+) -> np.ndarray:
+    # returns the positions of the rows which could not be copied
+    previous_rows = {record_id: row for row, record_id in enumerate(previous.record_ids.tolist())}
+    copied, sources = [], []
+    for row, record_id in enumerate(record_ids.tolist()):
+        previous_row = previous_rows.get(record_id)
+        if previous_row is not None and previous.modified_dates[previous_row] == modified_dates[row]:
+            copied.append(row)
+            sources.append(previous_row)
+    # the targets which are in both versions, eg if a GenomicFeature was added
+    _, columns, previous_columns = np.intersect1d(target_ids, previous.target_ids, return_indices=True)
+    for start in range(0, len(copied), _COPY_CHUNKSIZE):
+        rows = copied[start : start + _COPY_CHUNKSIZE]
+        previous_rows_chunk = sources[start : start + _COPY_CHUNKSIZE]
+        for value, matrix in matrices.items():
+            matrix[np.ix_(rows, columns)] = previous.values[value][np.ix_(previous_rows_chunk, previous_columns)]
+    return np.setdiff1d(np.arange(len(record_ids)), copied)
+
+
+def build_effect_matrix(model: type[models.Model], **group) -> EffectMatrix:
+    """
+    Regenerate the matrix of a group, if it is out of date, see
+    :func:`effect_matrix_signature`. The rows of records which are unchanged
+    since the previous version are copied from it, so only the records which
+    were added or modified are read, from the materialized combined effects
+    or their files (see
+    :func:`~yeastregulatorydb.regulatory_data.utils.combined_effects.iter_combined_effects`).
+
+    The new version is written to a new directory, which then replaces the
+    current version, so readers of the previous version are not affected.
+    The previous version is kept until the next version is written. A file
+    lock serializes builds of the same group.
+
+    This is run by the `build_effect_matrices` command, and by
+    :func:`~yeastregulatorydb.regulatory_data.tasks.effect_matrix_task.effect_matrix_task`,
+    rather than in a request.
+
+    :param model: a model in `EFFECT_MATRIX_GROUP_LOOKUPS`
+    :type model: type[models.Model]
+    :param group: the value of each group field of the model, eg `source=1`
+
+    :return: the current matrix of the group
+    :rtype: EffectMatrix
+
+    :raises ValueError: if `group` does not set exactly the group fields of the model
+    :raises LookupError: if there are no records in the group, or no GenomicFeatures
+    """
+    group_dir = effect_matrix_dir(model, group)
+    os.makedirs(group_dir, exist_ok=True)
+    with open(os.path.join(group_dir, ".lock"), "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        signature = effect_matrix_signature(model, group)
+        previous = _current_matrix(group_dir)
+        if previous is not None and previous.signature == signature:
+            return previous
+
+        records = list(
+            _group_queryset(model, group)
+            .order_by("id")
+            .values_list("id", EFFECT_MATRIX_REGULATOR_LOOKUPS[model], "modified_date")
+        )
+        target_ids = np.fromiter(GenomicFeature.objects.order_by("id").values_list("id", flat=True), dtype=np.int64)
+        if not records or not len(target_ids):
+            raise LookupError(f"There are no {model.__name__} records, or no targets, in the group {group}")
+        record_ids = np.array([record[0] for record in records], dtype=np.int64)
+        regulator_ids = np.array([record[1] for record in records], dtype=np.int64)
+        modified_dates = [record[2].isoformat() for record in records]
+
+        build_dir = tempfile.mkdtemp(prefix=".build-", dir=group_dir)
+        try:
+            matrices = {
+                value: np.lib.format.open_memmap(
+                    os.path.join(build_dir, f"{value}.npy"),
+                    mode="w+",
+                    dtype=np.float64,
+                    shape=(len(record_ids), len(target_ids)),
+                )
+                for value in EFFECT_MATRIX_VALUES
+            }
+            for matrix in matrices.values():
+                matrix[:] = np.nan
+
+            stale_rows = np.arange(len(record_ids))
+            if previous is not None:
+                stale_rows = _copy_unchanged_rows(previous, matrices, record_ids, modified_dates, target_ids)
+            logger.info(f"Reading {len(stale_rows)} of the {len(record_ids)} rows of {group_dir}")
+
+            # the records, and so the dataframes, are in id order, as are the rows
+            stale_records = model.objects.filter(id__in=record_ids[stale_rows].tolist()).order_by("id")
+            for row, df in zip(stale_rows, iter_combined_effects(stale_records)):
+                targets = pd.to_numeric(df["target_id"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                columns = np.searchsorted(target_ids, targets).clip(max=len(target_ids) - 1)
+                # targets which are missing, or not a GenomicFeature, are dropped
+                found = ~np.isnan(targets) & (target_ids[columns] == targets)
+                for value, matrix in matrices.items():
+                    matrix[row, columns[found]] = df[value].to_numpy(dtype=np.float64, na_value=np.nan)[found]
+
+            for matrix in matrices.values():
+                matrix.flush()
+            del matrices
+            np.save(os.path.join(build_dir, "record_ids.npy"), record_ids)
+            np.save(os.path.join(build_dir, "regulator_ids.npy"), regulator_ids)
+            np.save(os.path.join(build_dir, "target_ids.npy"), target_ids)
+            with open(os.path.join(build_dir, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+                json.dump({"signature": signature, "modified_dates": modified_dates}, manifest_file)
+
+            version = uuid.uuid4().hex
+            os.rename(build_dir, os.path.join(group_dir, version))
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+
+        current_tmp = os.path.join(group_dir, f".CURRENT-{version}")
+        with open(current_tmp, "w", encoding="utf-8") as current_file:
+            current_file.write(version)
+        os.replace(current_tmp, os.path.join(group_dir, "CURRENT"))
+
+        # keep the previous version for readers which opened it before the
+        # replace. Older versions are removed
+        keep = {version, os.path.basename(previous.path) if previous is not None else None}
+        for name in os.listdir(group_dir):
+            if not name.startswith(".") and name != "CURRENT" and name not in keep:
+                shutil.rmtree(os.path.join(group_dir, name), ignore_errors=True)
+
+        return EffectMatrix(os.path.join(group_dir, version))
+
+
+def get_effect_matrix(model: type[models.Model], **group) -> tuple[EffectMatrix | None, bool]:
+    """
+    Return the last complete version of the matrix of a group, without
+    building it. If it is missing, or out of date, request a build with
+    :func:`claim_effect_matrix_build`.
+
+    :param model: a model in `EFFECT_MATRIX_GROUP_LOOKUPS`
+    :type model: type[models.Model]
+    :param group: the value of each group field of the model, eg `source=1`
+
+    :return: the current matrix of the group, or None if it has not been
+        built, and whether it is up to date
+    :rtype: tuple[EffectMatrix | None, bool]
+
+    :raises ValueError: if `group` does not set exactly the group fields of the model
+    :raises LookupError: if there are no records in the group, or no GenomicFeatures
+    """
+    signature = effect_matrix_signature(model, group)
+    if not signature[0] or not signature[3]:
+        raise LookupError(f"There are no {model.__name__} records, or no targets, in the group {group}")
+    current = _current_matrix(effect_matrix_dir(model, group))
+    return current, current is not None and current.signature == signature
+
+
+def _build_cache_key(model: type[models.Model], group: dict) -> str:
+    return EFFECT_MATRIX_BUILD_CACHE_KEY.format(
+        model=model._meta.model_name, group=os.path.basename(effect_matrix_dir(model, group))
+    )
+
+
+def claim_effect_matrix_build(model: type[models.Model], group: dict) -> bool:
+    """
+    Claim the build of the matrix of a group, so that a group which is
+    requested by many clients while it is out of date is built once. The
+    claim expires after `EFFECT_MATRIX_BUILD_TIMEOUT` seconds, in case the
+    build does not release it.
+
+    :param model: a model in `EFFECT_MATRIX_GROUP_LOOKUPS`
+    :type model: type[models.Model]
+    :param group: the value of each group field of the model
+    :type group: dict
+
+    :return: True if the caller should launch the build, False if a build
+        has already been claimed
+    :rtype: bool
+    """
+    return cache.add(_build_cache_key(model, group), True, timeout=settings.EFFECT_MATRIX_BUILD_TIMEOUT)
+
+
+def release_effect_matrix_build(model: type[models.Model], group: dict) -> None:
+    """
+    Release the claim on the build of the matrix of a group, once the build
+    has finished. See :func:`claim_effect_matrix_build`
+
+    :param model: a model in `EFFECT_MATRIX_GROUP_LOOKUPS`
+    :type model: type[models.Model]
+    :param group: the value of each group field of the model
+    :type group: dict
+    """
+    cache.delete(_build_cache_key(model, group))
@@ -4,27 +4,38 @@ from django.conf import settings
 from django.core.files import File
 from django.core.files.storage import default_storage
 
+from .local_file_cache import get_local_file_cache
 
-def extract_file_from_storage(file: File, dirpath: str = ".") -> str:
+
+def extract_file_from_storage(file: File, dirpath: str = ".", use_cache: bool = True) -> str:
     """
     Return the path to a file. If the file is stored locally, the path
     to the local storage is returned. Else, if the file is stored on S3,
-    the file is downloaded to the directory specified by `dirpath` and
-    the path to the downloaded file is returned.
+    the file is served from the worker-local file cache (see
+    :class:`~yeastregulatorydb.regulatory_data.utils.local_file_cache.LocalFileCache`),
+    and downloaded to the cache if it is not already there. If `use_cache`
+    is False, or the setting `LOCAL_FILE_CACHE_MAX_BYTES` is 0, the file is
+    instead downloaded to the directory specified by `dirpath`.
+
+    Note that files returned from the cache are shared by all callers on the
+    worker. They must be treated as read only.
 
     :param file: The file to download
     :type file: File
-    :param dirpath: The path to the directory where the file should be downloaded.
-    Note that while this is a required argument, if the file is stored locally
-    and not on S3, the file is not copied and this argument is ignored.
+    :param dirpath: The path to the directory where the file should be downloaded
+        if the cache is not used. Note that while this is a required argument, if
+        the file is stored locally or served from the cache, the file is not
+        copied and this argument is ignored.
     :type dirpath: str
+    :param use_cache: Whether to serve remote files from the local file cache.
+        Defaults to True
+    :type use_cache: bool
 
     :return: The path to the file
     :rtype: str
 
     :raises FileExistsError: If the directory specified by `dirpath` does not exist
-    :raises FileNotFoundError: If the file.url is used, and the url returns something
-    other than a status_code 200
+    :raises FileNotFoundError: If the file does not exist in the storage
     """
     if not os.path.isdir(dirpath):
         raise FileExistsError(f"Directory does not exist: {dirpath}")
@@ -33,13 +44,17 @@ def extract_file_from_storage(file: File, dirpath: str = ".") -> str:
 
     if os.path.exists(local_path):
         return local_path
-    else:
-        if default_storage.exists(file.name):
-            with default_storage.open(file.name, "rb") as source_file:
-                with open(local_path, "wb") as destination_file:
-                    for chunk in source_file.chunks():
-                        destination_file.write(chunk)
-        else:
-            raise FileNotFoundError(f"File does not exist in storage: {file.name}")
-
-    return local_path
+
+    if use_cache and settings.LOCAL_FILE_CACHE_MAX_BYTES > 0:
+        return get_local_file_cache().get_path(file.name)
+
+    if not default_storage.exists(file.name):
+        raise FileNotFoundError(f"File does not exist in storage: {file.name}")
+
+    download_path = os.path.join(dirpath, os.path.basename(file.name))
+    with default_storage.open(file.name, "rb") as source_file:
+        with open(download_path, "wb") as destination_file:
+            for chunk in source_file.chunks():
+                destination_file.write(chunk)
+
+    return download_path
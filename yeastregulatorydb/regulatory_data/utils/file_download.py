@@ -0,0 +1,106 @@
+import logging
+import os
+from datetime import datetime
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse, HttpResponseRedirect
+from django.http.response import HttpResponseBase
+from django.utils.http import content_disposition_header, quote_etag
+
+from .http_validators import ranged_file_response, stored_file_checksum
+
+logger = logging.getLogger(__name__)
+
+
+def presigned_url(storage, name: str, filename: str, expiry: int | None = None) -> str:
+    """
+    Create a short-lived, signed URL to download an object from an S3
+    storage. Unlike `storage.url`, the URL is signed even if
+    `AWS_QUERYSTRING_AUTH` is off, and the download is named `filename`.
+
+    :param storage: an S3Storage, see `yeastregulatorydb.utils.storages`
+    :param name: the name of the file in the storage
+    :type name: str
+    :param filename: the name of the downloaded file
+    :type filename: str
+    :param expiry: the number of seconds for which the URL is valid.
+        Defaults to `FILE_DOWNLOAD_URL_EXPIRY`
+    :type expiry: int, optional
+
+    :return: the URL
+    :rtype: str
+    """
+    # django-storages is only installed with the S3 storage, see the production settings
+    from storages.utils import clean_name
+
+    # pylint: disable=protected-access
+    # the storage prefixes the name with its location, eg `media/`, as in `storage.url`
+    key = storage._normalize_name(clean_name(name))
+    return storage.bucket.meta.client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": storage.bucket.name,
+            "Key": key,
+            "ResponseContentDisposition": content_disposition_header(True, filename),
+        },
+        ExpiresIn=expiry or settings.FILE_DOWNLOAD_URL_EXPIRY,
+    )
+
+
+def file_download_response(
+    request, field_file: FieldFile, filename: str | None = None, last_modified: datetime | None = None
+) -> HttpResponseBase:
+    """
+    Respond with a stored file, without transforming it. If
+    `FILE_DOWNLOAD_REDIRECT` is set, the web process does not read the file,
+    and conditional and range requests are handled by the storage:
+
+    - for an S3 storage, the response is a 302 to a pre-signed URL, see
+      :func:`presigned_url`
+    - for a local storage, the response has an `X-Accel-Redirect` header to
+      `FILE_DOWNLOAD_ACCEL_PREFIX`, an internal location of the nginx
+      container which serves the media directory
+
+    Otherwise, the file is streamed from the storage through the web
+    process, with its checksum as the ETag, and with support for conditional
+    and byte range requests. See
+    :func:`~yeastregulatorydb.regulatory_data.utils.http_validators.ranged_file_response`
+
+    :param request: the request
+    :param field_file: the file, eg `record.file`
+    :type field_file: FieldFile
+    :param filename: the name of the downloaded file. Defaults to the
+        basename of the stored file
+    :type filename: str, optional
+    :param last_modified: the modification time of the file, eg the
+        `modified_date` of the record. Defaults to None
+    :type last_modified: datetime, optional
+
+    :return: the response
+    :rtype: HttpResponseBase
+    """
+    filename = filename or os.path.basename(field_file.name)
+    storage = field_file.storage
+    if settings.FILE_DOWNLOAD_REDIRECT:
+        if hasattr(storage, "bucket"):
+            return HttpResponseRedirect(presigned_url(storage, field_file.name, filename))
+        if isinstance(storage, FileSystemStorage):
+            response = HttpResponse(content_type="application/gzip")
+            response[
+                "X-Accel-Redirect"
+            ] = f"{settings.FILE_DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{quote(field_file.name)}"
+            response["Content-Disposition"] = content_disposition_header(True, filename)
+            return response
+        logger.warning(f"{type(storage).__name__} does not support redirected downloads. Streaming {field_file.name}")
+    etag = quote_etag(stored_file_checksum(field_file))
+    return ranged_file_response(
+        request,
+        field_file.storage.open(field_file.name, "rb"),
+        field_file.size,
+        filename,
+        etag=etag,
+        last_modified=last_modified,
+    )
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from ..models.GenomicFeature import GenomicFeature
+from .versioned_cache import VersionedCache
+
+GENOMICFEATURE_VERSION_CACHE_KEY = "genomicfeature_version"
+
+
+class GenomicFeatureCache(VersionedCache):
+    """
+    A process-wide cache of the GenomicFeature annotations used to label
+    targets in the combined exports, ie the `locus_tag` and `symbol` of each
+    GenomicFeature id. The annotations are held in arrays indexed by id, so
+    that a column of ids is annotated with a single vectorized `take`, rather
+    than a query and a merge per record.
+
+    The cache is invalidated, when the transaction commits, by the
+    `post_save` and `post_delete` receivers in the GenomicFeature model
+    module, in the same way as the
+    :class:`~yeastregulatorydb.regulatory_data.utils.chrmap_cache.ChrMapCache`,
+    see :class:`~yeastregulatorydb.regulatory_data.utils.versioned_cache.VersionedCache`.
+    Note that `bulk_create`, `update` and raw SQL do not send these signals --
+    call :meth:`invalidate_on_commit` after using them.
+
+    Example usage:
+
+    .. code-block:: python
+
+        from yeastregulatorydb.regulatory_data.utils.genomicfeature_cache import genomicfeature_cache
+
+        locus_tags, symbols = genomicfeature_cache.annotate(df["target_id"])
+    """
+
+    version_cache_key = GENOMICFEATURE_VERSION_CACHE_KEY
+
+    def load(self) -> tuple[np.ndarray, np.ndarray]:
+        records = list(GenomicFeature.objects.values_list("id", "locus_tag", "symbol"))
+        ids, locus_tags, symbols = (list(column) for column in zip(*records)) if records else ([], [], [])
+        # the last element is the annotation of ids which are not in the
+        # table, ie NaN, which is what a left merge would give
+        size = max(ids, default=0) + 2
+        locus_tag_array = np.full(size, np.nan, dtype=object)
+        symbol_array = np.full(size, np.nan, dtype=object)
+        locus_tag_array[ids] = locus_tags
+        symbol_array[ids] = symbols
+        return locus_tag_array, symbol_array
+
+    def annotate(self, ids: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param ids: GenomicFeature ids. Missing values, and ids which are not
+            in GenomicFeature, are allowed
+        :type ids: pd.Series
+
+        :return: the `locus_tag` and `symbol` of each id, or NaN if the id is
+            missing or not in GenomicFeature
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        locus_tags, symbols = self.get()[1]
+        missing = len(locus_tags) - 1
+        index = pd.to_numeric(ids, errors="coerce").fillna(missing).to_numpy(dtype=np.int64)
+        index[(index < 0) | (index > missing)] = missing
+        return locus_tags.take(index), symbols.take(index)
+
+
+genomicfeature_cache = GenomicFeatureCache()
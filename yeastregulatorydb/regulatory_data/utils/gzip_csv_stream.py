@@ -0,0 +1,61 @@
+import zlib
+from collections.abc import Iterable, Iterator
+
+import pandas as pd
+
+
+def gzip_csv_stream(frames: Iterable[pd.DataFrame], columns: list | None = None) -> Iterator[bytes]:
+    """
+    Write dataframes as a single gzipped CSV, one dataframe at a time, eg as
+    the content of a `StreamingHttpResponse`. The compressed stream is flushed
+    after every dataframe, so the client receives each dataframe as soon as
+    it is written, and only one dataframe is held in memory at a time.
+
+    Example usage:
+
+    .. code-block:: python
+
+        frames = (record_df(record) for record in queryset.iterator())
+        response = StreamingHttpResponse(gzip_csv_stream(frames, columns), content_type="application/gzip")
+
+    :param frames: the dataframes to write
+    :type frames: Iterable[pd.DataFrame]
+    :param columns: the columns to write, in order. If passed, the header is
+        written before the first dataframe is read, so there is a header even
+        if there are no dataframes. Defaults to None, which writes the columns
+        of the first dataframe
+    :type columns: list, optional
+
+    :return: an iterator of gzipped bytes
+    :rtype: Iterator[bytes]
+    """
+
+    def csv_chunks() -> Iterator[bytes]:
+        write_header = True
+        if columns is not None:
+            yield pd.DataFrame(columns=columns).to_csv(index=False).encode()
+            write_header = False
+        for df in frames:
+            yield df.to_csv(index=False, header=write_header, columns=columns).encode()
+            write_header = False
+
+    yield from gzip_stream(csv_chunks())
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compress a stream of bytes into a single gzip stream, one chunk at a
+    time. The compressed stream is flushed after every chunk, so the client
+    receives each chunk as soon as it is compressed.
+
+    :param chunks: the uncompressed chunks
+    :type chunks: Iterable[bytes]
+
+    :return: an iterator of gzipped bytes
+    :rtype: Iterator[bytes]
+    """
+    # 16 + MAX_WBITS writes a gzip, rather than zlib, header and trailer
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
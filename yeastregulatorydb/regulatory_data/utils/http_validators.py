@@ -0,0 +1,246 @@
+import hashlib
+import logging
+import re
+from collections.abc import Iterator
+from datetime import datetime
+from typing import BinaryIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+STORED_FILE_CHECKSUM_CACHE_KEY = "stored_file_checksum:{name}"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# the size of the blocks in which a file is read
+_BLOCK_SIZE = 1024 * 1024
+
+
+def stored_file_checksum(field_file: FieldFile) -> str:
+    """
+    The sha256 of a stored file. The checksum is computed, by reading the
+    file, the first time it is requested, and is then kept in the django
+    cache. This relies on the stored files being written once, see
+    :meth:`~yeastregulatorydb.regulatory_data.models.mixins.GzipFileUploadWithIdMixin.GzipFileUploadWithIdMixin.save_with_file_id`.
+    A file which replaces another is stored under a new name.
+
+    :param field_file: the file, eg `record.file`
+    :type field_file: FieldFile
+
+    :return: the sha256 hex digest of the file
+    :rtype: str
+    """
+    key = STORED_FILE_CHECKSUM_CACHE_KEY.format(name=hashlib.sha256(field_file.name.encode()).hexdigest())
+    checksum = cache.get(key)
+    if checksum is None:
+        logger.debug(f"Computing the checksum of {field_file.name}")
+        digest = hashlib.sha256()
+        with field_file.storage.open(field_file.name, "rb") as f:
+            while block := f.read(_BLOCK_SIZE):
+                digest.update(block)
+        checksum = digest.hexdigest()
+        cache.set(key, checksum, timeout=None)
+    return checksum
+
+
+def queryset_etag(request, queryset: models.QuerySet, *extra: str, labels: list[str] | None = None) -> str:
+    """
+    A weak ETag of a response which is generated from the records in a
+    filtered queryset, eg the `export` and `combined` actions. The ETag is
+    built from the query parameters of the request and the response cache
+    version of each model the response depends on (see
+    :class:`~yeastregulatorydb.regulatory_data.utils.response_cache.ResponseCache`),
+    so that it changes when a record is added, deleted or modified, including
+    with `update()` followed by `invalidate_on_commit`, without a query.
+
+    There is no Last-Modified validator for these responses, since the latest
+    `modified_date` of the records goes down when the latest one is deleted.
+
+    :param request: the request
+    :param queryset: the filtered queryset
+    :type queryset: models.QuerySet
+    :param extra: other versions the response depends on, eg the
+        GenomicFeatureCache version
+    :type extra: str
+    :param labels: the labels of other models the response depends on, eg
+        the `response_cache_models` of the viewset. The model of the queryset
+        and the models of its foreign keys, other than the user model, are
+        always included
+    :type labels: list[str], optional
+
+    :return: a weak ETag
+    :rtype: str
+    """
+    model = queryset.model
+    # the user foreign keys, eg `uploader`, are exported as ids, so a change
+    # to a user, eg the `last_login` of every login, does not change the ETag
+    all_labels = {
+        model._meta.label,
+        *(
+            field.related_model._meta.label
+            for field in model._meta.concrete_fields
+            if field.is_relation and field.related_model._meta.label != settings.AUTH_USER_MODEL
+        ),
+        *(labels or []),
+    }
+    content = ":".join([response_cache.key(model.__name__, request, sorted(all_labels)), *extra])
+    return "W/" + quote_etag(hashlib.sha256(content.encode()).hexdigest())
+
+
+def conditional_response(request, etag: str | None, last_modified: datetime | None) -> HttpResponseBase | None:
+    """
+    Evaluate the `If-None-Match`, `If-Modified-Since`, `If-Match` and
+    `If-Unmodified-Since` headers of a request.
+
+    :param request: the request
+    :param etag: the ETag of the response
+    :type etag: str | None
+    :param last_modified: the modification time of the response
+    :type last_modified: datetime | None
+
+    :return: a 304, or 412, response if the request is conditional and its
+        condition is not met, and otherwise None
+    :rtype: HttpResponseBase | None
+    """
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def set_validators(response: HttpResponseBase, etag: str | None, last_modified: datetime | None) -> HttpResponseBase:
+    """
+    :param response: the response
+    :type response: HttpResponseBase
+    :param etag: the ETag of the response
+    :type etag: str | None
+    :param last_modified: the modification time of the response
+    :type last_modified: datetime | None
+
+    :return: the response, with the ETag and Last-Modified headers
+    :rtype: HttpResponseBase
+    """
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single byte range, eg `bytes=0-499`, `bytes=500-` or `bytes=-500`.
+
+    :param header: the Range header
+    :type header: str | None
+    :param size: the size of the content
+    :type size: int
+
+    :return: the first and last byte of the range, or None if there is no
+        range, or the header is not a single byte range, in which case the
+        whole content is sent
+    :rtype: tuple[int, int] | None
+
+    :raises ValueError: if the range is not satisfiable
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # a suffix range, the last `end` bytes
+        if int(end) == 0:
+            raise ValueError("The range is not satisfiable")
+        return max(size - int(end), 0), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        raise ValueError("The range is not satisfiable")
+    return first, last
+
+
+def _iter_range(file: BinaryIO, first: int, last: int) -> Iterator[bytes]:
+    try:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            block = file.read(min(_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        file.close()
+
+
+def ranged_file_response(
+    request,
+    file: BinaryIO,
+    size: int,
+    filename: str,
+    etag: str | None = None,
+    last_modified: datetime | None = None,
+    content_type: str = "application/gzip",
+) -> HttpResponseBase:
+    """
+    Respond with a file, with the ETag and Last-Modified validators, and
+    support for conditional requests and a single byte range. A range is
+    ignored if the request has an `If-Range` which does not match `etag`.
+    The file is closed once the response has been sent.
+
+    :param request: the request
+    :param file: the file, which must be seekable
+    :type file: BinaryIO
+    :param size: the size of the file in bytes
+    :type size: int
+    :param filename: the name of the downloaded file
+    :type filename: str
+    :param etag: the ETag of the file. Defaults to None
+    :type etag: str, optional
+    :param last_modified: the modification time of the file. Defaults to None
+    :type last_modified: datetime, optional
+    :param content_type: the content type. Defaults to `application/gzip`
+    :type content_type: str
+
+    :return: a 200, 206, 304, 412 or 416 response
+    :rtype: HttpResponseBase
+    """
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        file.close()
+        return set_validators(not_modified, etag, last_modified)
+
+    if_range = request.headers.get("If-Range")
+    byte_range = None
+    if if_range is None or (etag is not None and not etag.startswith("W/") and if_range == etag):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            file.close()
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    first, last = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(
+        _iter_range(file, first, last), status=206 if byte_range else 200, content_type=content_type
+    )
+    response["Content-Length"] = str(last - first + 1 if size else 0)
+    if byte_range:
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return set_validators(response, etag, last_modified)
@@ -0,0 +1,98 @@
+import hashlib
+from importlib.metadata import PackageNotFoundError, version
+
+from django.core.files.storage import default_storage
+
+from .chrmap_cache import chrmap_cache
+from .local_file_cache import storage_version
+from .promoter_sig import PROMOTER_SIG_CODE_VERSION
+
+
+def _callingcardstools_version() -> str:
+    try:
+        return version("callingcardstools")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def fingerprint(*parts: str) -> str:
+    """
+    :param parts: the strings which identify a set of inputs
+    :type parts: str
+
+    :return: a sha256 hex digest of the parts, in order
+    :rtype: str
+    """
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def file_checksum(record, field: str = "file") -> str:
+    """
+    :param record: a model instance with a stored file
+    :type record: Model
+    :param field: the name of the file field. Defaults to `file`
+    :type field: str
+
+    :return: the storage name and storage version of the file, which changes
+        when the file is replaced, see
+        :func:`~yeastregulatorydb.regulatory_data.utils.local_file_cache.storage_version`.
+        An empty string if there is no file
+    :rtype: str
+    """
+    name = getattr(record, field).name
+    if not name:
+        return ""
+    return f"{name}:{storage_version(name, default_storage)}"
+
+
+def promotersetsig_fingerprint(binding_record, promoter_record, background_record, output_fileformat: str) -> str:
+    """
+    Return the fingerprint of the inputs of a PromoterSetSig. This includes
+    the binding, promoter set and background files, the content of ChrMap,
+    and the version of the promoter significance code, so a PromoterSetSig
+    with the same fingerprint does not need to be recalculated.
+
+    :param binding_record: a Binding record
+    :type binding_record: Binding
+    :param promoter_record: a PromoterSet record
+    :type promoter_record: PromoterSet
+    :param background_record: a CallingCardsBackground record, or None for
+        formats which do not use a background
+    :type background_record: CallingCardsBackground | None
+    :param output_fileformat: the name of the output FileFormat
+    :type output_fileformat: str
+
+    :return: a sha256 hex digest
+    :rtype: str
+    """
+    return fingerprint(
+        output_fileformat,
+        file_checksum(binding_record),
+        file_checksum(promoter_record),
+        file_checksum(background_record) if background_record is not None else "",
+        chrmap_cache.checksum,
+        PROMOTER_SIG_CODE_VERSION,
+        _callingcardstools_version(),
+    )
+
+
+def combined_binding_fingerprint(binding_queryset, source_name: str, sum_depth: bool = False) -> str:
+    """
+    Return the fingerprint of a set of Binding records which are combined into
+    a single record, eg the passing calling cards replicates of a regulator.
+
+    :param binding_queryset: the Binding records which are combined
+    :type binding_queryset: QuerySet
+    :param source_name: the name of the DataSource of the combined record
+    :type source_name: str
+    :param sum_depth: whether the depths of duplicate insertions are summed
+    :type sum_depth: bool
+
+    :return: a sha256 hex digest
+    :rtype: str
+    """
+    return fingerprint(
+        source_name,
+        f"sum_depth={sum_depth}",
+        *[f"{record.id}:{file_checksum(record)}" for record in binding_queryset.order_by("id")],
+    )
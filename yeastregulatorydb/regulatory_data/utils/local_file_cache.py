@@ -0,0 +1,250 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import Storage, default_storage
+
+logger = logging.getLogger(__name__)
+
+# a `.part` download which has not been written to for this many seconds was
+# abandoned by a process which was killed, and is removed by `evict`
+STALE_PART_SECONDS = 3600
+
+
+def storage_version(name: str, storage: Storage = default_storage) -> str:
+    """
+    Return a token which changes whenever the content of `name` in `storage`
+    changes. If the storage exposes an S3 bucket, the object ETag is used.
+    Otherwise, the size and modified time of the file are used.
+
+    :param name: The name of the file in the storage
+    :type name: str
+    :param storage: The storage backend. Defaults to `default_storage`
+    :type storage: Storage
+
+    :return: a version token for the stored file
+    :rtype: str
+    """
+    bucket = getattr(storage, "bucket", None)
+    if bucket is not None:
+        # S3 storages prefix the object key with the storage `location`
+        key = "/".join(filter(None, [getattr(storage, "location", ""), name]))
+        return bucket.Object(key).e_tag.strip('"')
+    return f"{storage.size(name)}-{storage.get_modified_time(name).timestamp()}"
+
+
+class LocalFileCache:
+    """
+    A worker-local, content-addressed cache of files held in a django storage
+    backend (eg S3). Files are keyed by their storage name and the storage
+    version token (see :func:`storage_version`), so a file which is
+    overwritten in storage is re-downloaded. Downloads are written to a
+    temporary file in the cache directory and then renamed into place, so a
+    partially downloaded file is never returned. When the total size of the
+    cache exceeds `max_bytes`, the least recently used files are evicted.
+
+    A path which is returned may be read by the caller, or by another process
+    on the worker, for some time after it is returned, so a file which was
+    returned within the last `grace_seconds` is not evicted, even if the cache
+    is then over its byte budget.
+
+    Example usage:
+
+    .. code-block:: python
+
+        cache = LocalFileCache("/tmp/file_cache", 10 * 1024**3, grace_seconds=3600)
+        local_path = cache.get_path(binding_record.file.name)
+        print(cache.stats())
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, grace_seconds: float = 3600) -> None:
+        """
+        :param cache_dir: path to the directory in which to store cached files.
+            Created if it does not exist
+        :type cache_dir: str
+        :param max_bytes: the byte budget of the cache
+        :type max_bytes: int
+        :param grace_seconds: a file is not evicted for this many seconds
+            after it was last returned by :meth:`get_path`. Defaults to 3600
+        :type grace_seconds: float
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_path(self, name: str, version: str) -> str:
+        """
+        Return the path in the cache at which `name` at `version` is stored.
+        The basename of `name` is retained so that the file extension, which
+        pandas and callingcardstools use to infer compression, is preserved.
+
+        :param name: The name of the file in the storage
+        :type name: str
+        :param version: the storage version token of the file
+        :type version: str
+
+        :return: the path to the file in the cache
+        :rtype: str
+        """
+        digest = hashlib.sha256(f"{name}:{version}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}_{os.path.basename(name)}")
+
+    def get_path(self, name: str, storage: Storage = default_storage) -> str:
+        """
+        Return the local path to `name`, downloading it from `storage` if
+        it is not already in the cache.
+
+        :param name: The name of the file in the storage
+        :type name: str
+        :param storage: The storage backend. Defaults to `default_storage`
+        :type storage: Storage
+
+        :return: the path to the local copy of the file
+        :rtype: str
+
+        :raises FileNotFoundError: If the file does not exist in the storage
+        """
+        if not storage.exists(name):
+            raise FileNotFoundError(f"File does not exist in storage: {name}")
+
+        local_path = self.cache_path(name, storage_version(name, storage))
+
+        try:
+            # update the modified time, which orders LRU eviction and starts
+            # the grace period in which the file is not evicted
+            os.utime(local_path)
+        except FileNotFoundError:
+            # not cached, or evicted by another process since it was last used
+            pass
+        else:
+            with self._lock:
+                self.hits += 1
+            logger.debug("LocalFileCache hit for %s", name)
+            return local_path
+
+        logger.debug("LocalFileCache miss for %s", name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as destination_file, storage.open(name, "rb") as source_file:
+                for chunk in source_file.chunks():
+                    destination_file.write(chunk)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self.misses += 1
+            self.bytes_downloaded += os.path.getsize(local_path)
+        self.evict(keep=local_path)
+
+        return local_path
+
+    def size(self) -> int:
+        """
+        :return: the total size, in bytes, of the files in the cache
+        :rtype: int
+        """
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            try:
+                total += entry.stat().st_size if entry.is_file() else 0
+            except FileNotFoundError:
+                # evicted by another process since the directory was scanned
+                continue
+        return total
+
+    def evict(self, keep: str | None = None) -> None:
+        """
+        Remove the least recently used files until the cache is within
+        `max_bytes`. Files which were returned within the last
+        `grace_seconds`, and the file at `keep`, are never removed. In
+        progress downloads are not removed, but `.part` files which have not
+        been written to for `STALE_PART_SECONDS` are.
+
+        :param keep: path to a file which should not be evicted
+        :type keep: str, optional
+        """
+        now = time.time()
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if not entry.is_file() or entry.path == keep:
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    # evicted, or renamed into place, by another process
+                    continue
+                if not entry.name.endswith(".part"):
+                    entries.append((mtime, entry))
+                elif mtime < now - STALE_PART_SECONDS:
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        continue
+                    logger.debug("LocalFileCache removed abandoned download %s", entry.path)
+            total = self.size()
+            for _, entry in sorted(entries, key=lambda x: x[0]):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    # stat again, since the file may have been returned since
+                    # the directory was scanned
+                    stat = os.stat(entry.path)
+                    if stat.st_mtime >= now - self.grace_seconds:
+                        continue
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    # another worker process evicted this file first
+                    continue
+                total -= stat.st_size
+                self.evictions += 1
+                logger.debug("LocalFileCache evicted %s", entry.path)
+
+    def stats(self) -> dict[str, int]:
+        """
+        :return: the hit, miss, bytes downloaded and eviction counters of this
+            process, and the current size of the cache in bytes
+        :rtype: dict
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_downloaded": self.bytes_downloaded,
+            "evictions": self.evictions,
+            "bytes_cached": self.size(),
+        }
+
+
+_local_file_cache: LocalFileCache | None = None
+
+
+def get_local_file_cache() -> LocalFileCache:
+    """
+    Return the process-wide LocalFileCache, configured by the django settings
+    `LOCAL_FILE_CACHE_DIR`, `LOCAL_FILE_CACHE_MAX_BYTES` and
+    `LOCAL_FILE_CACHE_GRACE_SECONDS`.
+
+    :return: the process-wide LocalFileCache
+    :rtype: LocalFileCache
+    """
+    global _local_file_cache
+    if _local_file_cache is None or _local_file_cache.cache_dir != settings.LOCAL_FILE_CACHE_DIR:
+        _local_file_cache = LocalFileCache(
+            settings.LOCAL_FILE_CACHE_DIR,
+            settings.LOCAL_FILE_CACHE_MAX_BYTES,
+            grace_seconds=settings.LOCAL_FILE_CACHE_GRACE_SECONDS,
+        )
+    return _local_file_cache
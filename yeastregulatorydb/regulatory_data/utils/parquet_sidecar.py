@@ -0,0 +1,208 @@
+import logging
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import models
+
+from .extract_file_from_storage import extract_file_from_storage
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+def cast_to_fields(df: pd.DataFrame, fields: dict) -> pd.DataFrame:
+    """
+    Cast the columns of a dataframe to the dtypes described by a FileFormat
+    `fields` dictionary, eg the output of `FileFormatSerializer.fields_as_types`.
+    Columns which are not in `fields` are left as they are.
+
+    :param df: the dataframe to cast
+    :type df: pd.DataFrame
+    :param fields: dictionary of column names to python types. If a column
+        has expected factor levels, the value is a list of those levels
+    :type fields: dict
+
+    :return: the dataframe with typed columns
+    :rtype: pd.DataFrame
+    """
+    dtype_map = {str: "string", int: "int64", float: "float64"}
+    for colname, expected_type_or_levels in fields.items():
+        if colname not in df.columns:
+            continue
+        if isinstance(expected_type_or_levels, list):
+            df[colname] = pd.Categorical(df[colname], categories=expected_type_or_levels)
+        elif expected_type_or_levels in dtype_map:
+            df[colname] = df[colname].astype(dtype_map[expected_type_or_levels])
+    return df
+
+
+def sidecar_name(file_name: str) -> str:
+    """
+    Return the storage name of the parquet sidecar for a stored file, eg
+    `binding/brent_nf_cc/1.csv.gz` -> `binding/brent_nf_cc/1.parquet`
+
+    :param file_name: the storage name of the gzipped table
+    :type file_name: str
+
+    :return: the storage name of the sidecar
+    :rtype: str
+    """
+    base, ext = os.path.splitext(file_name)
+    if ext == ".gz":
+        base = os.path.splitext(base)[0]
+    return f"{base}.parquet"
+
+
+class ParquetSidecarWriter:
+    """
+    Incrementally write dataframe chunks, eg from `pd.read_csv(chunksize=...)`,
+    to a local parquet file so that the full table is never held in memory.
+    Every chunk is cast with :func:`cast_to_fields` and must match the schema
+    of the first chunk. If a chunk does not, the sidecar is abandoned.
+
+    Example usage:
+
+    .. code-block:: python
+
+        writer = ParquetSidecarWriter(fields)
+        for chunk in pd.read_csv(path, chunksize=100_000):
+            writer.write(chunk)
+        sidecar_path = writer.close()
+    """
+
+    def __init__(self, fields: dict) -> None:
+        """
+        :param fields: the FileFormat fields, see :func:`cast_to_fields`
+        :type fields: dict
+        """
+        self.fields = fields
+        fd, self.path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        self._writer: pq.ParquetWriter | None = None
+        self._failed = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        :param df: a chunk of the table
+        :type df: pd.DataFrame
+        """
+        if self._failed:
+            return
+        table = pa.Table.from_pandas(cast_to_fields(df.copy(), self.fields), preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        try:
+            self._writer.write_table(table.cast(self._writer.schema))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError) as exc:
+            logger.warning("Chunk does not match the sidecar schema. Skipping the sidecar: %s", exc)
+            self.discard()
+
+    def close(self) -> str | None:
+        """
+        :return: the path to the local parquet file, or None if nothing was
+            written or the sidecar was abandoned
+        :rtype: str | None
+        """
+        if self._writer is not None and not self._failed:
+            self._writer.close()
+            return self.path
+        self.discard()
+        return None
+
+    def discard(self) -> None:
+        """Abandon the sidecar and remove the local file"""
+        self._failed = True
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def write_parquet_sidecar(instance: models.Model, sidecar_path: str) -> str | None:
+    """
+    Save the local parquet file at `sidecar_path` next to `instance.file` in
+    the default storage and record it in `instance.sidecar`. The model is
+    updated with `queryset.update()` so that the model `save()` method, which
+    may move `file`, is not called again, and the response cache version of
+    the model is bumped, since `update()` does not send `post_save`. Any
+    existing sidecar is deleted, as is the local file.
+
+    :param instance: a saved model instance with `file` and `sidecar` fields
+    :type instance: models.Model
+    :param sidecar_path: path to a local parquet file, eg the output of
+        :meth:`ParquetSidecarWriter.close`
+    :type sidecar_path: str
+
+    :return: the storage name of the sidecar, or None if the instance does not
+        have a `sidecar` field or a `file`
+    :rtype: str | None
+    """
+    try:
+        if not hasattr(instance, "sidecar") or not instance.file:
+            return None
+
+        old_sidecar_name = instance.sidecar.name if instance.sidecar else None
+        with open(sidecar_path, "rb") as sidecar_file:
+            new_sidecar_name = default_storage.save(sidecar_name(instance.file.name), File(sidecar_file))
+        type(instance).objects.filter(pk=instance.pk).update(sidecar=new_sidecar_name)
+        response_cache.invalidate_on_commit(type(instance)._meta.label)
+        instance.sidecar.name = new_sidecar_name
+    finally:
+        os.unlink(sidecar_path)
+
+    if old_sidecar_name and old_sidecar_name != new_sidecar_name:
+        default_storage.delete(old_sidecar_name)
+
+    logger.debug("Wrote parquet sidecar %s for %s", new_sidecar_name, instance)
+    return new_sidecar_name
+
+
+def stored_table_file(instance: models.Model):
+    """
+    :param instance: a model instance with a `file` field, and optionally a
+        `sidecar` field
+    :type instance: models.Model
+
+    :return: the file which :func:`read_stored_table` reads, ie the parquet
+        sidecar if there is one, and otherwise `file`
+    :rtype: FieldFile
+    """
+    sidecar = getattr(instance, "sidecar", None)
+    return sidecar if sidecar else instance.file
+
+
+def read_stored_table(instance: models.Model, columns: list | None = None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Read the table stored in `instance.file`. If the instance has a parquet
+    sidecar, it is read with column projection and memory mapping. Otherwise,
+    the gzipped file is parsed with `pd.read_csv`.
+
+    :param instance: a model instance with a `file` field, and optionally a
+        `sidecar` field
+    :type instance: models.Model
+    :param columns: the columns to read. Columns which are not in the stored
+        table are ignored. Defaults to None, which reads all columns
+    :type columns: list, optional
+    :param read_csv_kwargs: additional keyword arguments passed to `pd.read_csv`
+        if there is no sidecar, eg `sep`
+
+    :return: the stored table
+    :rtype: pd.DataFrame
+    """
+    stored_file = stored_table_file(instance)
+    if stored_file.field.name == "sidecar":
+        path = extract_file_from_storage(stored_file)
+        if columns is not None:
+            available = set(pq.read_schema(path).names)
+            columns = [col for col in columns if col in available]
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+
+    filepath = extract_file_from_storage(stored_file)
+    if columns is not None:
+        read_csv_kwargs["usecols"] = lambda col: col in columns
+    return pd.read_csv(filepath, **read_csv_kwargs)
@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import models
+
+from .extract_file_from_storage import extract_file_from_storage
+from .local_file_cache import get_local_file_cache
+from .parquet_sidecar import stored_table_file
+from .transient_errors import TRANSIENT_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch(stored_file, retries: int) -> str | None:
+    if not stored_file:
+        return None
+    # retry transient errors with exponential backoff. The last error is
+    # raised, so that it may be retried by MyBaseTask
+    attempt = 0
+    while True:
+        try:
+            return extract_file_from_storage(stored_file)
+        except TRANSIENT_ERRORS as exc:
+            if attempt >= retries:
+                raise
+            delay = 2**attempt
+            logger.warning(f"Fetching {stored_file.name} failed: {exc}. Retrying in {delay} seconds")
+            time.sleep(delay)
+            attempt += 1
+
+
+def prefetch_stored_files(
+    records: Iterable[models.Model],
+    max_workers: int | None = None,
+    timeout: float | None = None,
+    retries: int | None = None,
+) -> Iterator[models.Model]:
+    """
+    Yield `records` in order, once the stored table of each record (see
+    :func:`~yeastregulatorydb.regulatory_data.utils.parquet_sidecar.stored_table_file`)
+    is in the local file cache. The files are downloaded by a bounded thread
+    pool, so that while the caller reads one record, eg with
+    :func:`~yeastregulatorydb.regulatory_data.utils.parquet_sidecar.read_stored_table`,
+    the next `max_workers` files are downloading. Only the downloads are run
+    in the threads -- the records, and any database access, stay on the
+    calling thread.
+
+    If the local file cache is disabled, ie `LOCAL_FILE_CACHE_MAX_BYTES` is 0,
+    there is nowhere to prefetch to, and the records are yielded as they are.
+
+    Example usage:
+
+    .. code-block:: python
+
+        for record in prefetch_stored_files(queryset.iterator()):
+            df = read_stored_table(record)
+
+    :param records: model instances with a `file` field, and optionally a
+        `sidecar` field
+    :type records: Iterable[models.Model]
+    :param max_workers: the number of concurrent downloads. Defaults to the
+        setting `FILE_PREFETCH_WORKERS`
+    :type max_workers: int, optional
+    :param timeout: the number of seconds to wait for a single file. Defaults
+        to the setting `FILE_PREFETCH_TIMEOUT`
+    :type timeout: float, optional
+    :param retries: the number of times a download which fails with a
+        transient error is retried. Defaults to the setting `FILE_PREFETCH_RETRIES`
+    :type retries: int, optional
+
+    :return: an iterator over `records`
+    :rtype: Iterator[models.Model]
+
+    :raises TimeoutError: if a file is not downloaded within `timeout` seconds.
+        This, and the download errors, are transient errors which
+        :class:`~yeastregulatorydb.regulatory_data.tasks.BaseTask.MyBaseTask` retries
+    """
+    max_workers = max_workers or settings.FILE_PREFETCH_WORKERS
+    timeout = timeout if timeout is not None else settings.FILE_PREFETCH_TIMEOUT
+    retries = retries if retries is not None else settings.FILE_PREFETCH_RETRIES
+
+    if settings.LOCAL_FILE_CACHE_MAX_BYTES <= 0:
+        yield from records
+        return
+
+    # create the process-wide cache before the threads use it
+    get_local_file_cache()
+
+    # at most 2 * max_workers files are in flight, or downloaded and waiting
+    # to be yielded, so the prefetch is bounded for any number of records
+    window = 2 * max_workers
+    pending: deque = deque()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch_stored_files")
+    try:
+        for record in records:
+            pending.append((record, executor.submit(_fetch, stored_table_file(record), retries)))
+            # yield the records at the head of the queue which are ready, or
+            # wait for the head if the window is full
+            while pending and (len(pending) >= window or pending[0][1].done()):
+                record, future = pending.popleft()
+                future.result(timeout=timeout)
+                yield record
+        while pending:
+            record, future = pending.popleft()
+            future.result(timeout=timeout)
+            yield record
+    finally:
+        # if the caller stops early, or a download fails, the downloads which
+        # have not started are cancelled
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import os
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .chrmap_cache import chrmap_cache
+from .local_file_cache import storage_version
+from .parquet_sidecar import read_stored_table
+
+logger = logging.getLogger(__name__)
+
+# the chromosome code is stored in the high bits of a position key, and the
+# position in the low bits. This allows positions on every chromosome to be
+# searched with a single sorted array
+POSITION_BITS = 32
+
+
+def position_keys(chr_series: pd.Series, position_series: pd.Series, chr_codes: dict[str, int]) -> np.ndarray:
+    """
+    Encode (chromosome, position) pairs as int64 keys which sort by
+    chromosome, then position.
+
+    :param chr_series: chromosome names
+    :type chr_series: pd.Series
+    :param position_series: positions on the chromosomes
+    :type position_series: pd.Series
+    :param chr_codes: a dictionary of chromosome name to integer code, eg the
+        output of :meth:`ChrMapCache.chr_codes`
+    :type chr_codes: dict
+
+    :return: an array of int64 keys
+    :rtype: np.ndarray
+
+    :raises ValueError: if a chromosome is not in `chr_codes`
+    """
+    codes = chr_series.map(chr_codes)
+    if codes.isna().any():
+        raise ValueError(f"Chromosomes {set(chr_series[codes.isna()])} are not in the chromosome codes")
+    return (codes.to_numpy(dtype=np.int64) << POSITION_BITS) | position_series.to_numpy(dtype=np.int64)
+
+
+class GenomicPositions:
+    """
+    A table of genomic positions, eg hops in a qbed file or peaks in a chipexo
+    allevents file, sorted by (chromosome, start) so that the positions in any
+    interval may be found by binary search. Rows on chromosomes which are not
+    in `chr_codes` are dropped, which is the same as the chromosome relabelling
+    in callingcardstools.
+
+    Example usage:
+
+    .. code-block:: python
+
+        hops = GenomicPositions(qbed_df, chrmap_cache.chr_codes("ucsc"))
+        hop_counts = promoter_index.count(hops)
+    """
+
+    def __init__(self, df: pd.DataFrame, chr_codes: dict[str, int]) -> None:
+        """
+        :param df: a dataframe with at least the columns `chr` and `start`
+        :type df: pd.DataFrame
+        :param chr_codes: a dictionary of chromosome name to integer code
+        :type chr_codes: dict
+        """
+        df = df[df["chr"].isin(chr_codes.keys())]
+        keys = position_keys(df["chr"], df["start"], chr_codes)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.df = df.iloc[order].reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class PromoterIntervalIndex:
+    """
+    A sorted interval index of the promoters in a PromoterSet. The promoter
+    start and end coordinates are stored as position keys (see
+    :func:`position_keys`), so that the positions which fall in every promoter,
+    on every chromosome, are found with two vectorized binary searches over a
+    :class:`GenomicPositions` table. Intervals are closed, ie a position `p` is
+    in a promoter if `start <= p <= end`, which is the same as callingcardstools.
+
+    Use :func:`get_promoter_interval_index` to get the index for a PromoterSet
+    record. The index is built once per promoter set file and ChrMap version,
+    and is cached next to the local copy of the file.
+    """
+
+    COLUMNS = ["chr", "start", "end", "name", "strand"]
+
+    def __init__(self, promoter_df: pd.DataFrame, chr_codes: dict[str, int]) -> None:
+        """
+        :param promoter_df: a dataframe with at least the columns `chr`,
+            `start`, `end`, `name` and `strand`
+        :type promoter_df: pd.DataFrame
+        :param chr_codes: a dictionary of chromosome name to integer code
+        :type chr_codes: dict
+        """
+        df = promoter_df.loc[promoter_df["chr"].isin(chr_codes.keys()), self.COLUMNS]
+        df = df.astype({"chr": str, "start": "int64", "end": "int64", "name": str, "strand": str})
+        # this is the order of the callingcardstools output
+        self.promoters = df.sort_values(self.COLUMNS, kind="stable").reset_index(drop=True)
+        self.start_keys = position_keys(self.promoters["chr"], self.promoters["start"], chr_codes)
+        self.end_keys = position_keys(self.promoters["chr"], self.promoters["end"], chr_codes)
+
+    def __len__(self) -> int:
+        return len(self.promoters)
+
+    def ranges(self, positions: GenomicPositions) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param positions: the sorted positions to search
+        :type positions: GenomicPositions
+
+        :return: for each promoter, the half open range `[lo, hi)` of the rows
+            of `positions` which fall in the promoter
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        lo = np.searchsorted(positions.keys, self.start_keys, side="left")
+        hi = np.searchsorted(positions.keys, self.end_keys, side="right")
+        return lo, hi
+
+    def count(self, positions: GenomicPositions) -> np.ndarray:
+        """
+        :param positions: the sorted positions to count
+        :type positions: GenomicPositions
+
+        :return: the number of positions in each promoter
+        :rtype: np.ndarray
+        """
+        lo, hi = self.ranges(positions)
+        return (hi - lo).astype(np.int64)
+
+    def reduce(self, positions: GenomicPositions, column: str, ufunc: np.ufunc) -> np.ndarray:
+        """
+        Reduce a column of `positions` over the rows which fall in each
+        promoter, eg the maximum fold change of the peaks in each promoter.
+
+        :param positions: the sorted positions to reduce
+        :type positions: GenomicPositions
+        :param column: the column of `positions.df` to reduce
+        :type column: str
+        :param ufunc: a numpy ufunc with a `reduceat` method, eg `np.fmax`
+        :type ufunc: np.ufunc
+
+        :return: the reduced value for each promoter. Promoters which contain
+            no positions are NaN
+        :rtype: np.ndarray
+        """
+        lo, hi = self.ranges(positions)
+        # append a sentinel so that `hi` is always a valid reduceat index.
+        # Interleaving lo and hi makes every even reduceat slice [lo, hi)
+        values = np.append(positions.df[column].to_numpy(dtype=float), np.nan)
+        reduced = ufunc.reduceat(values, np.column_stack([lo, hi]).ravel())[::2]
+        return np.where(hi > lo, reduced, np.nan)
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to a parquet file. The file is written to a temporary
+        file and then renamed, so a partially written index is never read.
+
+        :param path: the path to write the index to
+        :type path: str
+        """
+        df = self.promoters.assign(start_key=self.start_keys, end_key=self.end_keys)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "PromoterIntervalIndex":
+        """
+        :param path: the path to an index written by :meth:`save`
+        :type path: str
+
+        :return: the index
+        :rtype: PromoterIntervalIndex
+        """
+        df = pd.read_parquet(path)
+        index = cls.__new__(cls)
+        index.start_keys = df.pop("start_key").to_numpy()
+        index.end_keys = df.pop("end_key").to_numpy()
+        index.promoters = df
+        return index
+
+
+@lru_cache(maxsize=32)
+def _load_promoter_interval_index(path: str) -> PromoterIntervalIndex:
+    return PromoterIntervalIndex.load(path)
+
+
+def get_promoter_interval_index(promoterset_record) -> PromoterIntervalIndex:
+    """
+    Return the interval index of a PromoterSet record. The index is keyed by
+    the promoter set file storage version and the ChrMap checksum, and is
+    cached on disk in `settings.LOCAL_FILE_CACHE_DIR`, and in memory. When an
+    index is built, the indexes of the file which it supersedes, eg from
+    before the file or ChrMap changed, are deleted.
+
+    :param promoterset_record: a PromoterSet record
+    :type promoterset_record: PromoterSet
+
+    :return: the interval index of the promoter set
+    :rtype: PromoterIntervalIndex
+    """
+    file_name = promoterset_record.file.name
+    token = f"{file_name}:{storage_version(file_name, default_storage)}:{chrmap_cache.checksum}"
+    index_dir = os.path.join(settings.LOCAL_FILE_CACHE_DIR, "promoter_index")
+    # the indexes of a file share a prefix, so that superseded ones can be found
+    prefix = hashlib.sha256(file_name.encode()).hexdigest()[:16]
+    path = os.path.join(index_dir, f"{prefix}_{hashlib.sha256(token.encode()).hexdigest()}.parquet")
+
+    if not os.path.exists(path):
+        logger.debug("Building the promoter interval index for %s", file_name)
+        os.makedirs(index_dir, exist_ok=True)
+        promoter_df = read_stored_table(promoterset_record, sep="\t")
+        PromoterIntervalIndex(promoter_df, chrmap_cache.chr_codes(settings.CHR_FORMAT)).save(path)
+        for entry in os.scandir(index_dir):
+            if entry.name.startswith(f"{prefix}_") and entry.name.endswith(".parquet") and entry.path != path:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    # another process deleted it first
+                    pass
+
+    return _load_promoter_interval_index(path)
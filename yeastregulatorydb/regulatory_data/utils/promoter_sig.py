@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from callingcardstools.PeakCalling.yeast.call_peaks import add_metrics
+
+from .promoter_interval_index import GenomicPositions, PromoterIntervalIndex
+
+# increment this when a change to this module changes the promoter
+# significance output. It is part of the PromoterSetSig input fingerprint, see
+# :func:`~yeastregulatorydb.regulatory_data.utils.input_fingerprint.promotersetsig_fingerprint`
+PROMOTER_SIG_CODE_VERSION = "1"
+
+
+def unique_hops(qbed_df: pd.DataFrame, chr_codes: dict[str, int]) -> GenomicPositions:
+    """
+    Collapse a qbed dataframe to its unique (chr, start, end) insertion sites,
+    ie strand is not considered, and sort them for searching.
+
+    :param qbed_df: a qbed dataframe with at least the columns `chr`, `start`
+        and `end`
+    :type qbed_df: pd.DataFrame
+    :param chr_codes: a dictionary of chromosome name to integer code
+    :type chr_codes: dict
+
+    :return: the sorted insertion sites
+    :rtype: GenomicPositions
+    """
+    return GenomicPositions(qbed_df.drop_duplicates(["chr", "start", "end"]), chr_codes)
+
+
+def total_hops(qbed_df: pd.DataFrame, chr_codes: dict[str, int]) -> int:
+    """
+    :param qbed_df: a qbed dataframe with at least the column `chr`
+    :type qbed_df: pd.DataFrame
+    :param chr_codes: a dictionary of chromosome name to integer code
+    :type chr_codes: dict
+
+    :return: the number of rows of the qbed on chromosomes in `chr_codes`
+    :rtype: int
+    """
+    return int(qbed_df["chr"].isin(chr_codes.keys()).sum())
+
+
+def callingcards_promoter_sig(
+    promoter_index: PromoterIntervalIndex,
+    experiment_hops: GenomicPositions,
+    experiment_total_hops: int,
+    background_hop_counts: np.ndarray,
+    background_total_hops: int,
+) -> pd.DataFrame:
+    """
+    Calculate the calling cards promoter significance of an experiment over a
+    promoter set. This produces the same table as the callingcardstools
+    `call_peaks` function with `consider_strand=False`, but the hops in each
+    promoter are counted by binary search on a
+    :class:`~yeastregulatorydb.regulatory_data.utils.promoter_interval_index.PromoterIntervalIndex`
+    rather than by a join of the promoters and hops on `chr`.
+
+    :param promoter_index: the interval index of the promoter set
+    :type promoter_index: PromoterIntervalIndex
+    :param experiment_hops: the unique experiment insertion sites, see :func:`unique_hops`
+    :type experiment_hops: GenomicPositions
+    :param experiment_total_hops: the total number of experiment hops, see :func:`total_hops`
+    :type experiment_total_hops: int
+    :param background_hop_counts: the number of background hops in each
+        promoter of `promoter_index`, eg `promoter_index.count(unique_hops(background_df, chr_codes))`
+    :type background_hop_counts: np.ndarray
+    :param background_total_hops: the total number of background hops
+    :type background_total_hops: int
+
+    :return: a dataframe with the columns `chr`, `start`, `end`, `name`,
+        `strand`, `experiment_hops`, `background_hops`, `background_total_hops`,
+        `experiment_total_hops`, `callingcards_enrichment`, `poisson_pval` and
+        `hypergeometric_pval`. Promoters with no experiment hops are dropped
+    :rtype: pd.DataFrame
+    """
+    df = promoter_index.promoters.assign(
+        experiment_hops=promoter_index.count(experiment_hops),
+        background_hops=np.asarray(background_hop_counts, dtype=np.int64),
+        background_total_hops=np.int64(background_total_hops),
+        experiment_total_hops=np.int64(experiment_total_hops),
+    )
+    df = df[df["experiment_hops"] > 0].reset_index(drop=True)
+    return add_metrics(df)
+
+
+def chipexo_promoter_sig(
+    promoter_index: PromoterIntervalIndex, chipexo_df: pd.DataFrame, chr_codes: dict
+) -> pd.DataFrame:
+    """
+    Find the most significant chipexo peak in each promoter. This produces the
+    same table as the callingcardstools `chipexo_promoter_sig` function.
+
+    :param promoter_index: the interval index of the promoter set
+    :type promoter_index: PromoterIntervalIndex
+    :param chipexo_df: a chipexo allevents dataframe with at least the columns
+        `chr`, `start`, `YPD_log2Fold` and `YPD_log2P`
+    :type chipexo_df: pd.DataFrame
+    :param chr_codes: a dictionary of chromosome name to integer code
+    :type chr_codes: dict
+
+    :return: a dataframe with the columns `chr`, `start`, `end`, `name`,
+        `strand`, `n_sig_peaks`, `max_fc` and `min_pval`. Promoters with no
+        peaks are dropped
+    :rtype: pd.DataFrame
+    """
+    peaks = GenomicPositions(chipexo_df, chr_codes)
+    df = promoter_index.promoters.assign(
+        n_sig_peaks=promoter_index.count(peaks),
+        max_fc=promoter_index.reduce(peaks, "YPD_log2Fold", np.fmax),
+        min_pval=promoter_index.reduce(peaks, "YPD_log2P", np.fmin),
+    )
+    return df[df["n_sig_peaks"] > 0].reset_index(drop=True)
@@ -0,0 +1,76 @@
+import csv
+import io
+import itertools
+from collections.abc import Iterator
+
+from django.db import connections, models
+
+
+def queryset_columns(queryset: models.QuerySet) -> list[str]:
+    """
+    :param queryset: a queryset of model instances
+    :type queryset: models.QuerySet
+
+    :return: the columns of `queryset.values()`, ie the attribute name of each
+        concrete field, eg `uploader_id`, followed by the annotations
+    :rtype: list[str]
+    """
+    return [field.attname for field in queryset.model._meta.concrete_fields] + list(queryset.query.annotations)
+
+
+def queryset_csv_stream(queryset: models.QuerySet, chunk_size: int = 2000) -> Iterator[bytes]:
+    """
+    Write a queryset as CSV, `chunk_size` rows at a time. The rows are read
+    with a server side cursor, so memory use does not depend on the size of
+    the queryset.
+
+    :param queryset: a queryset of model instances
+    :type queryset: models.QuerySet
+    :param chunk_size: the number of rows fetched from the database, and
+        written, at a time
+    :type chunk_size: int
+
+    :return: an iterator of utf-8 encoded CSV chunks. The first chunk is the header
+    :rtype: Iterator[bytes]
+    """
+    columns = queryset_columns(queryset)
+    # values_list does not use the related instances which are prefetched
+    rows = queryset.prefetch_related(None).values_list(*columns).iterator(chunk_size=chunk_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    while True:
+        writer.writerows(itertools.islice(rows, chunk_size))
+        if not buffer.tell():
+            return
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def queryset_copy_stream(queryset: models.QuerySet) -> Iterator[bytes]:
+    """
+    Write a queryset as CSV with a Postgres `COPY (...) TO STDOUT`, which
+    formats the rows in the database rather than in python. Note that
+    Postgres, rather than python, formats the values, eg booleans are `t`
+    and `f`. Only available on PostgreSQL.
+
+    :param queryset: a queryset of model instances
+    :type queryset: models.QuerySet
+
+    :return: an iterator of utf-8 encoded CSV chunks, starting with the header
+    :rtype: Iterator[bytes]
+
+    :raises NotImplementedError: if the database of the queryset is not PostgreSQL
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        raise NotImplementedError("COPY is only available on PostgreSQL")
+    columns = queryset_columns(queryset)
+    sql, params = queryset.prefetch_related(None).values_list(*columns).query.sql_with_params()
+    with connection.cursor() as cursor:
+        # the psycopg cursor, which binds the parameters of COPY client side
+        with cursor.cursor.copy(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER false)", params) as copy:
+            yield (",".join(columns) + "\n").encode()
+            for block in copy:
+                yield bytes(block)
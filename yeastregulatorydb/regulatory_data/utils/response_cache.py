@@ -0,0 +1,189 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+RESPONSE_CACHE_VERSION_KEY = "response_cache_version:{label}"
+RESPONSE_CACHE_KEY = "response_cache:{viewset}:{digest}"
+RESPONSE_CACHE_STATS_KEY = "response_cache_stats:{viewset}:{outcome}"
+
+# the apps whose models are versioned, ie whose records appear in, or
+# filter, the cached responses
+RESPONSE_CACHE_APPS = {"regulatory_data", "users"}
+
+# the `update_fields` of the save made by `django.contrib.auth.models.update_last_login`
+LAST_LOGIN_UPDATE_FIELDS = frozenset({"last_login"})
+
+
+class ResponseCache:
+    """
+    A cache of the data of list responses, eg the pages of the Binding list,
+    in the django cache. A response is keyed by the viewset, the normalized
+    query parameters of the request, and the version of each model the
+    response depends on. The version of a model is a counter which is bumped
+    by the `post_save` and `post_delete` receiver below, so that a change to a
+    record makes the cached responses which depend on it unreachable, rather
+    than deleting them. They expire after `RESPONSE_CACHE_TIMEOUT` seconds.
+
+    The number of hits and misses of each viewset is counted in the django
+    cache, so that the hit ratio covers every web process.
+
+    Note that `bulk_create`, `update` and raw SQL do not send these signals --
+    call :meth:`invalidate_on_commit` after using them.
+
+    Example usage:
+
+    .. code-block:: python
+
+        from yeastregulatorydb.regulatory_data.utils.response_cache import response_cache
+
+        key = response_cache.key("BindingViewSet", request, ["regulatory_data.Binding"])
+        data = response_cache.get("BindingViewSet", key)
+    """
+
+    def versions(self, labels: list[str]) -> list[int]:
+        """
+        :param labels: model labels, eg `regulatory_data.Binding`
+        :type labels: list[str]
+
+        :return: the current version of each model, read in one round trip
+        :rtype: list[int]
+        """
+        keys = [RESPONSE_CACHE_VERSION_KEY.format(label=label) for label in labels]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # the counter starts from the time, so that a counter which is
+                # evicted does not restart at a version which is already cached.
+                # add() does not overwrite a version set by another process
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = cache.get(key)
+        return [versions[key] for key in keys]
+
+    def invalidate(self, label: str) -> None:
+        """
+        Bump the version of a model, so that the cached responses which depend
+        on it are no longer served.
+
+        :param label: the model label, eg `regulatory_data.Binding`
+        :type label: str
+        """
+        key = RESPONSE_CACHE_VERSION_KEY.format(label=label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+    def invalidate_on_commit(self, label: str) -> None:
+        """
+        Bump the version of a model at once, so that this process does not
+        serve a stale response, and again when the transaction commits, so
+        that a response cached by another process from the data before the
+        commit is not served either.
+
+        :param label: the model label, eg `regulatory_data.Binding`
+        :type label: str
+        """
+        self.invalidate(label)
+        transaction.on_commit(lambda: self.invalidate(label))
+
+    def key(self, viewset: str, request, labels: list[str]) -> str:
+        """
+        :param viewset: the name of the viewset, eg `BindingViewSet`
+        :type viewset: str
+        :param request: the request. The query parameters are sorted, and
+            empty parameters, which do not filter, are dropped. The host is
+            part of the key since the pagination links are absolute
+        :param labels: the labels of the models the response depends on
+        :type labels: list[str]
+
+        :return: the cache key of the response
+        :rtype: str
+        """
+        params = sorted(
+            (name, [value for value in values if value != ""]) for name, values in request.query_params.lists()
+        )
+        content = json.dumps(
+            [
+                request.build_absolute_uri(request.path),
+                [param for param in params if param[1]],
+                list(zip(labels, self.versions(labels))),
+            ]
+        )
+        return RESPONSE_CACHE_KEY.format(viewset=viewset, digest=hashlib.sha256(content.encode()).hexdigest())
+
+    def get(self, viewset: str, key: str):
+        """
+        :param viewset: the name of the viewset, which is used to count the hit, or miss
+        :type viewset: str
+        :param key: the key of the response, see :meth:`key`
+        :type key: str
+
+        :return: the response data, or None if it is not cached
+        """
+        data = cache.get(key)
+        outcome_key = RESPONSE_CACHE_STATS_KEY.format(viewset=viewset, outcome="misses" if data is None else "hits")
+        try:
+            cache.incr(outcome_key)
+        except ValueError:
+            cache.add(outcome_key, 1, timeout=None)
+        return data
+
+    def set(self, key: str, data) -> None:
+        """
+        :param key: the key of the response, see :meth:`key`
+        :type key: str
+        :param data: the response data
+        """
+        cache.set(key, data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+    def stats(self, viewset: str) -> dict:
+        """
+        :param viewset: the name of the viewset
+        :type viewset: str
+
+        :return: the number of hits and misses of the viewset since the
+            counters were last reset, and the hit ratio, which is None if
+            there have been no requests
+        :rtype: dict
+        """
+        counts = cache.get_many(
+            [RESPONSE_CACHE_STATS_KEY.format(viewset=viewset, outcome=o) for o in ["hits", "misses"]]
+        )
+        hits = counts.get(RESPONSE_CACHE_STATS_KEY.format(viewset=viewset, outcome="hits"), 0)
+        misses = counts.get(RESPONSE_CACHE_STATS_KEY.format(viewset=viewset, outcome="misses"), 0)
+        return {
+            "viewset": viewset,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        }
+
+    def reset_stats(self, viewset: str) -> None:
+        """Reset the hit and miss counters of the viewset"""
+        cache.delete_many([RESPONSE_CACHE_STATS_KEY.format(viewset=viewset, outcome=o) for o in ["hits", "misses"]])
+
+
+response_cache = ResponseCache()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_response_cache(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Bump the response cache version of the model of a record which is saved
+    or deleted. See :meth:`ResponseCache.invalidate_on_commit`
+
+    A save of only `last_login`, which django makes on every login, does not
+    change a response, so it does not invalidate the cached responses
+    """
+    if not issubclass(sender, models.Model) or sender._meta.app_label not in RESPONSE_CACHE_APPS:
+        return
+    if kwargs.get("update_fields") == LAST_LOGIN_UPDATE_FIELDS:
+        return
+    response_cache.invalidate_on_commit(sender._meta.label)
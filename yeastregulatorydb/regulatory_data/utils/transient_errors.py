@@ -0,0 +1,10 @@
+import socket
+
+from django.db import OperationalError
+from requests.exceptions import ConnectionError, Timeout
+
+# errors which are expected to succeed if the operation is retried, eg a
+# dropped connection to S3 or the database. These are retried by
+# :class:`~yeastregulatorydb.regulatory_data.tasks.BaseTask.MyBaseTask`, and by
+# :func:`~yeastregulatorydb.regulatory_data.utils.prefetch_stored_files.prefetch_stored_files`
+TRANSIENT_ERRORS = (ConnectionError, Timeout, OperationalError, IOError, OSError, socket.error)
@@ -1,6 +1,6 @@
 import pandas as pd
 
-from ..models.ChrMap import ChrMap
+from .chrmap_cache import chrmap_cache
 
 
 def validate_chr_col(df: pd.DataFrame, chrmap_field: str) -> bool:
@@ -35,8 +35,9 @@ def validate_chr_col(df: pd.DataFrame, chrmap_field: str) -> bool:
     # check that the chromosome names in the file match at least one of the
     # fields in ChrMap
     chr_values_set = set(df.chr.unique())
-    chrmap_records = ChrMap.objects.all()
-    chrmap_values = {getattr(record, chrmap_field) for record in chrmap_records}
+    # dictionary of chromosome name to sequence length
+    chrmap_dict = chrmap_cache.seqlength(chrmap_field)
+    chrmap_values = set(chrmap_dict)
     if not chr_values_set.issubset(chrmap_values):
         raise AttributeError(
             f"The following chromosomes in the uploaded file "
@@ -53,10 +54,6 @@ def validate_chr_col(df: pd.DataFrame, chrmap_field: str) -> bool:
     # chr bounds
     agg_func = {"start": "min", "end": "max"}
     grouped_df = df.groupby("chr", as_index=False).agg(agg_func)
-    chrmap_queryset = chrmap_records.values(chrmap_field, "seqlength")
-
-    # Convert the QuerySet to a dictionary
-    chrmap_dict = {row[chrmap_field]: row["seqlength"] for row in chrmap_queryset}
 
     invalid_coordinates = []
     for row in grouped_df.itertuples(index=False):
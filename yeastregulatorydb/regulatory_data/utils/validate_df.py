@@ -1,9 +1,142 @@
 import logging
+from collections.abc import Callable
 
 import pandas as pd
+from pandas.api import types as ptypes
 
 logger = logging.getLogger(__name__)
 
+# the number of offending row indices reported in a validation error message
+N_OFFENDING_ROWS = 5
+
+ColumnCheck = Callable[[pd.DataFrame], None]
+
+
+def _offending_rows(mask: pd.Series) -> str:
+    """
+    :param mask: boolean series which is True for the offending rows
+    :type mask: pd.Series
+
+    :return: a message which lists the first `N_OFFENDING_ROWS` offending row indices
+    :rtype: str
+    """
+    return f" First offending rows: {mask[mask].index[:N_OFFENDING_ROWS].tolist()}"
+
+
+def _is_instance_mask(series: pd.Series, expected_type: type) -> pd.Series:
+    """
+    Elementwise isinstance check. This is only used for `object` columns,
+    where there is no dtype to check.
+    """
+    return ~series.map(lambda x: isinstance(x, expected_type)).astype(bool)
+
+
+def _levels_check(colname: str, levels: list) -> ColumnCheck:
+    def check(df: pd.DataFrame) -> None:
+        mask = ~df[colname].isin(levels)
+        if mask.any():
+            raise ValueError(f"Column {colname} must be one of {levels}." + _offending_rows(mask))
+
+    return check
+
+
+def _str_check(colname: str) -> ColumnCheck:
+    def check(df: pd.DataFrame) -> None:
+        # if the expected coltype is a string, try to cast all values to string
+        try:
+            df[colname] = df[colname].astype(str)
+        except ValueError:
+            raise ValueError(
+                f"Column {colname} is expected to be a str. It is not, "
+                f"and could not be cast to str. It's actually of type {df[colname].dtype}. Fix it!"
+            )
+
+    return check
+
+
+def _type_error(colname: str, expected_type: type, series: pd.Series, mask: pd.Series) -> ValueError:
+    return ValueError(
+        f"Column {colname} must be of type {str(expected_type)}. "
+        f"Currently, it is type {series.dtype}." + _offending_rows(mask)
+    )
+
+
+def _int_check(colname: str) -> ColumnCheck:
+    def check(df: pd.DataFrame) -> None:
+        series = df[colname]
+        if ptypes.is_float_dtype(series):
+            # raise an error if there are decimal values or NaN in an `int`
+            # column. Otherwise, cast to int
+            mask = series.isna() | (series % 1 != 0)
+            if mask.any():
+                raise ValueError(
+                    f"Column {colname} is expected to be an int. It contains decimal values or `NaN`. Fix it!"
+                    + _offending_rows(mask)
+                )
+            df[colname] = series.astype(int)
+        elif ptypes.is_integer_dtype(series) or ptypes.is_bool_dtype(series):
+            logger.debug("column is expected to be an int and is an int column")
+        else:
+            mask = _is_instance_mask(series, int)
+            if mask.any():
+                raise _type_error(colname, int, series, mask)
+
+    return check
+
+
+def _float_check(colname: str) -> ColumnCheck:
+    def check(df: pd.DataFrame) -> None:
+        series = df[colname]
+        if ptypes.is_float_dtype(series):
+            return
+        if ptypes.is_object_dtype(series):
+            mask = _is_instance_mask(series, float)
+        else:
+            # integer, bool, datetime, etc columns are not float columns
+            mask = pd.Series(True, index=series.index)
+        if mask.any():
+            raise _type_error(colname, float, series, mask)
+
+    return check
+
+
+def _generic_check(colname: str, expected_type: type) -> ColumnCheck:
+    def check(df: pd.DataFrame) -> None:
+        mask = _is_instance_mask(df[colname], expected_type)
+        if mask.any():
+            raise _type_error(colname, expected_type, df[colname], mask)
+
+    return check
+
+
+def compile_schema(expected_col_dict: dict) -> list[tuple[str, ColumnCheck]]:
+    """
+    Compile a dictionary of expected column names and datatypes, eg a
+    FileFormat `fields` dictionary, into a list of vectorized column checks.
+
+    :param expected_col_dict: dictionary with the expected column names and datatypes.
+        If a column has expected factor levels, provide a list of those levels.
+    :type expected_col_dict: dict
+
+    :return: a list of (column name, check) tuples. Each check takes the
+        dataframe, raises a ValueError if the column is invalid, and may cast
+        the column in place
+    :rtype: list
+    """
+    schema = []
+    for colname, expected_type_or_levels in expected_col_dict.items():
+        if isinstance(expected_type_or_levels, list):
+            schema.append((colname, _levels_check(colname, expected_type_or_levels)))
+        elif expected_type_or_levels == str:
+            schema.append((colname, _str_check(colname)))
+        elif expected_type_or_levels == int:
+            schema.append((colname, _int_check(colname)))
+        elif expected_type_or_levels == float:
+            schema.append((colname, _float_check(colname)))
+        else:
+            schema.append((colname, _generic_check(colname, expected_type_or_levels)))
+    return schema
+
 
 def validate_df(
     df: pd.DataFrame,
@@ -32,38 +165,14 @@ def validate_df(
 
     :raises ValueError:
         - if the dataframe does not have all the columns specified in `expected_col_dict`
-        - if the columns violate the expected datatypes, given the `expected_col_dict`
+        - if the columns violate the expected datatypes, given the `expected_col_dict`.
+          The message lists the index of the first offending rows
     """
-    for colname, expected_type_or_levels in expected_col_dict.items():
-        if isinstance(expected_type_or_levels, list):
-            if not set(df[colname]).issubset(set(expected_type_or_levels)):
-                raise ValueError(f"Column {colname} must be one of {expected_type_or_levels}")
-        else:
-            # if the expected coltype is a string, try to cast all values to string
-            if expected_type_or_levels == str:
-                try:
-                    df[colname] = df[colname].astype(str)
-                except ValueError:
-                    raise ValueError(
-                        f"Column {colname} is expected to be a str. It is not, "
-                        "and could not be cast to str. It's actually of type {df[colname].dtype}. Fix it!"
-                    )
-            # if the expected coltype is an int, try to cast all values to int
-            # raise an error if there are decimal values in an `int` column
-            if expected_type_or_levels == int:
-                try:
-                    if not df[colname].apply(float.is_integer).all():
-                        raise ValueError(
-                            f"Column {colname} is expected to be an int. It contains decimal values or `NaN`. Fix it!"
-                        )
-                    else:
-                        df[colname] = df[colname].astype(int)
-                except TypeError:
-                    logger.debug("column is expected to be an int and is an int column")
-            if not all(isinstance(x, expected_type_or_levels) for x in df[colname]):
-                raise ValueError(
-                    f"Column {colname} must be of type {str(expected_type_or_levels)}. "
-                    f"Currently, it is type {df[colname].dtype}"
-                )
+    missing_cols = [colname for colname in expected_col_dict if colname not in df.columns]
+    if missing_cols:
+        raise ValueError(f"The dataframe is missing the expected columns: {missing_cols}")
+
+    for _, check in compile_schema(expected_col_dict):
+        check(df)
 
     return df
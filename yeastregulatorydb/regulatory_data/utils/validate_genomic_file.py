@@ -0,0 +1,284 @@
+import gzip
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable
+
+import pandas as pd
+from django.conf import settings
+
+from .chrmap_cache import chrmap_cache
+from .parquet_sidecar import ParquetSidecarWriter
+from .validate_df import validate_df
+from .validate_genomic_df import validate_genomic_df
+
+logger = logging.getLogger(__name__)
+
+
+def read_csv_dtypes(fields: dict) -> dict[str, Any]:
+    """
+    The dtypes with which the columns of a file are parsed, so that every
+    chunk of the file is validated against the same dtypes, rather than the
+    dtypes pandas infers from the values in the chunk. `int` columns are
+    parsed as float, so that a decimal value, or `NaN`, is reported by
+    :func:`~yeastregulatorydb.regulatory_data.utils.validate_df.validate_df`,
+    which then casts the column to int.
+
+    :param fields: the FileFormat fields, see :func:`validate_genomic_file`
+    :type fields: dict
+
+    :return: the `dtype` argument of `pd.read_csv`
+    :rtype: dict[str, Any]
+    """
+    dtypes: dict[str, Any] = {}
+    for colname, expected_type_or_levels in fields.items():
+        if expected_type_or_levels == str:
+            dtypes[colname] = str
+        elif expected_type_or_levels in (int, float):
+            dtypes[colname] = "float64"
+        elif isinstance(expected_type_or_levels, list) and all(
+            isinstance(level, str) for level in expected_type_or_levels
+        ):
+            dtypes[colname] = str
+    return dtypes
+
+
+class _HopTally:
+    """
+    Count the unique (chr, start, end) coordinates of a file, by chromosome,
+    as its chunks are validated. Files which are sorted by chromosome, in any
+    order of chromosomes, and then by start, eg qbed files, are counted in
+    constant memory: once a chunk is read, only the coordinates at its last
+    (chr, start) may recur, and every other coordinate is counted and
+    dropped. If a chunk is found not to be sorted, :attr:`is_sorted` is
+    unset, and the file must be counted with :meth:`count_unsorted`.
+    """
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+        self.is_sorted = True
+        self._pending: pd.DataFrame | None = None
+        self._finished_chrs: set[str] = set()
+        self._last: tuple[str, int] | None = None
+
+    def _continues_sorted(self, coordinates: pd.DataFrame) -> bool:
+        chrs = coordinates["chr"]
+        new_run = chrs.ne(chrs.shift())
+        runs = chrs[new_run].tolist()
+        new_chrs = runs
+        if self._last is not None and runs[0] == self._last[0]:
+            if coordinates["start"].iloc[0] < self._last[1]:
+                return False
+            new_chrs = runs[1:]
+        if len(set(runs)) != len(runs) or self._finished_chrs.intersection(new_chrs):
+            return False
+        if (coordinates["start"].diff()[~new_run] < 0).any():
+            return False
+        if self._last is not None and runs[0] != self._last[0]:
+            self._finished_chrs.add(self._last[0])
+        self._finished_chrs.update(runs[:-1])
+        self._last = (runs[-1], coordinates["start"].iloc[-1])
+        return True
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        :param df: a validated chunk of the file
+        :type df: pd.DataFrame
+        """
+        if not self.is_sorted:
+            return
+        coordinates = df[["chr", "start", "end"]]
+        if not self._continues_sorted(coordinates):
+            self.is_sorted = False
+            self._pending = None
+            return
+        if self._pending is not None:
+            coordinates = pd.concat([self._pending, coordinates], ignore_index=True)
+        coordinates = coordinates.drop_duplicates()
+        last_chr, last_start = self._last  # type: ignore[misc]
+        is_open = (coordinates["chr"] == last_chr) & (coordinates["start"] == last_start)
+        self.counts.update(coordinates.loc[~is_open, "chr"].value_counts().to_dict())
+        self._pending = coordinates[is_open]
+
+    def finish(self) -> None:
+        if self._pending is not None:
+            self.counts.update(self._pending["chr"].value_counts().to_dict())
+            self._pending = None
+
+    def count_unsorted(self, chunks) -> None:
+        """
+        Count the coordinates of an unsorted file with a running set of its
+        unique coordinates, which grows with the number of unique insertion
+        sites, rather than the number of rows.
+
+        :param chunks: the chunks of the file, with `chr`, `start` and `end` columns
+        """
+        unique = None
+        for df in chunks:
+            coordinates = df[["chr", "start", "end"]]
+            unique = coordinates if unique is None else pd.concat([unique, coordinates], ignore_index=True)
+            unique = unique.drop_duplicates()
+        self.counts = Counter(unique["chr"].astype(str).value_counts().to_dict() if unique is not None else {})
+
+    def inserts(self, chr_format: str) -> dict[str, int]:
+        """
+        :param chr_format: the chromosome format of the file. Must be a field in ChrMap
+        :type chr_format: str
+
+        :return: the number of unique coordinates of each chromosome type, as
+            in :func:`~yeastregulatorydb.regulatory_data.utils.count_hops.count_hops`,
+            eg `{"genomic_inserts": 10, "mito_inserts": 0, "plasmid_inserts": 2}`
+        :rtype: dict[str, int]
+        """
+        chrmap_df = chrmap_cache.df
+        chr_types = dict(zip(chrmap_df[chr_format], chrmap_df["type"]))
+        counts = {category: 0 for category in ["genomic", "mito", "plasmid"]}
+        for chr_name, count in self.counts.items():
+            chr_type = chr_types.get(chr_name)
+            if chr_type is not None:
+                counts[chr_type] = counts.get(chr_type, 0) + int(count)
+        return {f"{key}_inserts": value for key, value in counts.items()}
+
+
+def validate_genomic_file(file, separator: str, fields: dict) -> tuple[str | None, dict[str, int]]:
+    """
+    Decompress, parse and validate a gzipped, delimited file in chunks of
+    `FILE_VALIDATION_CHUNKSIZE` rows, so that memory use does not depend on
+    the size of the file. The columns are parsed with the dtypes of
+    :func:`read_csv_dtypes`. If the file has `chr`, `start` and `end` columns,
+    it is validated with
+    :func:`~yeastregulatorydb.regulatory_data.utils.validate_genomic_df.validate_genomic_df`,
+    and otherwise with :func:`~yeastregulatorydb.regulatory_data.utils.validate_df.validate_df`.
+    The validated chunks are written to a local parquet sidecar. This does
+    not access the database, other than through the ChrMapCache.
+
+    If the file has a `depth` column, the unique coordinates are counted as
+    the chunks are read, in constant memory if the file is sorted by
+    chromosome and start, see :class:`_HopTally`. An unsorted file is read a
+    second time to count them.
+
+    :param file: a path to the file, or a seekable binary file object
+    :param separator: the column separator
+    :type separator: str
+    :param fields: the FileFormat fields, see
+        :attr:`~yeastregulatorydb.regulatory_data.api.serializers.FileFormatSerializer.FileFormatSerializer.fields_as_types`
+    :type fields: dict
+
+    :return: the path to the local parquet sidecar, or None if it could not
+        be written, and, if the file has a `depth` column, the number of
+        insertions in each chromosome type, eg `{"genomic_inserts": 10, ...}`
+    :rtype: tuple[str | None, dict[str, int]]
+
+    :raises gzip.BadGzipFile, zlib.error, EOFError: if the file is not a
+        valid gzipped file
+    :raises UnicodeDecodeError: if the file cannot be decoded
+    :raises pd.errors.ParserError, pd.errors.EmptyDataError: if the file
+        cannot be parsed with `separator`
+    :raises ValueError: if the file is not valid
+    """
+    sidecar_writer = ParquetSidecarWriter(fields)
+    read_csv_kwargs = {
+        "sep": separator,
+        "dtype": read_csv_dtypes(fields),
+        "chunksize": settings.FILE_VALIDATION_CHUNKSIZE,
+    }
+    hop_tally = None
+    try:
+        # gzip.open decompresses and decodes the file as it is read
+        with gzip.open(file, "rt") as text_file:
+            for df in pd.read_csv(text_file, **read_csv_kwargs):
+                if {"chr", "start", "end"}.issubset(set(df.columns)):
+                    logger.debug("Validating genomic coordinates in uploaded file chunk")
+                    df = validate_genomic_df(df, settings.CHR_FORMAT, fields)
+                    if "depth" in df.columns:
+                        hop_tally = hop_tally or _HopTally()
+                        hop_tally.add(df)
+                else:
+                    df = validate_df(df, fields)
+                sidecar_writer.write(df)
+    except BaseException:
+        sidecar_writer.discard()
+        raise
+
+    inserts = {}
+    if hop_tally is not None:
+        logger.info("Counting genomic insertions")
+        if hop_tally.is_sorted:
+            hop_tally.finish()
+        else:
+            logger.info("The file is not sorted by chromosome and start. Reading it again to count insertions")
+            if hasattr(file, "seek"):
+                file.seek(0)
+            with gzip.open(file, "rt") as text_file:
+                hop_tally.count_unsorted(pd.read_csv(text_file, usecols=["chr", "start", "end"], **read_csv_kwargs))
+        inserts = hop_tally.inserts(settings.CHR_FORMAT)
+
+    return sidecar_writer.close(), inserts
+
+
+def _init_validation_worker(chrmap_version: str, chrmap_df: pd.DataFrame) -> None:
+    # the worker validates with the ChrMap table of the parent, which may
+    # include changes which the parent has not committed
+    chrmap_cache.pin(chrmap_version, chrmap_df)
+
+
+def validate_genomic_files(
+    jobs: list[tuple], max_workers: int | None = None, on_result: Callable[[int, Any], None] | None = None
+) -> list:
+    """
+    Run :func:`validate_genomic_file` for each job on a pool of processes,
+    eg for the files of a bulk upload. The workers are forked, and are
+    passed the ChrMap table of the caller (see :meth:`ChrMapCache.pin`), so
+    that they do not use the database connection they inherit.
+
+    :param jobs: the (path, separator, fields) arguments of each file
+    :type jobs: list[tuple]
+    :param max_workers: the number of processes. Defaults to the setting
+        `FILE_VALIDATION_WORKERS`. If 1, or there is one job, the files are
+        validated in this process. They are also validated in this process if
+        it is daemonic, eg a celery prefork worker, since a daemonic process
+        may not have children
+    :type max_workers: int, optional
+    :param on_result: called with the index of the job and its result as
+        each job finishes, eg to report progress. Defaults to None
+    :type on_result: Callable[[int, Any], None], optional
+
+    :return: for each job, in order, the result of :func:`validate_genomic_file`
+        or the exception it raised
+    :rtype: list
+    """
+    max_workers = min(max_workers or settings.FILE_VALIDATION_WORKERS, len(jobs))
+    if max_workers > 1 and multiprocessing.current_process().daemon:
+        # billiard, which runs the celery prefork workers, also sets the
+        # current process of multiprocessing
+        logger.debug("Validating the files in this process, since it is daemonic")
+        max_workers = 1
+    results: list = [None] * len(jobs)
+
+    def collect(index: int, result) -> None:
+        results[index] = result
+        if on_result is not None:
+            on_result(index, result)
+
+    if max_workers <= 1:
+        for index, job in enumerate(jobs):
+            try:
+                collect(index, validate_genomic_file(*job))
+            except Exception as exc:  # pylint: disable=broad-except
+                collect(index, exc)
+        return results
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_validation_worker,
+        initargs=(chrmap_cache.version, chrmap_cache.df),
+    ) as executor:
+        futures = {executor.submit(validate_genomic_file, *job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            try:
+                collect(futures[future], future.result())
+            except Exception as exc:  # pylint: disable=broad-except
+                collect(futures[future], exc)
+    return results
@@ -0,0 +1,142 @@
+import abc
+import logging
+import threading
+import uuid
+from typing import Any
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache(abc.ABC):
+    """
+    The base of the process-wide caches of small tables, eg the
+    :class:`~yeastregulatorydb.regulatory_data.utils.chrmap_cache.ChrMapCache`.
+    The table, or data derived from it, is loaded with :meth:`load` and held
+    in memory along with the version, in the django cache under
+    `version_cache_key`, which it was loaded at. When the version changes,
+    every process reloads the table on its next access.
+
+    A change to the table is published with :meth:`invalidate_on_commit`,
+    eg from the `post_save` and `post_delete` receivers of the model. The
+    new version is only set when the transaction commits, so that another
+    process cannot load the rows from before the commit under the new
+    version. Until then, the thread which made the change reads the table,
+    with its uncommitted changes, from the database on every access, under
+    the new version, so that data which is keyed by the version is not
+    shared with other processes before the commit. If the transaction is
+    rolled back, the version is not set.
+
+    Example usage:
+
+    .. code-block:: python
+
+        class RegulatorCache(VersionedCache):
+            version_cache_key = "regulator_version"
+
+            def load(self):
+                return pd.DataFrame.from_records(list(Regulator.objects.values()))
+
+        version, df = RegulatorCache().get()
+    """
+
+    version_cache_key: str
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._value: Any = None
+        # the version set by an uncommitted change in this thread
+        self._local = threading.local()
+
+    @abc.abstractmethod
+    def load(self) -> Any:
+        """
+        :return: the cached value, read from the database
+        """
+
+    def reset(self) -> None:
+        """
+        Called, with the lock held, when the value is dropped or reloaded, eg
+        to clear data derived from it
+        """
+
+    def _shared_version(self) -> str:
+        version = cache.get(self.version_cache_key)
+        if version is None:
+            # add() does not overwrite a version set by another process
+            cache.add(self.version_cache_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self.version_cache_key)
+        return version
+
+    def _pending_version(self) -> str | None:
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            return None
+        version, publish, using = pending
+        connection = transaction.get_connection(using)
+        # the callback is dropped from `run_on_commit` if the transaction, or
+        # the savepoint it was registered in, is rolled back, and is run, and
+        # dropped, when it commits
+        if connection.in_atomic_block and any(entry[1] is publish for entry in connection.run_on_commit):
+            return version
+        self._local.pending = None
+        return None
+
+    def get(self) -> tuple[str, Any]:
+        """
+        :return: the current version and the value
+        :rtype: tuple[str, Any]
+        """
+        pending_version = self._pending_version()
+        if pending_version is not None:
+            return pending_version, self.load()
+        version = self._shared_version()
+        with self._lock:
+            if self._value is None or self._version != version:
+                logger.debug(f"Loading {type(self).__name__} version {version}")
+                self._value = self.load()
+                self._version = version
+                self.reset()
+            return self._version, self._value
+
+    @property
+    def version(self) -> str:
+        """
+        :return: the current version. This changes whenever the table is
+            modified, and may be used to key data derived from the table
+        :rtype: str
+        """
+        return self.get()[0]
+
+    def invalidate(self) -> None:
+        """
+        Set a new version at once, so that all processes reload the table.
+        Use :meth:`invalidate_on_commit` for a change made in a transaction
+        """
+        cache.set(self.version_cache_key, uuid.uuid4().hex, timeout=None)
+        self._local.pending = None
+        with self._lock:
+            self._value = None
+            self._version = None
+            self.reset()
+
+    def invalidate_on_commit(self, using: str | None = None) -> None:
+        """
+        Set a new version when the current transaction commits, or at once if
+        there is no transaction. Note that `bulk_create`, `update` and raw
+        SQL do not send the `post_save` signal -- call this after using them.
+
+        :param using: the database alias of the transaction. Defaults to None,
+            which is the default database
+        :type using: str, optional
+        """
+        version = uuid.uuid4().hex
+
+        def publish() -> None:
+            cache.set(self.version_cache_key, version, timeout=None)
+
+        self._local.pending = (version, publish, using)
+        transaction.on_commit(publish, using=using)